@@ -1,16 +1,20 @@
+import logging
 import sqlite3
 import os
 import datetime
 import random
+import db
+from migrations import migrate
 
-# Database file path
-DB_PATH = r"C:\Users\Luiss\OneDrive - tgm - Die Schule der Technik\TGM\4BHWII\Hackathon\hzl-2025\hauszumleben.db"
+# Database file path (HZL_DB_PATH or hauszumleben.db)
+DB_PATH = db.DB_PATH
 
 def create_connection(db_path):
     """Create a database connection to the SQLite database"""
     conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        db.configure(db_path)
+        conn = db.connect(readonly=False)
         print(f"Connected to database: {db_path}")
         return conn
     except sqlite3.Error as e:
@@ -618,6 +622,8 @@ def display_tables_info(conn):
 
 def main():
     """Main function"""
+    # Shows the migrations applied below
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     # Check if database exists
     if not os.path.exists(DB_PATH):
         print(f"Error: Database file {DB_PATH} not found")
@@ -635,6 +641,9 @@ def main():
     create_smart_home_tables(conn)
     create_assisted_living_tables(conn)
     
+    # Create indexes for the new tables
+    migrate(conn)
+    
     # Insert sample data
     insert_sample_data(conn)
     insert_assisted_living_sample_data(conn)
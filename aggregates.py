@@ -0,0 +1,213 @@
+import logging
+import sqlite3
+import db
+
+logger = logging.getLogger(__name__)
+
+#######################
+# Daily summary tables
+# Each summary table is fed from one source table. Only source rows above the stored rowid
+# watermark are aggregated and added onto the existing day rows, so a refresh costs as much
+# as the number of new rows. Updates and deletes of source rows (and of the tables in "depends")
+# are flagged in agg_stale by triggers (see migrations.ensure_triggers); refresh() then
+# recomputes those summaries from scratch.
+# An optional "unjoined" query lists the new rows without their joined row, with a flag whether
+# that row may still be inserted (its id is above the current max). The watermark stops before
+# the first of those, so it is counted once the joined row exists; other orphans are skipped.
+AGGREGATES = {
+    "agg_daily_orders": {
+        "source": "bestellungen",
+        "columns": ["orders", "guest_orders"],
+        "select": '''
+            SELECT datum, COUNT(*), COALESCE(SUM(gasthaus), 0) FROM bestellungen
+            WHERE datum IS NOT NULL AND rowid > ? AND rowid <= ? GROUP BY datum''',
+    },
+    "agg_daily_consumption": {
+        "source": "menu_selections",
+        "columns": ["selections", "consumed_percent_sum"],
+        "select": '''
+            SELECT date, COUNT(*), COALESCE(SUM(consumed_percent), 0) FROM menu_selections
+            WHERE date IS NOT NULL AND rowid > ? AND rowid <= ? GROUP BY date''',
+    },
+    "agg_daily_waste": {
+        "source": "leftover_food",
+        "depends": ["menu_selections"],
+        "columns": ["leftovers", "amount_percent_sum"],
+        "select": '''
+            SELECT ms.date, COUNT(*), COALESCE(SUM(lf.amount_percent), 0) FROM leftover_food lf
+            JOIN menu_selections ms ON ms.id = lf.menu_selection_id
+            WHERE ms.date IS NOT NULL AND lf.rowid > ? AND lf.rowid <= ? GROUP BY ms.date''',
+        # Leftovers without any menu_selection_id can never be joined and are skipped silently
+        "unjoined": '''
+            SELECT lf.rowid, lf.menu_selection_id > (SELECT COALESCE(MAX(id), 0) FROM menu_selections)
+            FROM leftover_food lf
+            LEFT JOIN menu_selections ms ON ms.id = lf.menu_selection_id
+            WHERE lf.menu_selection_id IS NOT NULL AND ms.id IS NULL AND lf.rowid > ? AND lf.rowid <= ?
+            ORDER BY lf.rowid''',
+    },
+    "agg_daily_vitals": {
+        "source": "health_vitals",
+        "columns": ["measurements", "heart_rate_sum", "systolic_sum", "diastolic_sum"],
+        "select": '''
+            SELECT date(measurement_time), COUNT(*), COALESCE(SUM(heart_rate), 0),
+                   COALESCE(SUM(blood_pressure_systolic), 0), COALESCE(SUM(blood_pressure_diastolic), 0) FROM health_vitals
+            WHERE date(measurement_time) IS NOT NULL AND rowid > ? AND rowid <= ? GROUP BY date(measurement_time)''',
+    },
+    "agg_daily_door_events": {
+        "source": "Ein_aus",
+        "columns": ["exits", "entries", "night_exits"],
+        "select": '''
+            SELECT date(zeitstempel), COALESCE(SUM(ausgang = 1), 0), COALESCE(SUM(eingang = 1), 0),
+                   COALESCE(SUM(ausgang = 1 AND (strftime('%H', zeitstempel) >= '21' OR strftime('%H', zeitstempel) < '06')), 0)
+            FROM Ein_aus
+            WHERE date(zeitstempel) IS NOT NULL AND rowid > ? AND rowid <= ? GROUP BY date(zeitstempel)''',
+    },
+    "agg_daily_activity": {
+        "source": "activity_participation",
+        "columns": ["participations", "attended"],
+        "select": '''
+            SELECT date, COUNT(*), COALESCE(SUM(attended = 1), 0) FROM activity_participation
+            WHERE date IS NOT NULL AND rowid > ? AND rowid <= ? GROUP BY date''',
+    },
+}
+
+def _upsert_sql(name, spec):
+    columns = spec["columns"]
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in columns)
+    return (f"INSERT INTO {name} (day, {', '.join(columns)}) {spec['select']} "
+            f"ON CONFLICT(day) DO UPDATE SET {updates}")
+
+def _pending(conn):
+    """
+    {aggregate: (watermark, new watermark, skipped rowids)} for every aggregate whose source has new
+    rows that can be aggregated. The new watermark is the max rowid, or the row before the first one
+    whose joined row may still arrive; skipped are the rows up to it that can never be joined.
+    """
+    watermarks = dict(conn.execute("SELECT aggregate, last_rowid FROM agg_watermarks").fetchall())
+    pending = {}
+    for name, spec in AGGREGATES.items():
+        try:
+            max_rowid = conn.execute(f'SELECT MAX(rowid) FROM "{spec["source"]}"').fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            # Source table missing in this database
+            continue
+        watermark = watermarks.get(name, 0)
+        skipped = []
+        if max_rowid > watermark and "unjoined" in spec:
+            for rowid, may_arrive in conn.execute(spec["unjoined"], (watermark, max_rowid)):
+                if may_arrive:
+                    max_rowid = rowid - 1
+                    break
+                skipped.append(rowid)
+        if max_rowid > watermark:
+            pending[name] = (watermark, max_rowid, skipped)
+    return pending
+
+def tracked_tables():
+    """{table: [aggregates]} of the tables whose updates and deletes make a summary stale"""
+    tables = {}
+    for name, spec in AGGREGATES.items():
+        for table in [spec["source"]] + spec.get("depends", []):
+            tables.setdefault(table, []).append(name)
+    return tables
+
+def _stale(conn):
+    return [row[0] for row in conn.execute("SELECT aggregate FROM agg_stale") if row[0] in AGGREGATES]
+
+def _clear(conn, names):
+    for name in names:
+        conn.execute(f"DELETE FROM {name}")
+        conn.execute("DELETE FROM agg_watermarks WHERE aggregate = ?", (name,))
+    conn.execute("DELETE FROM agg_stale")
+
+def refresh():
+    """
+    Fold new source rows into the summary tables; summaries whose source rows were updated or
+    deleted are recomputed. Returns {aggregate: (old, new) rowid watermark}.
+    """
+    # Cheap read-only check first, most reruns find nothing new and never take the write lock
+    with db.reader() as conn:
+        if not _pending(conn) and not _stale(conn):
+            return {}
+    processed = {}
+    with db.writer() as conn:
+        stale = _stale(conn)
+        if stale:
+            logger.info("Recomputing %s after updated or deleted source rows", ", ".join(stale))
+            _clear(conn, stale)
+        for name, (watermark, max_rowid, skipped) in _pending(conn).items():
+            if skipped:
+                logger.warning("%s: skipped %d %s row(s) without a joined row, first rowids %s",
+                               name, len(skipped), AGGREGATES[name]["source"], skipped[:10])
+            conn.execute(_upsert_sql(name, AGGREGATES[name]), (watermark, max_rowid))
+            conn.execute(
+                "INSERT INTO agg_watermarks (aggregate, last_rowid) VALUES (?, ?) "
+                "ON CONFLICT(aggregate) DO UPDATE SET last_rowid = excluded.last_rowid",
+                (name, max_rowid)
+            )
+            processed[name] = (watermark, max_rowid)
+    return processed
+
+def rebuild():
+    """Recompute every summary from scratch, e.g. after the summary tables themselves were edited"""
+    with db.writer() as conn:
+        _clear(conn, AGGREGATES)
+    return refresh()
+
+#######################
+# Lookups
+def daily_kpis(day):
+    """All KPIs of one day, each read as a single row by primary key"""
+    day = str(day)
+    with db.reader() as conn:
+        def row(query):
+            cursor = conn.execute(query, (day,))
+            return cursor.fetchone() or (0,) * len(cursor.description)
+
+        orders, guest_orders = row("SELECT orders, guest_orders FROM agg_daily_orders WHERE day = ?")
+        selections, consumed = row("SELECT selections, consumed_percent_sum FROM agg_daily_consumption WHERE day = ?")
+        leftovers, leftover_percent = row("SELECT leftovers, amount_percent_sum FROM agg_daily_waste WHERE day = ?")
+        measurements, heart_rate, systolic, diastolic = row(
+            "SELECT measurements, heart_rate_sum, systolic_sum, diastolic_sum FROM agg_daily_vitals WHERE day = ?")
+        exits, entries, night_exits = row("SELECT exits, entries, night_exits FROM agg_daily_door_events WHERE day = ?")
+        participations, attended = row("SELECT participations, attended FROM agg_daily_activity WHERE day = ?")
+
+    def average(total, count):
+        return total / count if count else None
+
+    return {
+        "orders": orders,
+        "guest_orders": guest_orders,
+        "avg_consumed_percent": average(consumed, selections),
+        "avg_leftover_percent": average(leftover_percent, leftovers),
+        "avg_heart_rate": average(heart_rate, measurements),
+        "avg_systolic": average(systolic, measurements),
+        "avg_diastolic": average(diastolic, measurements),
+        "exits": exits,
+        "entries": entries,
+        "night_exits": night_exits,
+        "participations": participations,
+        "attendance_rate": average(attended, participations),
+    }
+
+def latest_day(names=None):
+    """Most recent day with a row in any of the given summary tables (default: all)"""
+    union = " UNION ALL ".join(f"SELECT MAX(day) AS day FROM {name}" for name in (names or AGGREGATES))
+    with db.reader() as conn:
+        return conn.execute(f"SELECT MAX(day) FROM ({union})").fetchone()[0]
+
+def daily_series(name, start_day, end_day):
+    """Rows of one summary table between two days (inclusive), for trend charts"""
+    if name not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate: {name}")
+    return db.read_sql(f"SELECT * FROM {name} WHERE day BETWEEN ? AND ? ORDER BY day",
+                       params=(str(start_day), str(end_day)))
+
+def facility_summary():
+    """Resident count and age statistics in one row"""
+    with db.reader() as conn:
+        residents, avg_age, min_age, max_age = conn.execute('''
+        SELECT COUNT(*), AVG(age), MIN(age), MAX(age) FROM (
+            SELECT CAST(strftime('%Y.%m%d', 'now') - strftime('%Y.%m%d', geb) AS INTEGER) AS age FROM patient
+        )''').fetchone()
+    return {"residents": residents, "avg_age": avg_age, "min_age": min_age, "max_age": max_age}
@@ -0,0 +1,335 @@
+import threading
+from collections import deque
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+#######################
+# Incremental consumption anomalies
+REFIT_INTERVAL = 24 * 60 * 60   # refit the model at least once a day
+DRIFT_THRESHOLD = 0.5           # or earlier when a feature mean moved by this many fitted standard deviations
+CHECK_WINDOW = 1000             # most recent processed orders whose content sync() compares on every change
+
+
+def combine_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """
+    Merge two sets of (count, mean, M2) sufficient statistics (Chan et al. / Welford).
+    Works element-wise on aligned Series, so many residents are updated at once.
+    """
+    count = count_a + count_b
+    delta = mean_b - mean_a
+    safe_count = count.where(count > 0, 1)
+    mean = mean_a + delta * count_b / safe_count
+    m2 = m2_a + m2_b + delta ** 2 * count_a * count_b / safe_count
+    return count, mean, m2
+
+
+CHECKSUM_COLUMNS = ['order_id', 'resident_id', 'actual_consumption']
+
+def order_hashes(orders):
+    """One hash per order of CHECKSUM_COLUMNS, indexed and sorted by order_id"""
+    hashes = pd.util.hash_pandas_object(orders[CHECKSUM_COLUMNS], index=False)
+    return pd.Series(hashes.to_numpy(), index=orders['order_id'].to_numpy()).sort_index(kind='stable')
+
+
+class IncrementalConsumptionDetector:
+    """
+    Consumption anomalies per resident without reprocessing the whole order history.
+    - update(): folds new orders into running per-resident count/mean/M2 statistics
+    - sync(): update() with the orders above the cursor, or a rebuild when processed orders changed;
+      nothing at all while the input's version is unchanged
+    - refit(): fits scaler and IsolationForest; only done on a schedule or after drift
+    - score(): batch prediction for all residents with the current model
+    Uses the same features and model settings as utils.detect_consumption_anomalies.
+    """
+
+    def __init__(self, contamination=0.1, random_state=42, refit_interval=REFIT_INTERVAL,
+                 drift_threshold=DRIFT_THRESHOLD):
+        self.contamination = contamination
+        self.random_state = random_state
+        self.refit_interval = refit_interval
+        self.drift_threshold = drift_threshold
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = pd.DataFrame({'count': pd.Series(dtype='float64'),
+                                       'mean': pd.Series(dtype='float64'),
+                                       'm2': pd.Series(dtype='float64')})
+            self.stats.index.name = 'resident_id'
+            self.last_order_id = None
+            # Rows folded in so far (order_id <= last_order_id), hashes of the CHECK_WINDOW newest of them
+            # and the version of the input at the last sync()
+            self.processed_rows = 0
+            self.recent_hashes = pd.Series(dtype='uint64')
+            self.version = None
+            self.scaler = None
+            self.model = None
+            self.fitted_at = None
+            self.fit_feature_mean = None
+            self.orders_since_fit = 0
+
+    def update(self, new_orders):
+        """Add new meal orders (resident_id, actual_consumption[, order_id]) to the running statistics"""
+        with self._lock:
+            orders = new_orders.dropna(subset=['actual_consumption'])
+            if orders.empty:
+                return 0
+            batch = orders.groupby('resident_id')['actual_consumption'].agg(['count', 'mean', 'var'])
+            batch['m2'] = batch['var'].fillna(0) * (batch['count'] - 1)
+
+            index = self.stats.index.union(batch.index)
+            current = self.stats.reindex(index, fill_value=0.0)
+            added = batch.reindex(index, fill_value=0.0)
+            count, mean, m2 = combine_moments(current['count'], current['mean'], current['m2'],
+                                              added['count'], added['mean'], added['m2'])
+            self.stats = pd.DataFrame({'count': count, 'mean': mean, 'm2': m2}, index=index)
+            self.stats.index.name = 'resident_id'
+
+            if 'order_id' in orders:
+                newest = orders['order_id'].max()
+                self.last_order_id = newest if self.last_order_id is None else max(self.last_order_id, newest)
+                self.processed_rows += len(new_orders)
+                hashes = order_hashes(new_orders)
+                if len(self.recent_hashes):
+                    hashes = pd.concat([self.recent_hashes, hashes]).sort_index(kind='stable')
+                self.recent_hashes = hashes.iloc[-CHECK_WINDOW:]
+            self.orders_since_fit += len(orders)
+            return len(orders)
+
+    def is_current(self, version):
+        """True if the input had `version` at the last sync(); None is never current"""
+        return version is not None and version == self.version
+
+    def sync(self, orders, version=None):
+        """
+        Bring the statistics up to date with `orders`, the complete current input (with order_id).
+        `version` is a change token of the input (e.g. db.data_version()); while it is unchanged nothing
+        is read. Otherwise the orders above the cursor are folded in, after a cheap check of the ones
+        already processed: their number, and the content of the CHECK_WINDOW newest. If they differ
+        (removed, filtered differently, arrived with a lower id or recently edited), everything is
+        rebuilt; edits of older orders are not noticed, call reset() after such corrections.
+        Returns the number of orders folded in.
+        """
+        with self._lock:
+            if self.is_current(version):
+                return 0
+            if self.last_order_id is not None:
+                order_ids = orders['order_id']
+                processed = order_ids <= self.last_order_id
+                recent = processed & (order_ids >= self.recent_hashes.index[0])
+                if (processed.sum() != self.processed_rows
+                        or not order_hashes(orders[recent]).equals(self.recent_hashes)):
+                    self.reset()
+                else:
+                    orders = orders[~processed]
+            added = self.update(orders)
+            self.version = version
+            return added
+
+    def features(self):
+        """mean and (sample) standard deviation of the consumption per resident"""
+        with self._lock:
+            std = np.sqrt(self.stats['m2'] / (self.stats['count'] - 1)).where(self.stats['count'] > 1)
+            return pd.DataFrame({
+                'mean_consumption': self.stats['mean'],
+                'std_consumption': std,
+                'meal_count': self.stats['count'].astype(int)
+            })
+
+    def drift(self):
+        """Largest shift of a feature mean since the last fit, in fitted standard deviations"""
+        with self._lock:
+            if self.scaler is None:
+                return np.inf
+            current = self.features()[['mean_consumption', 'std_consumption']].fillna(0).mean().values
+            scale = np.where(self.scaler.scale_ > 0, self.scaler.scale_, 1)
+            return float(np.max(np.abs(current - self.fit_feature_mean) / scale))
+
+    def needs_refit(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            if self.model is None:
+                return True
+            if self.orders_since_fit == 0:
+                return False
+            return now - self.fitted_at >= self.refit_interval or self.drift() > self.drift_threshold
+
+    def refit(self):
+        with self._lock:
+            features = self.features()[['mean_consumption', 'std_consumption']].fillna(0).values
+            self.scaler = StandardScaler()
+            features_scaled = self.scaler.fit_transform(features)
+            self.model = IsolationForest(contamination=self.contamination, random_state=self.random_state)
+            self.model.fit(features_scaled)
+            self.fitted_at = time.time()
+            self.fit_feature_mean = features.mean(axis=0)
+            self.orders_since_fit = 0
+
+    def score(self):
+        """Per-resident statistics with is_anomaly, refitting first if the schedule or drift requires it"""
+        with self._lock:
+            if self.stats.empty:
+                return pd.DataFrame(columns=['resident_id', 'mean_consumption', 'std_consumption', 'meal_count', 'is_anomaly'])
+            if self.needs_refit():
+                self.refit()
+            resident_stats = self.features()
+            features = resident_stats[['mean_consumption', 'std_consumption']].fillna(0).values
+            resident_stats['is_anomaly'] = self.model.predict(self.scaler.transform(features)) == -1
+            return resident_stats.reset_index()
+
+#######################
+# Rolling meal pattern anomalies
+MEAL_PATTERN_WINDOW = 28        # days of history per meal type in the rolling baseline
+MEAL_PATTERN_MIN_DAYS = 7       # no flags until the baseline has this many days
+MEAL_PATTERN_THRESHOLD = 2.0    # |z| above this is an anomaly, like detect_meal_pattern_anomalies
+MEAL_PATTERN_FLAG_DAYS = 365    # days with flags kept for flagged(); older ones are dropped
+
+
+class RollingMealPatternDetector:
+    """
+    Daily consumption per meal type (and optionally floor/care level) compared with a moving baseline.
+    - mode="rolling": mean/std of the last `window` days, kept as Welford mean/M2 over a deque
+    - mode="ewm": exponentially weighted mean/variance with the given span
+    Each day is scored against the baseline *before* it is added, so one update per day
+    costs the same no matter how much history there is. update_day() returns only the new flags;
+    update() only looks at the rows after the last processed day (pass pre-typed datetime dates
+    so they are selected without converting the whole history).
+    """
+
+    def __init__(self, window=MEAL_PATTERN_WINDOW, mode="rolling", group_by=("meal_type",),
+                 min_days=MEAL_PATTERN_MIN_DAYS, threshold=MEAL_PATTERN_THRESHOLD, flag_days=MEAL_PATTERN_FLAG_DAYS):
+        if mode not in ("rolling", "ewm"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.window = window
+        self.mode = mode
+        self.group_by = list(group_by)
+        self.min_days = min_days
+        self.threshold = threshold
+        self.flag_days = flag_days
+        self.alpha = 2 / (window + 1)
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = {}
+            self.last_date = None
+            # One frame per day with flags; bounded so a long-running process does not grow
+            self._flagged = deque(maxlen=self.flag_days)
+
+    def _baseline(self, state):
+        """(mean, std, days) of a group before today's value is added"""
+        if self.mode == "rolling":
+            days = len(state["values"])
+            if days < 2:
+                return np.nan, np.nan, days
+            variance = max(state["m2"] / (days - 1), 0.0)
+            return state["mean"], np.sqrt(variance), days
+        if state["days"] < 2:
+            return state["mean"], np.nan, state["days"]
+        return state["mean"], np.sqrt(state["var"]), state["days"]
+
+    def _add(self, state, value):
+        if self.mode == "rolling":
+            # Welford update, with the inverse step for the day that leaves the window; running
+            # sums of squares would cancel catastrophically for values with a large mean
+            values = state["values"]
+            if len(values) == self.window:
+                old = values.popleft()
+                count = len(values)
+                if count == 0:
+                    state["mean"], state["m2"] = 0.0, 0.0
+                else:
+                    delta = old - state["mean"]
+                    state["mean"] -= delta / count
+                    state["m2"] -= delta * (old - state["mean"])
+            values.append(value)
+            delta = value - state["mean"]
+            state["mean"] += delta / len(values)
+            state["m2"] += delta * (value - state["mean"])
+        elif state["days"] == 0:
+            state["mean"] = value
+        else:
+            delta = value - state["mean"]
+            state["mean"] += self.alpha * delta
+            state["var"] = (1 - self.alpha) * (state["var"] + self.alpha * delta ** 2)
+        state["days"] += 1
+
+    def _new_state(self):
+        if self.mode == "rolling":
+            return {"values": deque(), "mean": 0.0, "m2": 0.0, "days": 0}
+        return {"mean": 0.0, "var": 0.0, "days": 0}
+
+    def score_day(self, date, day_orders):
+        """Score and absorb one day of orders; returns one row per group with z_score and is_anomaly"""
+        with self._lock:
+            date = pd.Timestamp(date)
+            if self.last_date is not None and date <= self.last_date:
+                return pd.DataFrame()
+            daily = day_orders.groupby(self.group_by, observed=True)['actual_consumption'].mean()
+            rows = []
+            for key, value in daily.items():
+                if pd.isna(value):
+                    continue
+                state = self.state.setdefault(key, self._new_state())
+                mean, std, days = self._baseline(state)
+                z_score = (value - mean) / std if days >= 2 and std > 0 else np.nan
+                key_values = key if isinstance(key, tuple) else (key,)
+                rows.append({
+                    'date': date,
+                    **dict(zip(self.group_by, key_values)),
+                    'actual_consumption': value,
+                    'mean_consumption': mean,
+                    'std_consumption': std,
+                    'z_score': z_score,
+                    'is_anomaly': days >= self.min_days and abs(z_score) > self.threshold
+                })
+                self._add(state, value)
+            self.last_date = date
+            return pd.DataFrame(rows)
+
+    def update_day(self, date, day_orders):
+        """Add one day of orders and return only the newly flagged groups of that day"""
+        with self._lock:
+            scored = self.score_day(date, day_orders)
+            if scored.empty:
+                return scored
+            flagged = scored[scored['is_anomaly']].reset_index(drop=True)
+            if not flagged.empty:
+                self._flagged.append(flagged)
+            return flagged
+
+    def flagged(self):
+        """The flags of the last flag_days days that had any (every flag since the reset until then)"""
+        with self._lock:
+            if not self._flagged:
+                return pd.DataFrame()
+            return pd.concat(self._flagged, ignore_index=True)
+
+    def new_rows(self, meal_orders):
+        """The orders dated after the last processed day"""
+        with self._lock:
+            if self.last_date is None:
+                return meal_orders
+            dates = meal_orders['date']
+            if not pd.api.types.is_datetime64_any_dtype(dates):
+                dates = pd.to_datetime(dates)
+            return meal_orders[(dates > self.last_date).to_numpy()]
+
+    def update(self, meal_orders):
+        """Process every day after the last processed one, in date order; returns all new flags"""
+        with self._lock:
+            meal_orders = self.new_rows(meal_orders)
+            dates = meal_orders['date']
+            if not pd.api.types.is_datetime64_any_dtype(dates):
+                dates = pd.to_datetime(dates)
+            flagged = [self.update_day(date, day_orders)
+                       for date, day_orders in meal_orders.groupby(dates, sort=True)]
+        flagged = [frame for frame in flagged if not frame.empty]
+        if not flagged:
+            return pd.DataFrame()
+        return pd.concat(flagged, ignore_index=True)
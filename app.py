@@ -9,15 +9,28 @@ from PIL import Image
 import base64
 from io import BytesIO
 import streamlit_push_notifications
-from utils import setup_page_config, load_database_data, calculate_social_isolation_risk, calculate_fall_risk
-from chaty import smart_research_chatbot  # Import the smart_research_chatbot function
+import profiling
+import timeseries
+import search
+from utils import (setup_page_config, load_database_data, compute_risk_scores, get_resident_risk,
+                   pair_door_events, format_durations, activity_note_styles)
+from scheduler import get_risk_scheduler, alerts_since
+from chaty import stream_smart_research_chatbot, get_chat_cache  # Streaming variant of smart_research_chatbot
+from data_access import (get_resident_vitals, get_resident_allergies, get_resident_activity_history,
+                         get_resident_door_events, get_resident_sleep,
+                         get_resident_doctor_visits, get_resident_room, get_resident_smart_home,
+                         ACTIVITY_PAGE_SIZE)
 
 # Setup page configuration
 setup_page_config()
 
-# Load database data
+# Timing spans and SQL statistics of this rerun (only with ?debug=1 or HZL_PROFILE=1)
+profiling.start_rerun()
+profiling.section("Daten laden")
+
+# Load database data (tables are loaded lazily on first access)
 db_data = load_database_data()
-patients = db_data.get('patient', pd.DataFrame())
+patients = db_data.get('patient', pd.DataFrame()).copy()
 
 # Function to convert base64 to image
 def base64_to_image(base64_string):
@@ -48,7 +61,8 @@ def get_profile_picture(nachname):
 def calculate_age(birthdate):
     today = datetime.today()
     try:
-        birthdate = datetime.strptime(birthdate, "%Y-%m-%d")
+        # geb is loaded as datetime64; strings are still accepted
+        birthdate = pd.Timestamp(birthdate)
         return today.year - birthdate.year - ((today.month, today.day) < (birthdate.month, birthdate.day))
     except:
         return None
@@ -67,28 +81,31 @@ if not patients.empty:
 
 st.title("Übersicht")
 
+profiling.section("Sidebar: Bewohnerliste")
+
 # Add Logo
 st.sidebar.image("./img/logo_lang.png", width=250)
 
 # Sidebar: Patientensuche
 st.sidebar.header("Bewohner")
-search = st.sidebar.text_input("Suche nach Name oder ID")
+query = st.sidebar.text_input("Suche nach Name, ID oder Zimmer")
 
-# Filter Patienten basierend auf Suche
-filtered_patients = patients.copy()
-if search:
-    filtered_patients = filtered_patients[
-        (filtered_patients["pat_id"].astype(str).str.contains(search, case=False)) |
-        (filtered_patients["vorname"].str.contains(search, case=False)) |
-        (filtered_patients["nachname"].str.contains(search, case=False))
-    ]
+# Ranked results from the prebuilt index (umlaut-folded prefix and trigram lookup, tolerates typos)
+search_index = search.get_search_index()
+if st.session_state.get("resident_search_query") != query:
+    # A new search starts on the first page
+    st.session_state["resident_search_query"] = query
+    st.session_state["resident_search_page"] = 1
+patient_list, result_count, result_pages = search_index.page(query, st.session_state.get("resident_search_page", 1))
+if st.session_state.get("resident_search_page", 1) > result_pages:
+    st.session_state["resident_search_page"] = result_pages
 
 # Patientenliste in Sidebar als Radio-Buttons anzeigen
 st.sidebar.subheader("Wähle einen Bewohner")
-patient_list = [
-    f"{row['vorname']} {row['nachname']} (ID: {row['pat_id']})"
-    for _, row in filtered_patients.iterrows()
-]
+if result_pages > 1:
+    st.sidebar.number_input(f"Seite (von {result_pages})", min_value=1, max_value=result_pages, step=1,
+                            key="resident_search_page")
+    st.sidebar.caption(f"{result_count} Treffer")
 
 # Add custom CSS for larger patient list items
 st.markdown("""
@@ -127,6 +144,36 @@ st.markdown("""
 # Show the patients as radio buttons in the sidebar
 selected_patient_info = st.sidebar.radio("", patient_list, index=0 if patient_list else None)
 
+profiling.section("Risikowerte und Benachrichtigungen")
+
+# Risk scores are recomputed in the background; its alerts cover every resident, not only the one on screen
+get_risk_scheduler()
+notifications = streamlit_push_notifications.get_notification_queue()
+# Each session remembers the last alert it sent, so every open dashboard gets every alert once
+alerts, st.session_state["last_alert_id"] = alerts_since(st.session_state.get("last_alert_id"))
+for alert in alerts:
+    notifications.enqueue(title=alert["title"],
+            body=alert["body"],
+            icon_path="./img/warning.png",
+            #sound_path="https://example.com/your_sound.mp3",
+            tag=f"{alert['kind']}-{alert['resident_id']}")
+# All due notifications in one component; reruns without new alerts add nothing
+notifications.render()
+
+# Facility-wide risk list, computed in one batch together with the resident header below
+risk_scores = compute_risk_scores()
+at_risk = risk_scores[(risk_scores['isolation_risk'] > 50) | (risk_scores['fall_risk'] > 50)]
+with st.sidebar.expander(f"Bewohner mit erhöhtem Risiko ({len(at_risk)})"):
+    at_risk_display = at_risk.join(patients.set_index('pat_id')[['vorname', 'nachname']])
+    at_risk_display = pd.DataFrame({
+        "Bewohner": at_risk_display['vorname'] + " " + at_risk_display['nachname'],
+        "Isolation %": at_risk_display['isolation_risk'],
+        "Sturz %": at_risk_display['fall_risk'],
+    }).sort_values("Isolation %", ascending=False)
+    st.dataframe(at_risk_display, hide_index=True, use_container_width=True)
+
+profiling.section("Chat")
+
 # Improved chat interface
 st.sidebar.markdown("### Assistenz-Chat")
 st.sidebar.markdown("Stellen Sie Fragen zu Bewohnern oder zur Datenbank:")
@@ -147,13 +194,19 @@ if prompt := st.sidebar.chat_input("Frage stellen..."):
     st.session_state.chat_history.append({"role": "user", "content": prompt})
     messages.chat_message("user").write(prompt)
     
-    # Get AI response using the smart_research_chatbot function
-    with st.spinner("Nachdenken..."):  # Changed from st.sidebar.spinner to st.spinner
-        response = smart_research_chatbot(prompt)
+    # Stream the AI response into the chat as the tokens arrive
+    with messages.chat_message("assistant"):
+        response = st.write_stream(stream_smart_research_chatbot(prompt))
     
     # Add assistant response to chat history
     st.session_state.chat_history.append({"role": "assistant", "content": response})
-    messages.chat_message("assistant").write(response)
+
+# Repeated questions are answered from the chat cache
+answer_stats = get_chat_cache().stats()["answer"]
+if answer_stats["hits"] + answer_stats["misses"]:
+    st.sidebar.caption(f"Antwort-Cache: {answer_stats['hits']} Treffer, {answer_stats['misses']} neu beantwortet")
+
+profiling.section("Bewohnerdetails")
 
 # Falls ein Patient ausgewählt wurde, entsprechende DetaiFls abrufen
 if selected_patient_info:
@@ -163,16 +216,8 @@ if selected_patient_info:
     st.header(f"Bewohner: {selected_patient['vorname']} {selected_patient['nachname']}")
 
     # Calculate all status metrics
-    isolation_risk, isolation_factors = calculate_social_isolation_risk(selected_patient_id)
-    fall_risk, fall_factors = calculate_fall_risk(selected_patient_id)
-
-    if isolation_risk > 65:
-        streamlit_push_notifications.send_push(title="Akute Isolations Gefahr",
-                body=f"Der Bewohner {selected_patient['vorname']} {selected_patient['nachname']}, zeigt ein starkes Risiko für Vereinsamung .",
-                icon_path="./img/warning.png",
-                #sound_path="https://example.com/your_sound.mp3",
-                tag="Isolations Gefahr")
-    
+    isolation_risk, isolation_factors, fall_risk, fall_factors = get_resident_risk(selected_patient_id)
+
     # Display four key metrics in a row
     col1, col2, col3, col4 = st.columns(4)
     
@@ -214,7 +259,7 @@ if selected_patient_info:
     # Tabs für unterschiedliche Ansichten
     tab1, tab2, tab3 = st.tabs(["Bewohner-Informationen", "Datenvisualisierung", "Sicherheitsdaten"])
     
-    with tab1:
+    with tab1, profiling.span("Tab: Bewohner-Informationen"):
         col1, col2 = st.columns(2)
 
         with col1:
@@ -234,8 +279,7 @@ if selected_patient_info:
                 # This is needed because health_vitals uses resident_id
                 resident_id = selected_patient_id  # Assuming they match
                 
-                vitals = db_data['health_vitals']
-                patient_vitals = vitals[vitals['resident_id'] == resident_id]
+                patient_vitals = get_resident_vitals(resident_id)
                 
                 if not patient_vitals.empty:
                     latest_vitals = patient_vitals.iloc[-1]
@@ -248,8 +292,7 @@ if selected_patient_info:
             st.subheader("Zimmerdaten")
             # Get room information
             if 'raum' in db_data:
-                rooms = db_data['raum']
-                patient_room = rooms[rooms['pat_id'] == selected_patient_id]
+                patient_room = get_resident_room(selected_patient_id)
                 if not patient_room.empty:
                     room_info = patient_room.iloc[0]
                     st.write(f"**Zimmer-Nr:** {room_info['raum_nr']}")
@@ -257,8 +300,7 @@ if selected_patient_info:
             
             # Show allergies if available
             if 'allergies' in db_data:
-                allergies = db_data['allergies']
-                patient_allergies = allergies[allergies['resident_id'] == resident_id]
+                patient_allergies = get_resident_allergies(resident_id)
                 if not patient_allergies.empty:
                     st.subheader("Allergien")
                     for _, allergy in patient_allergies.iterrows():
@@ -267,55 +309,36 @@ if selected_patient_info:
         # Aktivitäten anzeigen
         if 'activity_participation' in db_data and 'activities' in db_data:
             st.subheader("Aktivitäten")
-            activities = db_data['activities']
-            participation = db_data['activity_participation']
-            
-            patient_activities = participation[participation['resident_id'] == resident_id]
-            
-            if not patient_activities.empty:
-                # Join with activities to get names
-                activity_data = []
-                for _, part in patient_activities.iterrows():
-                    act_id = part['activity_id']
-                    act = activities[activities['id'] == act_id]
-                    if not act.empty:
-                        activity_data.append({
-                            "Datum": part['date'],
-                            "Aktivität": act.iloc[0]['name'],
-                            "Teilgenommen": "Ja" if part['attended'] == 1 else "Nein",
-                            "Notizen": part['notes']
-                        })
-                
-                if activity_data:
-                    # Create DataFrame
-                    activity_df = pd.DataFrame(activity_data)
-                    
-                    # Define styling function to highlight rows based on note content
-                    def highlight_activity_notes(row):
-                        if isinstance(row['Notizen'], str):
-                            if "Did not feel well" in row['Notizen']:
-                                return ['background-color: rgba(255, 0, 0, 0.2)'] * len(row)
-                            elif "Enjoyed the activity" in row['Notizen']:
-                                return ['background-color: rgba(0, 255, 0, 0.2)'] * len(row)
-                        return [''] * len(row)
-                    
-                    # Apply styling and display dataframe
-                    st.dataframe(
-                        activity_df.style.apply(highlight_activity_notes, axis=1),
-                        use_container_width=True
-                    )
-                else:
-                    st.write("Keine Aktivitätsdaten verfügbar.")
+            history = get_resident_activity_history(resident_id)
+
+            if not history.empty:
+                pages = -(-len(history) // ACTIVITY_PAGE_SIZE)
+                page_key = f"activity_page_{resident_id}"
+                # The history may have become shorter since the page was chosen
+                if st.session_state.get(page_key, 1) > pages:
+                    st.session_state[page_key] = pages
+                first = (st.session_state.get(page_key, 1) - 1) * ACTIVITY_PAGE_SIZE
+                activity_df = history.iloc[first:first + ACTIVITY_PAGE_SIZE]
+
+                # Only the visible page is styled and sent to the browser
+                st.dataframe(
+                    activity_df.style.apply(activity_note_styles, axis=None),
+                    use_container_width=True,
+                    hide_index=True
+                )
+                if pages > 1:
+                    st.number_input(f"Seite (von {pages})", min_value=1, max_value=pages, step=1, key=page_key)
+                    st.caption(f"Einträge {first + 1}–{first + len(activity_df)} von {len(history)}")
             else:
                 st.write("Keine Aktivitätsdaten verfügbar.")
     
-    with tab2:
+    with tab2, profiling.span("Tab: Datenvisualisierung"):
         st.subheader("Gesundheitsdaten-Visualisierung")
         
         # Health vitals visualization
         if 'health_vitals' in db_data:
-            vitals = db_data['health_vitals']
-            patient_vitals = vitals[vitals['resident_id'] == resident_id]
+            # Sorted by measurement time and shared with other sessions (not modified here)
+            patient_vitals = timeseries.series_window("vitals", resident_id)
             
             if not patient_vitals.empty:
                 # Data selection
@@ -330,41 +353,44 @@ if selected_patient_info:
                     list(metric_options.keys())
                 )
                 
-                # Convert measurement_time to datetime
-                try:
-                    patient_vitals['measurement_time'] = pd.to_datetime(patient_vitals['measurement_time'])
-                    patient_vitals = patient_vitals.sort_values('measurement_time')
-                except:
-                    pass  # If conversion fails, use as is
-                
-                # Line chart for selected metric
-                fig = px.line(
-                    patient_vitals, 
-                    x="measurement_time", 
-                    y=metric_options[selected_metric],
-                    title=f"{selected_metric} Trend",
-                    markers=True
+                # Visible range; the charts get at most timeseries.CHART_POINTS points of it
+                range_start, range_end = timeseries.date_range_selector(
+                    "Zeitraum:", *timeseries.series_bounds("vitals", resident_id), key=f"vitals_range_{resident_id}"
                 )
-                st.plotly_chart(fig, use_container_width=True)
+                metric_column = metric_options[selected_metric]
+                vitals_in_range = timeseries.series_window("vitals", resident_id, range_start, range_end)
+                
+                if vitals_in_range.empty:
+                    st.info("Keine Messwerte im gewählten Zeitraum.")
+                else:
+                    # Line chart for selected metric
+                    with profiling.span("Diagramm: Vitalwerte Verlauf"):
+                        chart_data, level, raw_rows = timeseries.chart_series(
+                            "vitals", resident_id, metric_column, range_start, range_end
+                        )
+                        fig = timeseries.series_figure(
+                            chart_data, "measurement_time", metric_column, f"{selected_metric} Trend", level
+                        )
+                        st.plotly_chart(fig, use_container_width=True)
+                        st.caption(timeseries.series_caption(chart_data, level, raw_rows))
                 
-                # Statistics
-                avg_value = patient_vitals[metric_options[selected_metric]].mean()
-                max_value = patient_vitals[metric_options[selected_metric]].max()
-                min_value = patient_vitals[metric_options[selected_metric]].min()
+                    # Statistics
+                    avg_value = vitals_in_range[metric_column].mean()
+                    max_value = vitals_in_range[metric_column].max()
+                    min_value = vitals_in_range[metric_column].min()
                 
-                col1, col2, col3 = st.columns(3)
-                col1.metric("Durchschnitt", f"{avg_value:.1f}")
-                col2.metric("Maximum", f"{max_value}")
-                col3.metric("Minimum", f"{min_value}")
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Durchschnitt", f"{avg_value:.1f}")
+                    col2.metric("Maximum", f"{max_value}")
+                    col3.metric("Minimum", f"{min_value}")
                 
-                # Add histogram
-                fig2 = px.histogram(
-                    patient_vitals, 
-                    x=metric_options[selected_metric],
-                    nbins=10,
-                    title=f"{selected_metric} Verteilung"
-                )
-                st.plotly_chart(fig2, use_container_width=True)
+                    # Add histogram (binned here, the browser only gets the bin counts)
+                    with profiling.span("Diagramm: Vitalwerte Verteilung"):
+                        fig2 = timeseries.histogram_figure(
+                            timeseries.histogram(vitals_in_range[metric_column], bins=10),
+                            f"{selected_metric} Verteilung", metric_column
+                        )
+                        st.plotly_chart(fig2, use_container_width=True)
                 
                 # Export options
                 st.subheader("Datenexport")
@@ -372,7 +398,7 @@ if selected_patient_info:
                 with col1:
                     st.download_button(
                         "CSV-Daten exportieren",
-                        data=patient_vitals.to_csv(index=False).encode('utf-8'),
+                        data=timeseries.series_csv("vitals", resident_id),
                         file_name=f"{selected_patient['nachname']}_{selected_patient['vorname']}_vitalwerte.csv",
                         mime="text/csv"
                     )
@@ -380,8 +406,7 @@ if selected_patient_info:
                 with col2:
                     # Sleep data if available
                     if 'sleep_quality' in db_data:
-                        sleep_data = db_data['sleep_quality']
-                        patient_sleep = sleep_data[sleep_data['resident_id'] == resident_id]
+                        patient_sleep = get_resident_sleep(resident_id)
                         
                         if not patient_sleep.empty:
                             st.download_button(
@@ -395,8 +420,7 @@ if selected_patient_info:
 
             # Add doctor visits if available
             if 'doctor_visits' in db_data:
-                visits = db_data['doctor_visits']
-                patient_visits = visits[visits['resident_id'] == resident_id]
+                patient_visits = get_resident_doctor_visits(resident_id)
                 
                 if not patient_visits.empty:
                     st.subheader("Arztbesuche")
@@ -410,22 +434,28 @@ if selected_patient_info:
 #tab3 Sicherheitsdaten 
 
 
-    with tab3:
+    with tab3, profiling.span("Tab: Sicherheitsdaten"):
         st.subheader("Sicherheitsdaten")
         
+        # One visible range for the transactions and the night exits
+        door_events = get_resident_door_events(selected_patient_id) if 'Ein_aus' in db_data else pd.DataFrame()
+        door_times = pd.to_datetime(door_events.get('zeitstempel', pd.Series(dtype=object)), errors='coerce').dropna()
+        first_transaction, last_transaction = (timeseries.series_bounds("transactions", selected_patient_id)
+                                               if 'trust_account_transactions' in db_data else (None, None))
+        range_bounds = [t for t in (first_transaction, last_transaction) if t is not None]
+        if not door_times.empty:
+            range_bounds += [door_times.min(), door_times.max()]
+        range_start, range_end = timeseries.date_range_selector(
+            "Zeitraum:", min(range_bounds, default=None), max(range_bounds, default=None),
+            key=f"security_range_{selected_patient_id}"
+        )
+        
         # Treuhand-Transaktionen
         if 'trust_account_transactions' in db_data:
-            transactions = db_data['trust_account_transactions']
-            patient_transactions = transactions[transactions['resident_id'] == selected_patient_id]
+            # Sorted by transaction date and shared with other sessions (not modified here)
+            patient_transactions = timeseries.series_window("transactions", selected_patient_id, range_start, range_end)
             
             if not patient_transactions.empty:
-                # Convert transaction_date to datetime and sort chronologically
-                try:
-                    patient_transactions['transaction_date'] = pd.to_datetime(patient_transactions['transaction_date'])
-                    patient_transactions = patient_transactions.sort_values('transaction_date')
-                except:
-                    pass  # If conversion fails, use as is
-                    
                 st.subheader("Treuhand-Transaktionen")
                 
                 # Define styling function to highlight transactions based on amount
@@ -443,57 +473,30 @@ if selected_patient_info:
                     use_container_width=True
                 )
                 
-                # Visualize transactions over time (keep this part unchanged)
-                fig = px.line(patient_transactions, x='transaction_date', y='amount', title="Finanzielle Transaktionen", markers=True)
-                st.plotly_chart(fig, use_container_width=True)
+                # Visualize transactions over time; min-max buckets keep the largest deposits and expenses
+                with profiling.span("Diagramm: Transaktionen"):
+                    chart_data, level, raw_rows = timeseries.chart_series(
+                        "transactions", selected_patient_id, "amount", range_start, range_end, method="minmax"
+                    )
+                    fig = timeseries.series_figure(chart_data, 'transaction_date', 'amount', "Finanzielle Transaktionen", level)
+                    st.plotly_chart(fig, use_container_width=True)
+                    st.caption(timeseries.series_caption(chart_data, level, raw_rows))
             else:
                 st.info("Keine Transaktionsdaten verfügbar.")
         
         # Ausgehzeiten
         if 'Ein_aus' in db_data:
-            exit_data = db_data['Ein_aus']
-            
-            # Convert all timestamps to datetime for the patient
             try:
-                all_patient_data = exit_data[exit_data['pat_id'] == selected_patient_id].copy()
-                all_patient_data['zeitstempel'] = pd.to_datetime(all_patient_data['zeitstempel'])
-                
-                # Separate exit and entry events
-                exit_events = all_patient_data[all_patient_data['ausgang'] == 1]
-                entry_events = all_patient_data[all_patient_data['ausgang'] == 0]
-                
-                # Calculate durations by matching exits with next entries
-                night_exits = []
-                
-                for _, exit_event in exit_events.iterrows():
-                    exit_time = exit_event['zeitstempel']
-                    # Check if exit time is between 21:00 and 06:00
-                    if exit_time.hour >= 21 or exit_time.hour < 6:
-                        # Find the next entry after this exit
-                        next_entries = entry_events[entry_events['zeitstempel'] > exit_time]
-                        if not next_entries.empty:
-                            entry_time = next_entries.iloc[0]['zeitstempel']
-                            duration_minutes = (entry_time - exit_time).total_seconds() / 60
-                            
-                            # Skip if duration is more than 12 hours (720 minutes) - likely vacation
-                            if duration_minutes <= 720:
-                                # Format duration as hours if more than 60 minutes
-                                if duration_minutes > 60:
-                                    duration_str = f"{duration_minutes / 60:.1f} Stunden"
-                                else:
-                                    duration_str = f"{duration_minutes:.1f} Minuten"
-                                
-                                night_exits.append({
-                                    'Ausgang': exit_time,
-                                    'Eingang': entry_time,
-                                    'Dauer': duration_str,
-                                    'Dauer_Minuten': duration_minutes  # Keep raw minutes for calculations
-                                })
+                # Pair exits with the next entry and keep night excursions below 12 hours (longer is likely vacation)
+                excursions = pair_door_events(door_events)
+                night_exits = excursions[excursions['is_night'] & ~excursions['is_vacation']]
+                if range_start is not None:
+                    night_exits = night_exits[(night_exits['Ausgang'] >= range_start) & (night_exits['Ausgang'] < range_end)]
                 
                 # Create DataFrame with the night exits and their durations
-                if night_exits:
-                    night_exits_df = pd.DataFrame(night_exits)
-                    night_exits_df = night_exits_df.sort_values('Ausgang')
+                if not night_exits.empty:
+                    night_exits_df = night_exits[['Ausgang', 'Eingang', 'Dauer_Minuten']].sort_values('Ausgang')
+                    night_exits_df['Dauer'] = format_durations(night_exits_df['Dauer_Minuten'])
                     
                     st.subheader("Nächtliche Ausgehzeiten (21:00-6:00)")
                     # Show the formatted duration column but not the raw minutes column
@@ -501,8 +504,10 @@ if selected_patient_info:
                     st.dataframe(display_df, use_container_width=True)
                     
                     # Visualization of night exits
-                    fig = px.histogram(night_exits_df, x='Ausgang', title="Verteilung der nächtlichen Ausgehzeiten", nbins=20)
-                    st.plotly_chart(fig, use_container_width=True)
+                    with profiling.span("Diagramm: Nächtliche Ausgänge"):
+                        fig = timeseries.histogram_figure(timeseries.histogram(night_exits_df['Ausgang'], bins=20),
+                                                          "Verteilung der nächtlichen Ausgehzeiten", 'Ausgang')
+                        st.plotly_chart(fig, use_container_width=True)
                     
                     # Display average duration outside at night
                     avg_duration = night_exits_df['Dauer_Minuten'].mean()
@@ -521,8 +526,7 @@ if selected_patient_info:
         
         # Smart-Home-Daten
         if 'smart_home' in db_data:
-            smart_home_data = db_data['smart_home']
-            patient_smart_home = smart_home_data[smart_home_data['resident_id'] == selected_patient_id]
+            patient_smart_home = get_resident_smart_home(selected_patient_id)
             
             if not patient_smart_home.empty:
                 st.subheader("Smart-Home Überwachung")
@@ -530,8 +534,9 @@ if selected_patient_info:
                 
                 # Visualization
                 device_counts = patient_smart_home['device'].value_counts()
-                fig = px.pie(device_counts, names=device_counts.index, values=device_counts.values, title="Gerätenutzung im Smart Home")
-                st.plotly_chart(fig, use_container_width=True)
+                with profiling.span("Diagramm: Smart Home"):
+                    fig = px.pie(device_counts, names=device_counts.index, values=device_counts.values, title="Gerätenutzung im Smart Home")
+                    st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("Keine Smart-Home-Daten verfügbar.")
 
@@ -543,4 +548,7 @@ st.markdown("""
         <p>Häuser zum Leben - Intelligentes Pflegemanagement System</p>
         <p>© 2025 - Demo Version</p>
     </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# Debug panel with the timings of this rerun (no-op when profiling is off)
+profiling.finish_rerun()
@@ -0,0 +1,255 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# Without a Streamlit runtime every cached function would log a "No runtime found" warning
+os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+
+import db
+import dtypes
+import snapshots
+import generate_data
+import utils
+import chaty
+import timeseries
+import search
+from data_access import get_resident_data_access
+
+# Headless benchmarks of the dashboard's hot paths against generated databases of increasing size:
+#   python benchmark.py --sizes 25,100,400 --save-baseline   # record a baseline
+#   python benchmark.py --sizes 25,100,400                   # compare, exit code 1 on a regression
+# No Streamlit server and no OpenAI key are needed; cached functions are cleared before every run.
+BENCH_DIR = "benchmarks"
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results.json")
+DEFAULT_SIZES = (25, 100, 400)   # residents
+DEFAULT_DAYS = 365
+TOLERANCE = 0.25                 # allowed slowdown / memory growth against the baseline
+MIN_SECONDS_DELTA = 0.005        # smaller differences are timer noise
+MIN_PEAK_DELTA_MB = 1.0
+
+# The database the generated ones copy their legacy schema and menus from
+TEMPLATE_DB = db.DB_PATH
+CARE_LEVELS = {"Fully mobile": 1, "Cane": 2, "Walker-assisted": 3, "Wheelchair": 4}
+
+#######################
+# Benchmark data
+def database_path(residents, days, start, bench_dir=BENCH_DIR):
+    return os.path.join(bench_dir, f"hzl_{residents}r_{days}d_{start:%Y%m%d}.db")
+
+def prepare_database(residents, days, bench_dir=BENCH_DIR):
+    """
+    Generated database for one size, reused while it is from today.
+    The risk queries look at the last 30 days, so older files are replaced instead of reused.
+    """
+    start = date.today() - timedelta(days=days)
+    path = database_path(residents, days, start, bench_dir)
+    if not os.path.exists(path):
+        os.makedirs(bench_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(bench_dir, f"hzl_{residents}r_{days}d_*.db*")):
+            os.remove(stale)
+        generate_data.generate(path, residents, days, start, template_path=TEMPLATE_DB)
+    return path
+
+def weather_frame(first_day, last_day, seed=42):
+    """Daily weather in the layout of data/weather_data.csv with a seasonal temperature curve"""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(first_day, last_day, freq="D")
+    temperature = 10 - 10 * np.cos(2 * np.pi * (days.dayofyear - 15) / 365) + rng.normal(0, 3, len(days))
+    precipitation = np.where(rng.random(len(days)) < 0.35, rng.gamma(1.5, 3, len(days)), 0)
+    return pd.DataFrame({
+        "date": days, "temperature": temperature.round(1), "precipitation": precipitation.round(1),
+        "humidity": rng.integers(50, 95, len(days)), "pressure": rng.integers(995, 1035, len(days)),
+        "wind_speed": rng.integers(0, 40, len(days)),
+        "weather_condition": np.where(precipitation > 0, "rainy", np.where(temperature > 18, "sunny", "cloudy")),
+    })
+
+def csv_frames():
+    """The data/ frames (residents, meal_orders, weather_data, menu_items) derived from the configured database"""
+    with db.reader() as conn:
+        residents = pd.read_sql_query("""
+            SELECT r.id AS resident_id, r.age, r.mobility_status, CAST(r.room_number AS INTEGER) AS room_number,
+                   CAST(r.room_number AS INTEGER) / 100 AS floor, date(ra.belegt_seit) AS entry_date,
+                   p.geschlecht AS gender, NULL AS special_dietary_requirements
+            FROM residents r
+            LEFT JOIN patient p ON p.pat_id = r.id
+            LEFT JOIN raum ra ON ra.pat_id = r.id
+        """, conn)
+        meal_orders = pd.read_sql_query("""
+            SELECT id AS order_id, resident_id, date, lower(meal_time) AS meal_type, 'regular' AS portion_size,
+                   NULL AS special_requests, consumed_percent / 100.0 AS actual_consumption
+            FROM menu_selections
+        """, conn)
+    residents.insert(2, "care_level", residents.pop("mobility_status").map(CARE_LEVELS).fillna(1))
+    residents = dtypes.apply_dtypes(residents, dtypes.CSV_DTYPES["residents"])
+    meal_orders = dtypes.apply_dtypes(meal_orders, dtypes.CSV_DTYPES["meal_orders"])
+    weather_data = dtypes.apply_dtypes(weather_frame(meal_orders["date"].min(), meal_orders["date"].max()),
+                                       dtypes.CSV_DTYPES["weather_data"])
+    return {"residents": residents, "meal_orders": meal_orders, "weather_data": weather_data,
+            "menu_items": snapshots.read_csv_typed("menu_items")}
+
+#######################
+# Cases; each gets the context of one database size and does one complete, uncached run
+def load_all_tables(context):
+    utils.load_database_data.clear()
+    registry = utils.load_database_data()
+    return sum(len(registry[name]) for name in registry)
+
+def isolation_risk_per_resident(context):
+    return [utils.calculate_social_isolation_risk(resident_id) for resident_id in context["resident_ids"]]
+
+def fall_risk_per_resident(context):
+    return [utils.calculate_fall_risk(resident_id) for resident_id in context["resident_ids"]]
+
+def risk_scores_batch(context):
+    return utils.compute_risk_scores_uncached()
+
+def consumption_anomalies(context):
+    utils.detect_consumption_anomalies.clear()
+    return utils.detect_consumption_anomalies(context["meal_orders"], context["residents"])
+
+def weather_correlation(context):
+    utils.analyze_weather_correlation.clear()
+    return utils.analyze_weather_correlation(context["meal_orders"], context["weather_data"], context["menu_items"])
+
+def night_exits(context):
+    door_events = db.read_sql("SELECT * FROM Ein_aus")
+    excursions = utils.pair_door_events(door_events)
+    return int(excursions["is_night"].sum())
+
+def vitals_charts(context):
+    timeseries.series_levels.clear()
+    get_resident_data_access().clear()
+    return sum(len(timeseries.chart_series("vitals", resident_id, "heart_rate")[0])
+               for resident_id in context["resident_ids"])
+
+def resident_search(context):
+    search._build_search_index.clear()
+    index = search.get_search_index()
+    return sum(len(index.search(query)) for query in ("m", "mueller", "schmit", "hartman", "12", "anna krüger"))
+
+def database_structure(context):
+    chaty.schema_catalog.invalidate()
+    return chaty.get_database_structure()
+
+CASES = {
+    "load_database_data": load_all_tables,
+    "calculate_social_isolation_risk": isolation_risk_per_resident,
+    "calculate_fall_risk": fall_risk_per_resident,
+    "compute_risk_scores": risk_scores_batch,
+    "detect_consumption_anomalies": consumption_anomalies,
+    "analyze_weather_correlation": weather_correlation,
+    "night_exits": night_exits,
+    "vitals_charts": vitals_charts,
+    "resident_search": resident_search,
+    "get_database_structure": database_structure,
+}
+
+#######################
+# Measuring
+def measure(case, context, repeat):
+    """Wall time of `repeat` runs after one warm-up run, then the peak of one run under tracemalloc"""
+    case(context)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case(context)
+        timings.append(time.perf_counter() - started)
+
+    # Measured separately, tracemalloc slows down every allocation
+    tracemalloc.start()
+    try:
+        case(context)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds_min": min(timings), "seconds_median": statistics.median(timings), "peak_mb": peak / 1024 / 1024}
+
+def run(sizes, days, repeat, case_names, bench_dir=BENCH_DIR):
+    results = []
+    for residents in sizes:
+        path = prepare_database(residents, days, bench_dir)
+        db.configure(path)
+        context = {"resident_ids": list(range(1, residents + 1)), **csv_frames()}
+        for name in case_names:
+            result = {"case": name, "residents": residents, "days": days, **measure(CASES[name], context, repeat)}
+            results.append(result)
+            print(f"{name:<34} {residents:>6} residents  {result['seconds_min'] * 1000:>10.1f} ms"
+                  f"  {result['peak_mb']:>8.1f} MB")
+        utils.load_database_data.clear()
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """Rows of (case, residents, metric, baseline, current, ratio) that got worse than the tolerance allows"""
+    previous = {(r["case"], r["residents"], r["days"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get((result["case"], result["residents"], result["days"]))
+        if before is None:
+            continue
+        for metric, min_delta in (("seconds_min", MIN_SECONDS_DELTA), ("peak_mb", MIN_PEAK_DELTA_MB)):
+            old, new = before[metric], result[metric]
+            if new > old * (1 + tolerance) and new - old > min_delta:
+                regressions.append((result["case"], result["residents"], metric, old, new, new / old if old else float("inf")))
+    return regressions
+
+def save_json(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard's hot paths against generated databases")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated numbers of residents, one generated database each")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="days of history per database")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma-separated subset of: " + ", ".join(CASES))
+    parser.add_argument("--output", default=RESULTS_FILE, help="where to write the results")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed relative regression")
+    args = parser.parse_args()
+
+    case_names = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = set(case_names) - set(CASES)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    report = run(sizes, args.days, args.repeat, case_names)
+    save_json(report, args.output)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        save_json(report, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(report, json.load(f), args.tolerance)
+    for case, residents, metric, old, new, ratio in regressions:
+        print(f"REGRESSION {case} ({residents} residents) {metric}: {old:.4f} -> {new:.4f} ({ratio:.2f}x)")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Cache file path, kept next to the database
+CACHE_PATH = 'chat_cache.db'
+
+MAX_ENTRIES = 500                  # per kind, least recently used entries are evicted first
+SQL_TTL = 7 * 24 * 60 * 60         # generated SQL stays valid as long as the schema does
+ANSWER_TTL = 24 * 60 * 60          # answers are keyed on the data as well, the TTL only bounds the file size
+
+def normalize_question(question):
+    """Normalise a question so trivial variations hit the same cache entry"""
+    question = unicodedata.normalize("NFKC", question).casefold()
+    question = re.sub(r"\s+", " ", question).strip()
+    return question.rstrip("?!. ")
+
+def make_key(*parts):
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class ChatCache:
+    """
+    Persistent cache for the assistant chat, stored in a local SQLite file.
+    - "sql": normalised question + schema version -> generated SQL
+    - "answer": normalised question + SQL + fingerprint of the query result -> answer
+    Entries expire after their TTL and each kind is capped at max_entries (LRU).
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, sql_ttl=SQL_TTL, answer_ttl=ANSWER_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = {"sql": sql_ttl, "answer": answer_ttl}
+        self.hits = {"sql": 0, "answer": 0}
+        self.misses = {"sql": 0, "answer": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_cache (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hit_count INTEGER DEFAULT 0,
+            PRIMARY KEY (kind, key)
+        )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_cache_lru ON chat_cache (kind, last_used)")
+        self._conn.commit()
+
+    def get(self, kind, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM chat_cache WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttls[kind]:
+                self.misses[kind] += 1
+                return None
+            self._conn.execute(
+                "UPDATE chat_cache SET last_used = ?, hit_count = hit_count + 1 WHERE kind = ? AND key = ?",
+                (now, kind, key)
+            )
+            self._conn.commit()
+            self.hits[kind] += 1
+            return row[0]
+
+    def put(self, kind, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chat_cache (kind, key, value, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (kind, key, value, now, now)
+            )
+            self._evict(kind, now)
+            self._conn.commit()
+
+    def _evict(self, kind, now):
+        self._conn.execute("DELETE FROM chat_cache WHERE kind = ? AND created < ?", (kind, now - self.ttls[kind]))
+        self._conn.execute('''
+        DELETE FROM chat_cache WHERE kind = ? AND key IN (
+            SELECT key FROM chat_cache WHERE kind = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?
+        )
+        ''', (kind, kind, self.max_entries))
+
+    def get_sql(self, question, schema_version):
+        return self.get("sql", make_key(normalize_question(question), schema_version))
+
+    def put_sql(self, question, schema_version, sql_query):
+        self.put("sql", make_key(normalize_question(question), schema_version), sql_query)
+
+    def get_answer(self, question, sql_query, data_fingerprint):
+        return self.get("answer", make_key(normalize_question(question), sql_query, data_fingerprint))
+
+    def put_answer(self, question, sql_query, data_fingerprint, answer):
+        self.put("answer", make_key(normalize_question(question), sql_query, data_fingerprint), answer)
+
+    def stats(self):
+        """Hit/miss counters of this process and the number of stored entries per kind"""
+        with self._lock:
+            entries = dict(self._conn.execute("SELECT kind, COUNT(*) FROM chat_cache GROUP BY kind").fetchall())
+        stats = {}
+        for kind in self.hits:
+            lookups = self.hits[kind] + self.misses[kind]
+            stats[kind] = {
+                "hits": self.hits[kind],
+                "misses": self.misses[kind],
+                "hit_rate": self.hits[kind] / lookups if lookups else 0.0,
+                "entries": entries.get(kind, 0),
+            }
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chat_cache")
+            self._conn.commit()
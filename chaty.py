@@ -1,39 +1,59 @@
 import os
-from openai import OpenAI
-import sqlite3
+import asyncio
+from openai import OpenAI, AsyncOpenAI
 import json
+import threading
+import hashlib
+from contextlib import closing
 import streamlit as st
+import db
+from chat_cache import ChatCache
+from profiling import profiled
 
 # Get API key from Streamlit secrets
 try:
     api_key = st.secrets["OPENAI_API_KEY"]
-except KeyError as e:
+except (KeyError, FileNotFoundError) as e:
     st.error(f"Chat functionality won't work because of a missing API key. Exception: {str(e)}")
     api_key = None
 
-# Set up OpenAI client using secrets
-client = OpenAI(api_key=api_key)
+# OpenAI client, created on first use so the module imports without a key (tests can assign a stub)
+client = None
+
+def get_client():
+    global client
+    if client is None:
+        client = OpenAI(api_key=api_key)
+    return client
+
+def create_async_client():
+    # Created per pipeline run: the async HTTP connection pool is bound to the event loop of that run.
+    # Like the sync client it honours OPENAI_BASE_URL, e.g. to point it at a local fake completion server.
+    return AsyncOpenAI(api_key=api_key)
+
+# Question/answer cache, created on first use
+chat_cache = None
+
+def get_chat_cache():
+    global chat_cache
+    if chat_cache is None:
+        chat_cache = ChatCache()
+    return chat_cache
 
 def get_all_tables():
     """Get a list of all tables in the database"""
     try:
-        conn = sqlite3.connect('hauszumleben.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return tables
+        with db.reader() as conn:
+            cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table';")
+            return [row[0] for row in cursor.fetchall()]
     except Exception as e:
         return f"Database error: {str(e)}"
 
 def get_table_schema(table_name):
     """Get the schema for a specific table"""
     try:
-        conn = sqlite3.connect('hauszumleben.db')
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        schema = cursor.fetchall()
-        conn.close()
+        with db.reader() as conn:
+            schema = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
         
         columns = []
         for col in schema:
@@ -47,72 +67,254 @@ def get_table_schema(table_name):
     except Exception as e:
         return f"Database error: {str(e)}"
 
-def query_database(query):
+# Budgets for query results that are put into the prompt
+MAX_RESULT_ROWS = 200
+MAX_RESULT_BYTES = 20000
+MAX_SCANNED_ROWS = 200000
+FETCH_BATCH_SIZE = 500
+SUMMARY_TOP_K = 5
+SUMMARY_MAX_DISTINCT = 1000
+
+
+class ColumnSummary:
+    """Running summary of one result column: count, nulls, min/max/mean and the most frequent values"""
+
+    def __init__(self):
+        self.count = 0
+        self.nulls = 0
+        self.numeric_count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.value_counts = {}
+        self.top_k_exact = True
+
+    def add(self, value):
+        self.count += 1
+        if value is None:
+            self.nulls += 1
+            return
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.numeric_count += 1
+            self.total += value
+        if isinstance(value, (int, float, str)):
+            try:
+                self.min = value if self.min is None or value < self.min else self.min
+                self.max = value if self.max is None or value > self.max else self.max
+            except TypeError:
+                pass  # SQLite columns can mix numbers and text
+        # Cap the number of tracked distinct values so high-cardinality columns stay bounded
+        if value in self.value_counts:
+            self.value_counts[value] += 1
+        elif len(self.value_counts) < SUMMARY_MAX_DISTINCT:
+            self.value_counts[value] = 1
+        else:
+            self.top_k_exact = False
+
+    def to_dict(self):
+        summary = {"count": self.count, "nulls": self.nulls}
+        if self.min is not None:
+            summary["min"] = self.min
+            summary["max"] = self.max
+        if self.numeric_count:
+            summary["mean"] = round(self.total / self.numeric_count, 3)
+        top = sorted(self.value_counts.items(), key=lambda item: item[1], reverse=True)[:SUMMARY_TOP_K]
+        summary["top_values"] = [[value, count] for value, count in top]
+        if not self.top_k_exact:
+            summary["top_values_approximate"] = True
+        return summary
+
+
+@profiled
+def query_database(query, max_rows=MAX_RESULT_ROWS, max_bytes=MAX_RESULT_BYTES, max_scanned_rows=MAX_SCANNED_ROWS):
+    """
+    Execute a query and stream its result with fetchmany, keeping memory and prompt size bounded.
+    Rows are kept until max_rows or max_bytes (JSON size) is reached. Beyond that only a
+    columnar summary is updated, and reading stops after max_scanned_rows.
+    Returns: {"columns", "rows", "row_count", "truncated", "scan_complete"} plus "summary" when truncated
+    """
     try:
-        conn = sqlite3.connect('hauszumleben.db')
-        cursor = conn.cursor()
-        
-        # Get column names
-        cursor.execute(query)
-        column_names = [description[0] for description in cursor.description]
-        
-        # Fetch the data
-        results = cursor.fetchall()
-        
-        # Convert to list of dictionaries for better readability
-        formatted_results = []
-        for row in results:
-            formatted_results.append(dict(zip(column_names, row)))
-        
-        conn.close()
-        return formatted_results
+        # Read-only connection, the query was written by the model
+        with db.reader() as conn, closing(conn.cursor()) as cursor:
+            cursor.execute(query)
+            if cursor.description is None:
+                return {"columns": [], "rows": [], "row_count": 0, "truncated": False, "scan_complete": True}
+            column_names = [description[0] for description in cursor.description]
+
+            summaries = [ColumnSummary() for _ in column_names]
+            rows = []
+            used_bytes = 0
+            row_count = 0
+            truncated = False
+            scan_complete = True
+
+            while True:
+                batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+                if not batch:
+                    break
+                for row in batch:
+                    row_count += 1
+                    for summary, value in zip(summaries, row):
+                        summary.add(value)
+                    if truncated:
+                        continue
+                    row_bytes = len(json.dumps(row, default=str))
+                    if len(rows) >= max_rows or used_bytes + row_bytes > max_bytes:
+                        truncated = True
+                        continue
+                    rows.append(list(row))
+                    used_bytes += row_bytes
+                if row_count >= max_scanned_rows:
+                    scan_complete = cursor.fetchone() is None
+                    truncated = truncated or not scan_complete
+                    break
+
+        result = {
+            "columns": column_names,
+            "rows": rows,
+            "row_count": row_count,
+            "truncated": truncated,
+            "scan_complete": scan_complete
+        }
+        if truncated:
+            result["summary"] = {name: summary.to_dict() for name, summary in zip(column_names, summaries)}
+        return result
     except Exception as e:
         return f"Database error: {str(e)}"
 
+def format_query_results(query_results):
+    """Compact JSON of a query_database result for the prompt, with a note when it was truncated"""
+    if isinstance(query_results, str):
+        return query_results
+    note = ""
+    if query_results["truncated"]:
+        scanned = f"{query_results['row_count']}" if query_results["scan_complete"] else f"more than {query_results['row_count']}"
+        note = (f"NOTE: The result has {scanned} rows, only the first {len(query_results['rows'])} are listed. "
+                f"'summary' describes every scanned row per column.\n")
+    return note + json.dumps(query_results, default=str, ensure_ascii=False, separators=(",", ":"))
+
+def build_messages(prompt, concise=False):
+    system_message = "You are an analyst who examines healthcare database information and provides clear insights and conclusions. You MUST ALWAYS respond in the EXACT SAME LANGUAGE as the user's question"
+    if concise:
+        system_message += " Keep your responses brief and focused only on the most important findings. Limit to 2-3 short paragraphs maximum."
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt}
+    ]
+
+def clean_sql(sql_query):
+    sql_query = sql_query.strip()
+    if sql_query.startswith("```sql"):
+        sql_query = sql_query[7:]
+    if sql_query.endswith("```"):
+        sql_query = sql_query[:-3]
+    return sql_query.strip()
+
+@profiled
 def generate_response(prompt, model="gpt-3.5-turbo", concise=False):
     """Generate a response from OpenAI with option for concise output"""
     try:
-        system_message = "You are an analyst who examines healthcare database information and provides clear insights and conclusions. You MUST ALWAYS respond in the EXACT SAME LANGUAGE as the user's question"
-        if concise:
-            system_message += " Keep your responses brief and focused only on the most important findings. Limit to 2-3 short paragraphs maximum."
-        
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ]
+            messages=build_messages(prompt, concise)
         )
         return response.choices[0].message.content
     except Exception as e:
         return f"OpenAI API error: {str(e)}"
 
+class SchemaCatalog:
+    """
+    Structure of the database for the chat prompts, built once and shared by all questions.
+    It is only rebuilt when PRAGMA schema_version or the sqlite_master entries change.
+    Row counts come from sqlite_stat1 (written by ANALYZE) where available; otherwise small
+    tables are counted exactly and large ones estimated from MAX(rowid).
+    """
+
+    def __init__(self, exact_count_limit=10000):
+        self.exact_count_limit = exact_count_limit
+        self._lock = threading.Lock()
+        self._key = None
+        self._structure = None
+
+    def _schema_key(self, cursor):
+        schema_version = cursor.execute("PRAGMA schema_version").fetchone()[0]
+        master = cursor.execute("SELECT COUNT(*), group_concat(name) FROM sqlite_master").fetchone()
+        return (db.get_db_path(), schema_version) + tuple(master)
+
+    def _stat_counts(self, cursor, tables):
+        if "sqlite_stat1" not in tables:
+            return {}
+        counts = {}
+        for table, stat in cursor.execute("SELECT tbl, stat FROM sqlite_stat1").fetchall():
+            if stat:
+                counts[table] = max(counts.get(table, 0), int(stat.split()[0]))
+        return counts
+
+    def _row_count(self, cursor, table, stat_counts):
+        """Returns (row_count, is_estimate)"""
+        if table in stat_counts:
+            return stat_counts[table], True
+        max_rowid = cursor.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        if max_rowid > self.exact_count_limit:
+            return max_rowid, True
+        return cursor.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0], False
+
+    def _build(self, cursor):
+        tables = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()]
+        stat_counts = self._stat_counts(cursor, tables)
+
+        database_structure = {}
+        for table in tables:
+            if table.startswith("sqlite_"):
+                continue
+            schema = [{
+                "name": col[1],
+                "type": col[2],
+                "not_null": bool(col[3]),
+                "primary_key": bool(col[5])
+            } for col in cursor.execute(f'PRAGMA table_info("{table}")').fetchall()]
+            row_count, is_estimate = self._row_count(cursor, table, stat_counts)
+
+            database_structure[table] = {
+                "schema": schema,
+                "row_count": row_count
+            }
+            if is_estimate:
+                database_structure[table]["row_count_estimated"] = True
+        return database_structure
+
+    def schema_version(self):
+        """Current PRAGMA schema_version of the database"""
+        with db.reader() as conn:
+            return conn.execute("PRAGMA schema_version").fetchone()[0]
+
+    def get(self):
+        with self._lock, db.reader() as conn:
+            cursor = conn.cursor()
+            key = self._schema_key(cursor)
+            if self._structure is None or key != self._key:
+                self._structure = self._build(cursor)
+                self._key = key
+            return self._structure
+
+    def invalidate(self):
+        with self._lock:
+            self._key = None
+            self._structure = None
+
+
+schema_catalog = SchemaCatalog()
+
+@profiled
 def get_database_structure():
     """Get the structure of the entire database without the data"""
-    tables = get_all_tables()
-    if isinstance(tables, str) and tables.startswith("Database error"):
-        return tables
-    
-    database_structure = {}
-    for table in tables:
-        # Get table schema
-        schema = get_table_schema(table)
-        # Get row count
-        row_count = query_database(f"SELECT COUNT(*) as count FROM {table}")[0]['count']
-        
-        database_structure[table] = {
-            "schema": schema,
-            "row_count": row_count
-        }
-    
-    return database_structure
+    try:
+        return schema_catalog.get()
+    except Exception as e:
+        return f"Database error: {str(e)}"
 
-def generate_sql_for_question(question):
-    """Use AI to generate appropriate SQL for the question"""
-    # Get database structure for context
-    db_structure = get_database_structure()
-    
-    prompt = f"""You are a SQL expert. Given the following database structure and user question, 
+def build_sql_prompt(question, db_structure):
+    return f"""You are a SQL expert. Given the following database structure and user question, 
     generate the most appropriate SQL query to answer the question.
     
     Database structure:
@@ -126,32 +328,26 @@ def generate_sql_for_question(question):
     
     Return ONLY the SQL query with no explanations or markdown. The query should be directly executable in SQLite.
     """
+
+@profiled
+def generate_sql_for_question(question, db_structure=None):
+    """Use AI to generate appropriate SQL for the question"""
+    # Get database structure for context
+    if db_structure is None:
+        db_structure = get_database_structure()
+    
+    prompt = build_sql_prompt(question, db_structure)
     
     sql_query = generate_response(prompt)
     
     # Clean up the response to get just the SQL
-    sql_query = sql_query.strip()
-    if sql_query.startswith("```sql"):
-        sql_query = sql_query[7:]
-    if sql_query.endswith("```"):
-        sql_query = sql_query[:-3]
-    
-    return sql_query.strip()
+    return clean_sql(sql_query)
 
-def smart_research_chatbot(question):
-    """Conduct smart research across tables to answer a question"""
-    # Step 1: Get database structure for context
-    db_structure = get_database_structure()
-    
-    # Step 2: Generate SQL based on the question
-    sql_query = generate_sql_for_question(question)
-    
-    # Step 3: Execute the query
-    try:
-        query_results = query_database(sql_query)
-        
-        # Step 4: Create a prompt with just the relevant data
-        prompt = f"""Based on the following database structure and query results, please answer this question concisely: "{question}"
+def is_error(text):
+    return text.startswith(("OpenAI API error", "Database error", "Error executing query"))
+
+def build_answer_prompt(question, db_structure, sql_query, query_results):
+    return f"""Based on the following database structure and query results, please answer this question concisely: "{question}"
         
         Database structure:
         {json.dumps(db_structure, indent=2)}
@@ -160,7 +356,7 @@ def smart_research_chatbot(question):
         {sql_query}
                 
         Query results:
-        {json.dumps(query_results, indent=2)}
+        {format_query_results(query_results)}
                 
         CONTEXT INFO: In this healthcare database, "Bewohner" and "Patient" refer to the same entities.
                 
@@ -168,12 +364,128 @@ def smart_research_chatbot(question):
         Avoid lengthy explanations, background information, or repetition.
         IMPORTANT: Your response MUST be in the SAME LANGUAGE as the original question.
         """
+
+@profiled
+def smart_research_chatbot(question, cache=None):
+    """Conduct smart research across tables to answer a question"""
+    cache = cache or get_chat_cache()
+
+    # Step 1: Get database structure for context
+    db_structure = get_database_structure()
+    schema_version = schema_catalog.schema_version()
+    
+    # Step 2: Generate SQL based on the question (or reuse it for a question asked before)
+    sql_query = cache.get_sql(question, schema_version)
+    if sql_query is None:
+        sql_query = generate_sql_for_question(question, db_structure)
+        if not is_error(sql_query):
+            cache.put_sql(question, schema_version, sql_query)
+    
+    # Step 3: Execute the query
+    try:
+        query_results = query_database(sql_query)
+        if isinstance(query_results, str):
+            data_fingerprint = None
+        else:
+            # The answer is only reused while the query still returns the same data
+            data_fingerprint = hashlib.sha256(format_query_results(query_results).encode("utf-8")).hexdigest()
+            answer = cache.get_answer(question, sql_query, data_fingerprint)
+            if answer is not None:
+                return answer
+        
+        # Step 4: Create a prompt with just the relevant data
+        prompt = build_answer_prompt(question, db_structure, sql_query, query_results)
         
         # Step 5: Generate the concise response
-        return generate_response(prompt, concise=True)
+        answer = generate_response(prompt, concise=True)
+        if data_fingerprint is not None and not is_error(answer):
+            cache.put_answer(question, sql_query, data_fingerprint, answer)
+        return answer
     except Exception as e:
         return f"Error executing query: {str(e)}"
     
+#######################
+# Async streaming pipeline
+async def generate_sql_for_question_async(async_client, question, db_structure, model="gpt-3.5-turbo"):
+    """Async variant of generate_sql_for_question"""
+    prompt = build_sql_prompt(question, db_structure)
+    response = await async_client.chat.completions.create(model=model, messages=build_messages(prompt))
+    return clean_sql(response.choices[0].message.content)
+
+async def smart_research_chatbot_stream(question, cache=None, model="gpt-3.5-turbo"):
+    """
+    Async generator variant of smart_research_chatbot that yields the answer token by token.
+    Closing the generator cancels the request that is in flight. An error after the first token
+    is yielded as a separate, marked part, so it is not read as the end of the answer.
+    """
+    cache = cache or get_chat_cache()
+
+    async with create_async_client() as async_client:
+        answered = False
+        try:
+            # The schema lookup overlaps the SQL cache lookup, both in worker threads. The SQL
+            # generation cannot start earlier: its prompt contains the structure.
+            structure_task = asyncio.create_task(asyncio.to_thread(get_database_structure))
+            schema_version = await asyncio.to_thread(schema_catalog.schema_version)
+            sql_query = await asyncio.to_thread(cache.get_sql, question, schema_version)
+            db_structure = await structure_task
+
+            if sql_query is None:
+                sql_query = await generate_sql_for_question_async(async_client, question, db_structure, model)
+                await asyncio.to_thread(cache.put_sql, question, schema_version, sql_query)
+
+            query_results = await asyncio.to_thread(query_database, sql_query)
+            data_fingerprint = None
+            if not isinstance(query_results, str):
+                data_fingerprint = hashlib.sha256(format_query_results(query_results).encode("utf-8")).hexdigest()
+                answer = await asyncio.to_thread(cache.get_answer, question, sql_query, data_fingerprint)
+                if answer is not None:
+                    yield answer
+                    return
+
+            prompt = build_answer_prompt(question, db_structure, sql_query, query_results)
+            stream = await async_client.chat.completions.create(
+                model=model,
+                messages=build_messages(prompt, concise=True),
+                stream=True
+            )
+            answer_parts = []
+            async with stream:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        answer_parts.append(chunk.choices[0].delta.content)
+                        answered = True
+                        yield chunk.choices[0].delta.content
+
+            # Only complete answers are cached, a cancelled stream never gets here
+            if data_fingerprint is not None:
+                await asyncio.to_thread(cache.put_answer, question, sql_query, data_fingerprint, "".join(answer_parts))
+        except Exception as e:
+            if answered:
+                # Part of the answer is already on screen
+                yield f"\n\n---\nOpenAI API error, answer incomplete: {str(e)}"
+            else:
+                yield f"OpenAI API error: {str(e)}"
+
+@profiled
+def stream_smart_research_chatbot(question, cache=None):
+    """
+    Synchronous generator over smart_research_chatbot_stream, e.g. for st.write_stream.
+    When Streamlit stops the script (the user navigates away) the generator is closed,
+    which cancels the pending completion request.
+    """
+    loop = asyncio.new_event_loop()
+    answer_stream = smart_research_chatbot_stream(question, cache)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(answer_stream.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(answer_stream.aclose())
+        loop.close()
+
 # Example usage
 if __name__ == "__main__":
     question = "Which diet is the best one for sleep quality?"
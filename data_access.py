@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+import db
+from dtypes import DB_DTYPES, apply_dtypes
+
+#######################
+# Resident-scoped queries
+# Every query filters by resident in SQLite, so switching residents only reads that resident's rows
+RESIDENT_QUERIES = {
+    "vitals": "SELECT * FROM health_vitals WHERE resident_id = ? ORDER BY id",
+    "allergies": "SELECT * FROM allergies WHERE resident_id = ? ORDER BY id",
+    "activities": "SELECT * FROM activity_participation WHERE resident_id = ? ORDER BY id",
+    # Participations joined with the activity names, newest first; participations of deleted activities are left out
+    "activity_history": """
+        SELECT p.date AS "Datum", a.name AS "Aktivität",
+               CASE WHEN p.attended = 1 THEN 'Ja' ELSE 'Nein' END AS "Teilgenommen", p.notes AS "Notizen"
+        FROM activity_participation p
+        JOIN activities a ON a.id = p.activity_id
+        WHERE p.resident_id = ?
+        ORDER BY p.date DESC, p.id DESC
+    """,
+    "transactions": "SELECT * FROM trust_account_transactions WHERE resident_id = ? ORDER BY id",
+    "door_events": "SELECT * FROM Ein_aus WHERE pat_id = ? ORDER BY ein_aus_id",
+    "sleep": "SELECT * FROM sleep_quality WHERE resident_id = ? ORDER BY id",
+    "doctor_visits": "SELECT * FROM doctor_visits WHERE resident_id = ? ORDER BY id",
+    "room": "SELECT * FROM raum WHERE pat_id = ? ORDER BY raum_id",
+    "smart_home": "SELECT * FROM smart_home WHERE resident_id = ?",
+}
+
+# Table behind each query; its DB_DTYPES apply to the result like to the bulk-loaded tables
+QUERY_TABLES = {
+    "vitals": "health_vitals",
+    "allergies": "allergies",
+    "activities": "activity_participation",
+    "transactions": "trust_account_transactions",
+    "door_events": "Ein_aus",
+    "sleep": "sleep_quality",
+    "doctor_visits": "doctor_visits",
+    "room": "raum",
+    "smart_home": "smart_home",
+}
+
+# Number of recently viewed residents whose data is kept in memory
+RECENT_RESIDENTS = 8
+# Rows per page of the activity history
+ACTIVITY_PAGE_SIZE = 25
+
+
+class ResidentDataAccess:
+    """
+    Runs the resident-scoped queries and keeps the results of the most recently
+    viewed residents in a small LRU. Cached results are dropped as soon as
+    PRAGMA data_version reports a commit from another connection.
+    """
+
+    def __init__(self, max_residents=RECENT_RESIDENTS):
+        self.max_residents = max_residents
+        self._lock = threading.Lock()
+        self._recent = OrderedDict()
+
+    def fetch(self, name, resident_id):
+        """Return the rows of query `name` for one resident as a DataFrame"""
+        resident_id = int(resident_id)
+        data_version = db.data_version()
+        with self._lock:
+            entry = self._recent.get(resident_id)
+            if entry is None or entry[0] != data_version:
+                entry = (data_version, {})
+                self._recent[resident_id] = entry
+            self._recent.move_to_end(resident_id)
+            while len(self._recent) > self.max_residents:
+                self._recent.popitem(last=False)
+
+            frames = entry[1]
+            if name in frames:
+                # Callers convert columns in place, so the cached frame is never handed out directly
+                return frames[name].copy()
+
+        # Query outside the lock so sessions can read in parallel on pooled connections
+        frame = db.read_sql(RESIDENT_QUERIES[name], params=(resident_id,))
+        frame = apply_dtypes(frame, DB_DTYPES.get(QUERY_TABLES.get(name), {}))
+        with self._lock:
+            frames[name] = frame
+        return frame.copy()
+
+    def recent_residents(self):
+        """Resident IDs currently held in the LRU, most recent last"""
+        with self._lock:
+            return list(self._recent)
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+
+
+@st.cache_resource
+def get_resident_data_access():
+    return ResidentDataAccess()
+
+def get_resident_vitals(resident_id):
+    return get_resident_data_access().fetch("vitals", resident_id)
+
+def get_resident_allergies(resident_id):
+    return get_resident_data_access().fetch("allergies", resident_id)
+
+def get_resident_activities(resident_id):
+    return get_resident_data_access().fetch("activities", resident_id)
+
+def get_resident_activity_history(resident_id):
+    """Activity history of a resident (Datum, Aktivität, Teilgenommen, Notizen), newest first"""
+    return get_resident_data_access().fetch("activity_history", resident_id)
+
+def get_resident_transactions(resident_id):
+    return get_resident_data_access().fetch("transactions", resident_id)
+
+def get_resident_door_events(resident_id):
+    return get_resident_data_access().fetch("door_events", resident_id)
+
+def get_resident_sleep(resident_id):
+    return get_resident_data_access().fetch("sleep", resident_id)
+
+def get_resident_doctor_visits(resident_id):
+    return get_resident_data_access().fetch("doctor_visits", resident_id)
+
+def get_resident_room(resident_id):
+    return get_resident_data_access().fetch("room", resident_id)
+
+def get_resident_smart_home(resident_id):
+    return get_resident_data_access().fetch("smart_home", resident_id)
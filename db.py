@@ -0,0 +1,179 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+# Database file path, can be overridden e.g. for generated benchmark databases
+DB_PATH = os.environ.get("HZL_DB_PATH", "hauszumleben.db")
+
+BUSY_TIMEOUT_MS = 5000     # wait this long for a lock instead of failing with "database is locked"
+CACHED_STATEMENTS = 256    # prepared statements kept per connection
+READER_POOL_SIZE = 8       # idle read-only connections kept for reuse
+
+# Applied to every connection
+CONNECTION_PRAGMAS = [
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+    ("synchronous", "NORMAL"),
+    ("temp_store", "MEMORY"),
+    ("cache_size", -16000),  # negative = KiB, i.e. 16 MB page cache
+]
+
+# Called as query_listener(sql, started, seconds) after every statement when set (see profiling.py)
+query_listener = None
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that reports the duration of every statement to query_listener; a plain cursor while it is None"""
+
+    def execute(self, sql, parameters=()):
+        if query_listener is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            query_listener(sql, started, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        if query_listener is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            query_listener(sql, started, time.perf_counter() - started)
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose cursors (also those behind conn.execute and pd.read_sql_query) are TracedCursors"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class ConnectionManager:
+    """
+    Central access to the SQLite database:
+    - reader(): read-only connection (mode=ro) checked out from a shared pool
+    - writer(): the single writer connection, serialised by a lock, committed on success
+    - data_version(): PRAGMA data_version of a dedicated watcher connection, changes after every commit
+    Connections are opened with a busy timeout and a prepared-statement cache.
+    """
+
+    def __init__(self, db_path=DB_PATH, pool_size=READER_POOL_SIZE):
+        self.db_path = db_path
+        self._readers = queue.LifoQueue(maxsize=pool_size)
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+
+    def connect(self, readonly=True):
+        """Open a new, unpooled connection with the standard settings"""
+        if readonly:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   cached_statements=CACHED_STATEMENTS, check_same_thread=False,
+                                   factory=TracedConnection)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   cached_statements=CACHED_STATEMENTS, check_same_thread=False,
+                                   factory=TracedConnection)
+        for name, value in CONNECTION_PRAGMAS:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection from the pool for the duration of the block"""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self.connect(readonly=True)
+        try:
+            yield conn
+        finally:
+            # End the read transaction so the connection sees new commits next time
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def writer(self):
+        """The shared writer connection; commits when the block succeeds and rolls back otherwise"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self.connect(readonly=False)
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    def read_sql(self, query, params=None):
+        """pd.read_sql_query on a pooled read-only connection"""
+        with self.reader() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def data_version(self):
+        """Changes whenever another connection committed to the database"""
+        with self._watcher_lock:
+            if self._watcher is None:
+                self._watcher = self.connect(readonly=True)
+            return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._watcher_lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+
+
+manager = ConnectionManager(DB_PATH)
+
+def configure(db_path):
+    """Point every module at another database file"""
+    global manager, DB_PATH
+    manager.close()
+    DB_PATH = db_path
+    manager = ConnectionManager(db_path)
+    return manager
+
+def get_db_path():
+    return manager.db_path
+
+def connect(readonly=True):
+    return manager.connect(readonly)
+
+def reader():
+    return manager.reader()
+
+def writer():
+    return manager.writer()
+
+def read_sql(query, params=None):
+    return manager.read_sql(query, params)
+
+def data_version():
+    return manager.data_version()
@@ -0,0 +1,132 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+#######################
+# Column dtypes per table
+# "datetime" parses ISO text to datetime64, integer types fall back to the nullable variant when a
+# column has gaps and are left alone when values do not fit. Money columns (amount, balance_after)
+# are deliberately not listed and stay float64.
+DB_DTYPES = {
+    "patient": {"pat_id": "int32", "geb": "datetime", "befristet": "datetime", "geschlecht": "category",
+                "betreuer_id": "int16"},
+    "Ein_aus": {"ein_aus_id": "int32", "eingang": "int8", "ausgang": "int8", "zeitstempel": "datetime",
+                "pat_id": "int32"},
+    "bestellungen": {"bestell_id": "int32", "pat_id": "int32", "gasthaus": "int8", "menue_id": "int16",
+                     "datum": "datetime", "tageszeit": "category"},
+    "menü": {"menue_id": "int16", "veg": "int8"},
+    "raum": {"raum_id": "int16", "pat_id": "int32", "belegt": "int8", "belegt_seit": "datetime"},
+    "smart_devices": {"id": "int16", "type": "category", "room": "category", "status": "int8",
+                      "last_updated": "datetime"},
+    "rooms": {"id": "int16", "floor": "int8", "size_sqm": "float32"},
+    "device_history": {"id": "int32", "device_id": "int16", "status": "int8", "timestamp": "datetime"},
+    "smart_home": {"resident_id": "int32", "device": "category", "status": "category", "timestamp": "datetime"},
+    "residents": {"id": "int32", "date_of_birth": "datetime", "age": "int16", "mobility_status": "category",
+                  "has_fall_history": "int8", "last_fall_date": "datetime"},
+    "health_vitals": {"id": "int32", "resident_id": "int32", "heart_rate": "int16",
+                      "blood_pressure_systolic": "int16", "blood_pressure_diastolic": "int16",
+                      "measurement_time": "datetime", "notes": "category"},
+    "doctor_visits": {"id": "int32", "resident_id": "int32", "visit_date": "datetime",
+                      "doctor_name": "category", "follow_up_date": "datetime"},
+    "allergies": {"id": "int32", "resident_id": "int32", "allergy_type": "category", "severity": "category"},
+    "sleep_quality": {"id": "int32", "resident_id": "int32", "date": "datetime", "hours_slept": "float32",
+                      "quality_rating": "int8", "notes": "category"},
+    "activities": {"id": "int16", "location": "category", "scheduled_time": "datetime"},
+    "activity_participation": {"id": "int32", "resident_id": "int32", "activity_id": "int16",
+                               "date": "datetime", "attended": "int8", "notes": "category"},
+    "outings": {"id": "int32", "resident_id": "int32", "departure_time": "datetime",
+                "expected_return_time": "datetime", "actual_return_time": "datetime"},
+    "dietary_requirements": {"id": "int32", "resident_id": "int32", "requirement_type": "category",
+                             "is_allergy": "int8"},
+    "menu_items": {"id": "int16", "meal_type": "category", "calories": "int16", "is_vegetarian": "int8",
+                   "is_vegan": "int8", "is_glutenfree": "int8"},
+    "menu_selections": {"id": "int32", "resident_id": "int32", "menu_item_id": "int16", "date": "datetime",
+                        "meal_time": "category", "consumed_percent": "int8", "feedback": "category"},
+    "leftover_food": {"id": "int32", "menu_selection_id": "int32", "amount_percent": "int8",
+                      "reason": "category"},
+    "trust_account_transactions": {"id": "int32", "resident_id": "int32", "transaction_date": "datetime",
+                                   "transaction_type": "category", "processed_by": "category"},
+}
+
+# The data/ CSVs (their residents table is not the database one)
+CSV_DTYPES = {
+    "residents": {"resident_id": "int32", "age": "int16", "care_level": "int8", "room_number": "int16",
+                  "floor": "int8", "entry_date": "datetime", "gender": "category",
+                  "special_dietary_requirements": "category"},
+    "meal_orders": {"order_id": "int32", "resident_id": "int32", "date": "datetime", "meal_type": "category",
+                    "portion_size": "category", "actual_consumption": "float32"},
+    "health_monitoring": {"monitoring_id": "int32", "resident_id": "int32", "date": "datetime",
+                          "blood_pressure_systolic": "int16", "blood_pressure_diastolic": "int16",
+                          "heart_rate": "int16", "weight": "float32", "notes": "category"},
+    "menu_items": {"item_id": "int16", "category": "category", "calories": "int16", "protein": "float32",
+                   "carbs": "float32", "fat": "float32", "dietary_category": "category",
+                   "allergens": "category"},
+    "weather_data": {"date": "datetime", "temperature": "float32", "precipitation": "float32",
+                     "humidity": "int8", "pressure": "int16", "wind_speed": "int16",
+                     "weather_condition": "category"},
+}
+
+NULLABLE_INTS = {"int8": "Int8", "int16": "Int16", "int32": "Int32", "int64": "Int64"}
+
+#######################
+# Conversion
+def log_coerced(series, converted, dtype):
+    """Warn about values that were present but did not survive the conversion; returns their number"""
+    lost = series.notna().to_numpy() & converted.isna().to_numpy()
+    count = int(lost.sum())
+    if count:
+        logger.warning("%s: %d value(s) are not valid %s and became missing, e.g. %r",
+                       series.name, count, dtype, series[lost].iloc[0])
+    return count
+
+def convert_column(series, dtype):
+    if dtype == "datetime":
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        converted = pd.to_datetime(series, format="ISO8601", errors="coerce")
+        log_coerced(series, converted, dtype)
+        return converted
+    if dtype == "category":
+        return series.astype("category")
+    if dtype in NULLABLE_INTS:
+        info = np.iinfo(dtype)
+        values = pd.to_numeric(series, errors="coerce")
+        present = values.dropna()
+        if len(present) and (present.min() < info.min or present.max() > info.max or (present % 1 != 0).any()):
+            return series
+        log_coerced(series, values, dtype)
+        if values.isna().any():
+            return values.astype(NULLABLE_INTS[dtype])
+        return values.astype(dtype)
+    return series.astype(dtype)
+
+def apply_dtypes(frame, schema):
+    """Return a copy of `frame` with the columns of `schema` converted; unknown columns are ignored"""
+    converted = {}
+    for column, dtype in schema.items():
+        if column in frame.columns:
+            try:
+                converted[column] = convert_column(frame[column], dtype)
+            except (ValueError, TypeError):
+                # Unexpected content, keep the column as loaded
+                pass
+    return frame.assign(**converted) if converted else frame
+
+def frame_bytes(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+def memory_report(before, after):
+    """Bytes per table before and after conversion; `before`/`after` map table names to frames or byte counts"""
+    rows = []
+    for name in after:
+        bytes_before = before[name] if isinstance(before[name], int) else frame_bytes(before[name])
+        bytes_after = after[name] if isinstance(after[name], int) else frame_bytes(after[name])
+        rows.append({
+            "table": name,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "saved_percent": round(100 * (1 - bytes_after / bytes_before), 1) if bytes_before else 0.0,
+        })
+    return pd.DataFrame(rows, columns=["table", "bytes_before", "bytes_after", "saved_percent"])
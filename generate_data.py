@@ -0,0 +1,522 @@
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from datetime import date
+import numpy as np
+import db
+from add_smarthome_tables import create_smart_home_tables, create_assisted_living_tables
+from migrations import apply_pragmas, migrate
+
+# Synthetic databases at production scale, e.g. for benchmarks:
+#   python generate_data.py --db bench.db --residents 500 --days 730
+# The same arguments and seed always produce the same database.
+DEFAULT_DB = "hauszumleben_generated.db"
+RESIDENT_BATCH = 50      # residents generated and inserted per transaction, bounds the memory use
+INSERT_CHUNK = 50_000    # rows per executemany call
+
+# Tables that are not created by add_smarthome_tables; their schema is copied from the template database
+LEGACY_TABLES = ["patient", "Ein_aus", "bestellungen", "menü", "raum"]
+# Reference data copied from the template when it has any rows
+REFERENCE_TABLES = ["menü", "menu_items", "activities"]
+
+FIRST_NAMES = {
+    "F": ["Anna", "Maria", "Helga", "Elisabeth", "Gertrude", "Ingrid", "Ursula", "Renate", "Erika", "Hildegard",
+          "Margarete", "Christa", "Brigitte", "Monika", "Gisela", "Julia", "Käthe", "Liselotte", "Waltraud", "Irmgard"],
+    "M": ["Peter", "Johann", "Franz", "Thomas", "Hans", "Karl", "Heinz", "Werner", "Günter", "Manfred",
+          "Gerhard", "Dieter", "Horst", "Helmut", "Klaus", "Wolfgang", "Jürgen", "Rudolf", "Walter", "Otto"],
+}
+LAST_NAMES = ["Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Schulz", "Hoffmann",
+              "Schäfer", "Koch", "Bauer", "Richter", "Klein", "Wolf", "Schröder", "Neumann", "Schwarz", "Zimmermann",
+              "Braun", "Krüger", "Hofmann", "Hartmann", "Lange", "Schmitt", "Werner", "Krause", "Meier", "Huber"]
+CITIES = ["12345 Berlin", "23456 Hamburg", "80331 München", "50667 Köln", "60311 Frankfurt", "70173 Stuttgart",
+          "04109 Leipzig", "01067 Dresden", "30159 Hannover", "90402 Nürnberg"]
+STREETS = ["Musterstraße", "Beispielweg", "Hauptstraße", "Gartenweg", "Lindenallee", "Schulstraße", "Bahnhofstraße"]
+MOBILITY = (["Fully mobile", "Cane", "Walker-assisted", "Wheelchair"], [0.35, 0.25, 0.25, 0.15])
+DOCTORS = ["Dr. Stefan Mayer", "Dr. Julia Weber", "Dr. Thomas Klein", "Dr. Maria Schwarz", "Dr. Andreas Roth"]
+VISIT_REASONS = [("Annual checkup", "All vitals normal"), ("Blood pressure check", "BP slightly elevated"),
+                 ("Diabetes follow-up", "Adjusted medication"), ("Respiratory infection", "Prescribed antibiotics"),
+                 ("Fall follow-up", "Minor bruising, no fractures")]
+ALLERGIES = [("Food", "Lactose", "Moderate", "Avoid milk products"),
+             ("Medication", "Penicillin", "Severe", "Rash and difficulty breathing"),
+             ("Food", "Nuts", "Severe", "Anaphylaxis risk"),
+             ("Environmental", "Pollen", "Mild", "Seasonal allergies in spring"),
+             ("Food", "Shellfish", "Moderate", "Avoid all seafood")]
+DIETARY_REQUIREMENTS = [("Restriction", "Lactose-free", 1, "Lactose intolerance"),
+                        ("Preference", "Soft food", 0, "Dental issues"),
+                        ("Restriction", "Low sugar", 0, "Diabetes management"),
+                        ("Restriction", "Low sodium", 0, "Blood pressure management"),
+                        ("Preference", "Vegetarian", 0, "Personal choice")]
+OUTINGS = [("Family visit", "Family"), ("Doctor appointment", "Caregiver"), ("Shopping", "Family"),
+           ("Park walk", "Caregiver")]
+LEFTOVER_REASONS = ["Didn't like it", "Too much", "Not hungry", "Felt unwell", "Too spicy"]
+EXPENSES = ["Hairdresser", "Café purchase", "Newspaper", "Gift shop", "Outing expense"]
+DEVICE_TYPES = [("Licht", "light"), ("Heizung", "heater"), ("Bewegungsmelder", "sensor")]
+MEAL_TIMES = ["Früh", "Mittag", "Abend"]
+# menu_selections: meal time, menu_items.meal_type to pick from and the range of consumed_percent
+SELECTION_MEALS = [("Breakfast", "Breakfast", 70), ("Lunch", "Lunch", 50), ("Dinner", "Dinner", 60),
+                   ("Dessert", "Dessert", 80)]
+
+#######################
+# Vectorised value helpers
+def day_strings(days):
+    """'YYYY-MM-DD' for an array of numpy datetime64[D]"""
+    return np.datetime_as_string(days.astype("datetime64[D]"), unit="D")
+
+def timestamp_strings(times):
+    """'YYYY-MM-DD HH:MM:SS' for an array of numpy datetime64, the same format as the existing rows"""
+    strings = np.datetime_as_string(times.astype("datetime64[s]"), unit="s").astype("U19")
+    # Replace the ISO 'T' in place through the UCS4 code points instead of calling str.replace per value
+    strings.view(np.uint32).reshape(len(strings), -1)[:, 10] = ord(" ")
+    return strings
+
+def clock_strings(offsets):
+    """'HH:MM:SS' for an array of timedelta64 offsets since midnight"""
+    strings = timestamp_strings(np.datetime64("2000-01-01T00:00:00") + offsets)
+    return np.ascontiguousarray(strings.view(np.uint32).reshape(len(strings), -1)[:, 11:]).view("U8").ravel()
+
+def random_times(rng, days, start_hour, end_hour):
+    """A random time between start_hour and end_hour on each day"""
+    seconds = rng.integers(start_hour * 3600, end_hour * 3600, len(days))
+    return days.astype("datetime64[s]") + seconds.astype("timedelta64[s]")
+
+def choice(rng, values, size, p=None):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size, p=p)]
+
+def nullable(values, mask):
+    """Object array with None where mask is True (written as NULL)"""
+    values = values.astype(object)
+    values[mask] = None
+    return values
+
+#######################
+# Schema and reference data
+def create_schema(conn, template_path):
+    """Legacy tables as defined in the template database, the rest via add_smarthome_tables"""
+    template = sqlite3.connect(f"file:{template_path}?mode=ro", uri=True)
+    try:
+        placeholders = ", ".join("?" * len(LEGACY_TABLES))
+        statements = template.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})", LEGACY_TABLES
+        ).fetchall()
+    finally:
+        template.close()
+    missing = set(LEGACY_TABLES) - {name for name, _ in statements}
+    if missing:
+        raise ValueError(f"Template {template_path} has no table(s) {', '.join(sorted(missing))}")
+    for _, sql in statements:
+        conn.execute(sql)
+    conn.commit()
+    create_smart_home_tables(conn)
+    create_assisted_living_tables(conn)
+
+def copy_reference_data(conn, template_path):
+    """Menus and activities from the template; generic rows if the template has none"""
+    conn.execute("ATTACH DATABASE ? AS template", (f"file:{template_path}?mode=ro",))
+    try:
+        for table in REFERENCE_TABLES:
+            conn.execute(f'INSERT INTO "{table}" SELECT * FROM template."{table}"')
+    finally:
+        conn.commit()
+        conn.execute("DETACH DATABASE template")
+
+    if conn.execute('SELECT COUNT(*) FROM "menü"').fetchone()[0] == 0:
+        conn.executemany('INSERT INTO "menü" (name, beschreibung, veg) VALUES (?, ?, ?)',
+                         [(f"Menü {i}", "", i % 3 == 0) for i in range(1, 31)])
+    if conn.execute("SELECT COUNT(*) FROM menu_items").fetchone()[0] == 0:
+        conn.executemany("INSERT INTO menu_items (name, meal_type, calories) VALUES (?, ?, ?)",
+                         [(f"{meal_type} {i}", meal_type, 300 + 50 * i)
+                          for _, meal_type, _ in SELECTION_MEALS for i in range(1, 4)])
+    if conn.execute("SELECT COUNT(*) FROM activities").fetchone()[0] == 0:
+        conn.executemany("INSERT INTO activities (name, location) VALUES (?, ?)",
+                         [("Morning Exercise", "Community Room"), ("Bingo", "Recreation Room"),
+                          ("Music Therapy", "Community Room")])
+    conn.commit()
+
+def bulk_insert(conn, table, columns):
+    """Insert the rows given as {column: array} in chunks; returns the row count"""
+    names = list(columns)
+    sql = f'INSERT INTO "{table}" ({", ".join(names)}) VALUES ({", ".join("?" * len(names))})'
+    values = [np.asarray(columns[name]) for name in names]
+    rows = len(values[0]) if values else 0
+    for start in range(0, rows, INSERT_CHUNK):
+        # tolist() turns numpy scalars into Python ints/floats/strs that sqlite3 can bind
+        conn.executemany(sql, zip(*(value[start:start + INSERT_CHUNK].tolist() for value in values)))
+    return rows
+
+#######################
+# Generators, one per table; every function returns {column: array} for the residents of one batch
+class Generator:
+    """
+    Seeded generator for `residents` residents over `days` days starting at `start`.
+    Per-resident traits (exit rate, sociability, vital baselines, appetite) make the residents
+    differ from each other, so the anomaly and risk analyses have patterns to find.
+    """
+
+    def __init__(self, residents, days, start, seed=42, sensor_events=24):
+        self.residents = residents
+        self.days = days
+        self.start = np.datetime64(start, "D")
+        self.sensor_events = sensor_events
+        self.rng = np.random.default_rng(seed)
+        self.menu_ids = {}
+        self.menue_ids = None
+        self.activity_ids = None
+        self.next_selection_id = 1
+
+    def load_reference_ids(self, conn):
+        self.menue_ids = np.array([row[0] for row in conn.execute('SELECT menue_id FROM "menü"')])
+        self.activity_ids = np.array([row[0] for row in conn.execute("SELECT id FROM activities")])
+        all_items = np.array([row[0] for row in conn.execute("SELECT id FROM menu_items")])
+        for _, meal_type, _ in SELECTION_MEALS:
+            ids = np.array([row[0] for row in conn.execute("SELECT id FROM menu_items WHERE meal_type = ?", (meal_type,))])
+            self.menu_ids[meal_type] = ids if len(ids) else all_items
+
+    def daily(self, resident_ids, per_day=1):
+        """Resident id and day for every (resident, day[, slot]) combination"""
+        days = self.start + np.arange(self.days)
+        ids = np.repeat(resident_ids, self.days * per_day)
+        day_values = np.tile(np.repeat(days, per_day), len(resident_ids))
+        return ids, day_values
+
+    def events(self, resident_ids, rate_per_day):
+        """Poisson number of events per resident and day; returns resident id and day per event"""
+        rates = np.broadcast_to(rate_per_day, len(resident_ids))
+        counts = self.rng.poisson(np.repeat(rates, self.days))
+        ids, days = self.daily(resident_ids)
+        return np.repeat(ids, counts), np.repeat(days, counts)
+
+    def people(self, resident_ids):
+        rng, n = self.rng, len(resident_ids)
+        sex = choice(rng, ["F", "M"], n, p=[0.65, 0.35])
+        first_names = np.where(sex == "F", choice(rng, FIRST_NAMES["F"], n), choice(rng, FIRST_NAMES["M"], n))
+        birth = np.datetime64("1925-01-01") + rng.integers(0, 25 * 365, n).astype("timedelta64[D]")
+        end = self.start + self.days
+        age = ((end - birth).astype(int) // 365.25).astype(int)
+        mobility = choice(rng, MOBILITY[0], n, p=MOBILITY[1])
+        fall_probability = np.select([mobility == "Wheelchair", mobility == "Walker-assisted", mobility == "Cane"],
+                                     [0.6, 0.45, 0.3], default=0.1)
+        has_fall_history = (rng.random(n) < fall_probability).astype(int)
+        last_fall = self.start - rng.integers(1, 365, n).astype("timedelta64[D]")
+        return {
+            "id": resident_ids, "sex": sex, "first_name": first_names, "last_name": choice(rng, LAST_NAMES, n),
+            "birth": day_strings(birth), "age": age, "mobility": mobility, "has_fall_history": has_fall_history,
+            "last_fall_date": nullable(day_strings(last_fall), has_fall_history == 0),
+        }
+
+    def patient(self, people):
+        rng, n = self.rng, len(people["id"])
+        addresses = (choice(rng, STREETS, n) + " " + rng.integers(1, 120, n).astype(str).astype(object)
+                     + ", " + choice(rng, CITIES, n))
+        return {
+            "pat_id": people["id"], "vorname": people["first_name"], "nachname": people["last_name"],
+            "geb": people["birth"], "befristet": (rng.random(n) < 0.1).astype(int), "geschlecht": people["sex"],
+            "adresse": addresses, "betreuer_id": rng.integers(1, max(2, self.residents // 10 + 1), n),
+        }
+
+    def residents_table(self, people):
+        n = len(people["id"])
+        contacts = choice(self.rng, FIRST_NAMES["F"] + FIRST_NAMES["M"], n) + " " + people["last_name"]
+        phones = "+49 1" + self.rng.integers(500000000, 799999999, n).astype(str).astype(object)
+        return {
+            "id": people["id"], "first_name": people["first_name"], "last_name": people["last_name"],
+            "room_number": self.room_numbers(people["id"]), "date_of_birth": people["birth"], "age": people["age"],
+            "mobility_status": people["mobility"], "has_fall_history": people["has_fall_history"],
+            "last_fall_date": people["last_fall_date"], "emergency_contact": contacts, "emergency_phone": phones,
+        }
+
+    @staticmethod
+    def room_numbers(resident_ids):
+        # 30 rooms per floor: 101-130, 201-230, ...
+        return ((resident_ids - 1) // 30 + 1) * 100 + (resident_ids - 1) % 30 + 1
+
+    def raum(self, resident_ids):
+        n = len(resident_ids)
+        since = self.start.astype("datetime64[s]") - self.rng.integers(1, 10 * 365 * 86400, n).astype("timedelta64[s]")
+        return {"pat_id": resident_ids, "raum_nr": self.room_numbers(resident_ids).astype(str),
+                "belegt": np.ones(n, dtype=int), "belegt_seit": timestamp_strings(since)}
+
+    def rooms(self, resident_ids):
+        numbers = self.room_numbers(resident_ids)
+        return {"name": np.char.add("Zimmer ", numbers.astype(str)), "floor": numbers // 100,
+                "size_sqm": np.round(self.rng.normal(22, 3, len(resident_ids)), 1)}
+
+    def smart_devices(self, resident_ids):
+        numbers = np.repeat(self.room_numbers(resident_ids).astype(str), len(DEVICE_TYPES))
+        labels = np.tile([label for label, _ in DEVICE_TYPES], len(resident_ids))
+        types = np.tile([device_type for _, device_type in DEVICE_TYPES], len(resident_ids))
+        rooms = np.char.add("Zimmer ", numbers)
+        end = (self.start + self.days).astype("datetime64[s]")
+        return {"id": self.device_ids(resident_ids).ravel(), "name": np.char.add(np.char.add(rooms, " "), labels),
+                "type": types, "room": rooms, "status": np.zeros(len(types), dtype=int),
+                "last_updated": timestamp_strings(np.full(len(types), end))}
+
+    @staticmethod
+    def device_ids(resident_ids):
+        return (resident_ids[:, None] - 1) * len(DEVICE_TYPES) + np.arange(1, len(DEVICE_TYPES) + 1)
+
+    def device_history(self, resident_ids):
+        ids, days = self.events(resident_ids, self.sensor_events)
+        devices = self.device_ids(resident_ids)
+        row_of = np.searchsorted(resident_ids, ids)
+        device_id = devices[row_of, self.rng.integers(0, len(DEVICE_TYPES), len(ids))]
+        times = random_times(self.rng, days, 0, 24)
+        order = np.lexsort((times, device_id))
+        return {"device_id": device_id[order], "status": self.rng.integers(0, 2, len(ids)),
+                "timestamp": timestamp_strings(times[order])}
+
+    def ein_aus(self, resident_ids):
+        rng = self.rng
+        # Exits per day differ a lot between residents, a few rarely leave the house at all
+        ids, days = self.events(resident_ids, rng.gamma(2.0, 0.25, len(resident_ids)))
+        n = len(ids)
+        night = rng.random(n) < 0.08
+        exits = np.where(night, random_times(rng, days, 21, 24), random_times(rng, days, 7, 20))
+        minutes = np.where(rng.random(n) < 0.005, rng.integers(2, 14, n) * 24 * 60,
+                           np.clip(rng.lognormal(np.log(90), 0.7, n), 5, 600)).astype(int)
+        entries = exits + (minutes * 60).astype("timedelta64[s]")
+        # One row for the exit (ausgang = 1) followed by one for the return (eingang = 1)
+        pat_id = np.repeat(ids, 2)
+        eingang = np.tile([0, 1], n)
+        times = np.empty(2 * n, dtype="datetime64[s]")
+        times[0::2], times[1::2] = exits, entries
+        return {"eingang": eingang, "ausgang": 1 - eingang, "zeitstempel": timestamp_strings(times), "pat_id": pat_id}
+
+    def bestellungen(self, resident_ids):
+        rng = self.rng
+        ids, days = self.daily(resident_ids, per_day=len(MEAL_TIMES))
+        meal = np.tile(np.arange(len(MEAL_TIMES)), len(ids) // len(MEAL_TIMES))
+        keep = rng.random(len(ids)) >= 0.05
+        ids, days, meal = ids[keep], days[keep], meal[keep]
+        order_time = (np.array([7, 12, 18])[meal] * 3600 + rng.integers(0, 3600, len(ids))).astype("timedelta64[s]")
+        return {"pat_id": ids, "bestell_zeitpunkt": clock_strings(order_time),
+                "gasthaus": (rng.random(len(ids)) < 0.8).astype(int),
+                "menue_id": choice(rng, self.menue_ids, len(ids)), "datum": day_strings(days),
+                "tageszeit": np.asarray(MEAL_TIMES)[meal]}
+
+    def health_vitals(self, resident_ids):
+        rng, n = self.rng, len(resident_ids)
+        ids, days = self.daily(resident_ids)
+        row_of = np.repeat(np.arange(n), self.days)
+        heart_rate = rng.normal(72, 6, n)[row_of] + rng.normal(0, 5, len(ids))
+        systolic = rng.normal(130, 10, n)[row_of] + rng.normal(0, 8, len(ids))
+        diastolic = rng.normal(80, 6, n)[row_of] + rng.normal(0, 5, len(ids))
+        return {"resident_id": ids, "heart_rate": np.round(heart_rate).astype(int),
+                "blood_pressure_systolic": np.round(systolic).astype(int),
+                "blood_pressure_diastolic": np.round(diastolic).astype(int),
+                "measurement_time": timestamp_strings(random_times(rng, days, 7, 10)),
+                "notes": np.full(len(ids), "Regular checkup")}
+
+    def sleep_quality(self, resident_ids):
+        rng = self.rng
+        ids, days = self.daily(resident_ids)
+        hours = np.clip(rng.normal(7, 1.1, len(ids)), 3, 11)
+        quality = np.clip(np.round((hours - 4) / 1.2 + rng.normal(0, 0.7, len(ids))), 1, 5).astype(int)
+        return {"resident_id": ids, "date": day_strings(days), "hours_slept": np.round(hours, 1),
+                "quality_rating": quality, "notes": np.where(quality >= 4, "Normal night", "Restless sleep")}
+
+    def activity_participation(self, resident_ids):
+        rng, n = self.rng, len(resident_ids)
+        # Each resident signs up for each activity on a share of the days given by their sociability
+        sociability = rng.beta(2, 5, n)
+        ids, days = self.daily(resident_ids, per_day=len(self.activity_ids))
+        activity = np.tile(self.activity_ids, n * self.days)
+        keep = rng.random(len(ids)) < np.repeat(sociability, self.days * len(self.activity_ids))
+        ids, days, activity = ids[keep], days[keep], activity[keep]
+        attended = (rng.random(len(ids)) < 0.75).astype(int)
+        return {"resident_id": ids, "activity_id": activity, "date": day_strings(days), "attended": attended,
+                "notes": np.where(attended == 1, "Enjoyed the activity", "Did not feel well")}
+
+    def outings(self, resident_ids):
+        rng = self.rng
+        ids, days = self.events(resident_ids, 0.1)
+        n = len(ids)
+        departure = random_times(rng, days, 9, 16)
+        expected = departure + (rng.integers(1, 7, n) * 3600).astype("timedelta64[s]")
+        actual = expected + np.round(rng.normal(0, 1800, n)).astype("timedelta64[s]")
+        outing = rng.integers(0, len(OUTINGS), n)
+        return {"resident_id": ids, "departure_time": timestamp_strings(departure),
+                "expected_return_time": timestamp_strings(expected), "actual_return_time": timestamp_strings(actual),
+                "destination": np.asarray([destination for destination, _ in OUTINGS])[outing],
+                "accompanied_by": np.asarray([companion for _, companion in OUTINGS])[outing],
+                "notes": np.full(n, "")}
+
+    def doctor_visits(self, resident_ids):
+        rng = self.rng
+        ids, days = self.events(resident_ids, 1 / 45)
+        n = len(ids)
+        reason = rng.integers(0, len(VISIT_REASONS), n)
+        follow_up = days + rng.integers(14, 180, n).astype("timedelta64[D]")
+        return {"resident_id": ids, "visit_date": day_strings(days), "doctor_name": choice(rng, DOCTORS, n),
+                "reason": np.asarray([r for r, _ in VISIT_REASONS])[reason],
+                "notes": np.asarray([notes for _, notes in VISIT_REASONS])[reason],
+                "follow_up_date": nullable(day_strings(follow_up), rng.random(n) < 0.3)}
+
+    def per_resident_choices(self, resident_ids, options, max_per_resident):
+        """Up to max_per_resident distinct options per resident; returns resident ids and option indices"""
+        rng, n = self.rng, len(resident_ids)
+        counts = rng.integers(0, max_per_resident + 1, n)
+        # Random permutation of the options per resident, the first `count` are taken
+        order = np.argsort(rng.random((n, len(options))), axis=1)
+        taken = np.arange(len(options)) < counts[:, None]
+        return np.repeat(resident_ids, counts), order[taken]
+
+    def allergies(self, resident_ids):
+        ids, option = self.per_resident_choices(resident_ids, ALLERGIES, 2)
+        columns = ["allergy_type", "allergy_name", "severity", "notes"]
+        values = np.asarray(ALLERGIES, dtype=object)[option]
+        return {"resident_id": ids, **{column: values[:, i] for i, column in enumerate(columns)}}
+
+    def dietary_requirements(self, resident_ids):
+        ids, option = self.per_resident_choices(resident_ids, DIETARY_REQUIREMENTS, 2)
+        columns = ["requirement_type", "description", "is_allergy", "notes"]
+        values = np.asarray(DIETARY_REQUIREMENTS, dtype=object)[option]
+        return {"resident_id": ids, **{column: values[:, i] for i, column in enumerate(columns)}}
+
+    def menu_selections(self, resident_ids):
+        """menu_selections with explicit ids, and the leftover_food rows that refer to them"""
+        rng, n = self.rng, len(resident_ids)
+        appetite = rng.normal(0, 8, n)
+        ids, days = self.daily(resident_ids, per_day=len(SELECTION_MEALS))
+        meal = np.tile(np.arange(len(SELECTION_MEALS)), n * self.days)
+        menu_item = np.empty(len(ids), dtype=int)
+        for index, (_, meal_type, _) in enumerate(SELECTION_MEALS):
+            rows = meal == index
+            menu_item[rows] = rng.choice(self.menu_ids[meal_type], rows.sum())
+        lowest = np.array([minimum for _, _, minimum in SELECTION_MEALS])[meal]
+        consumed = np.clip(rng.integers(lowest, 101) + np.repeat(appetite, self.days * len(SELECTION_MEALS)),
+                           0, 100).astype(int)
+        selection_ids = np.arange(self.next_selection_id, self.next_selection_id + len(ids))
+        self.next_selection_id += len(ids)
+        selections = {"id": selection_ids, "resident_id": ids, "menu_item_id": menu_item, "date": day_strings(days),
+                      "meal_time": np.asarray([meal_time for meal_time, _, _ in SELECTION_MEALS])[meal],
+                      "consumed_percent": consumed,
+                      "feedback": np.select([consumed >= 90, consumed >= 70], ["Good", "Adequate"], default="Poor")}
+        leftover = consumed < 100
+        leftovers = {"menu_selection_id": selection_ids[leftover], "amount_percent": 100 - consumed[leftover],
+                     "reason": choice(rng, LEFTOVER_REASONS, leftover.sum())}
+        return selections, leftovers
+
+    def trust_account_transactions(self, resident_ids):
+        rng = self.rng
+        # A monthly family deposit and a few small expenses per week
+        deposit_ids, deposit_days = self.events(resident_ids, 1 / 30)
+        expense_ids, expense_days = self.events(resident_ids, 0.4)
+        ids = np.concatenate([deposit_ids, expense_ids])
+        times = np.concatenate([random_times(rng, deposit_days, 9, 17), random_times(rng, expense_days, 9, 19)])
+        amounts = np.concatenate([np.round(rng.uniform(200, 500, len(deposit_ids)), 2),
+                                  -np.round(rng.uniform(5, 50, len(expense_ids)), 2)])
+        deposit = np.arange(len(ids)) < len(deposit_ids)
+        descriptions = np.where(deposit, "Family deposit", choice(rng, EXPENSES, len(ids)))
+        types = np.where(deposit, "Deposit", choice(rng, ["Withdrawal", "Purchase", "Service fee"], len(ids)))
+        order = np.lexsort((times, ids))
+        ids, times, amounts = ids[order], times[order], amounts[order]
+        # Running balance per resident, starting at 500
+        running = np.cumsum(amounts)
+        first = np.r_[True, ids[1:] != ids[:-1]]
+        before_resident = np.repeat(running[first] - amounts[first], np.diff(np.r_[np.flatnonzero(first), len(ids)]))
+        return {"resident_id": ids, "transaction_date": timestamp_strings(times), "amount": amounts,
+                "transaction_type": types[order], "description": descriptions[order],
+                "balance_after": np.round(500 + running - before_resident, 2),
+                "processed_by": np.where(deposit[order], "Admin", "Caregiver")}
+
+
+#######################
+# Database
+def generate(path, residents, days, start, seed=42, sensor_events=24, template_path=None, force=False):
+    """
+    Write a new database with `residents` residents and `days` days of data to `path`.
+    Returns {table: inserted rows}.
+    """
+    template_path = template_path or db.DB_PATH
+    if os.path.abspath(path) == os.path.abspath(template_path):
+        raise ValueError("The generated database must not replace the template database")
+    if os.path.exists(path):
+        if not force:
+            raise FileExistsError(f"{path} exists, use --force to replace it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    db.configure(path)
+    conn = db.connect(readonly=False)
+    # Nothing to protect while the file is being built: no journal, no fsync
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    counts = {}
+    try:
+        create_schema(conn, template_path)
+        copy_reference_data(conn, template_path)
+        generator = Generator(residents, days, start, seed=seed, sensor_events=sensor_events)
+        generator.load_reference_ids(conn)
+
+        for first in range(1, residents + 1, RESIDENT_BATCH):
+            resident_ids = np.arange(first, min(first + RESIDENT_BATCH, residents + 1))
+            people = generator.people(resident_ids)
+            selections, leftovers = generator.menu_selections(resident_ids)
+            batch = [
+                ("patient", generator.patient(people)),
+                ("residents", generator.residents_table(people)),
+                ("raum", generator.raum(resident_ids)),
+                ("rooms", generator.rooms(resident_ids)),
+                ("smart_devices", generator.smart_devices(resident_ids)),
+                ("device_history", generator.device_history(resident_ids)),
+                ("Ein_aus", generator.ein_aus(resident_ids)),
+                ("bestellungen", generator.bestellungen(resident_ids)),
+                ("health_vitals", generator.health_vitals(resident_ids)),
+                ("sleep_quality", generator.sleep_quality(resident_ids)),
+                ("activity_participation", generator.activity_participation(resident_ids)),
+                ("outings", generator.outings(resident_ids)),
+                ("doctor_visits", generator.doctor_visits(resident_ids)),
+                ("allergies", generator.allergies(resident_ids)),
+                ("dietary_requirements", generator.dietary_requirements(resident_ids)),
+                ("menu_selections", selections),
+                ("leftover_food", leftovers),
+                ("trust_account_transactions", generator.trust_account_transactions(resident_ids)),
+            ]
+            # One transaction per batch of residents
+            conn.execute("BEGIN")
+            for table, columns in batch:
+                counts[table] = counts.get(table, 0) + bulk_insert(conn, table, columns)
+            conn.commit()
+            print(f"Residents {resident_ids[0]}-{resident_ids[-1]} of {residents} written")
+
+        # Indexes, summary tables and WAL are created after the bulk load, which is much faster
+        conn.execute("PRAGMA journal_mode = DELETE")
+        apply_pragmas(conn)
+        migrate(conn)
+    finally:
+        conn.close()
+    return counts
+
+def main():
+    # Shows the migrations applied after the bulk load
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Generate a synthetic database at a configurable scale")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"database file to write (default: {DEFAULT_DB})")
+    parser.add_argument("--residents", type=int, default=500, help="number of residents")
+    parser.add_argument("--days", type=int, default=730, help="number of days of history per resident")
+    parser.add_argument("--start", type=date.fromisoformat, default=None,
+                        help="first day (YYYY-MM-DD, default: --days before today)")
+    parser.add_argument("--sensor-events", type=float, default=24, help="device_history events per resident and day")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--template", default=None, help="database whose legacy schema and menus are copied "
+                                                         f"(default: {db.DB_PATH})")
+    parser.add_argument("--force", action="store_true", help="replace an existing database file")
+    args = parser.parse_args()
+
+    start = args.start or date.fromordinal(date.today().toordinal() - args.days)
+    started = time.perf_counter()
+    counts = generate(args.db, args.residents, args.days, start, seed=args.seed, sensor_events=args.sensor_events,
+                      template_path=args.template, force=args.force)
+    elapsed = time.perf_counter() - started
+
+    for table, rows in counts.items():
+        print(f"{table:<28} {rows:>12,}")
+    size_mb = os.path.getsize(args.db) / 1024 / 1024
+    print(f"{sum(counts.values()):,} rows, {size_mb:,.1f} MB in {elapsed:.1f} s -> {args.db}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import logging
+import sqlite3
+import sys
+import db
+from aggregates import tracked_tables
+
+logger = logging.getLogger(__name__)
+
+#######################
+# Connection settings
+def apply_pragmas(conn):
+    """Switch the database to WAL. journal_mode is stored in the database file; the per-connection pragmas are set by db.connect."""
+    conn.execute("PRAGMA journal_mode = WAL")
+
+#######################
+# Migrations
+def table_exists(conn, table_name):
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table_name,))
+    return cursor.fetchone() is not None
+
+# (index, table, columns) - secondary indexes for the per-resident and time-window queries
+INDEXES = [
+    # Legacy tables
+    ("idx_ein_aus_pat_zeit", "Ein_aus", "pat_id, zeitstempel"),
+    ("idx_bestellungen_pat_datum", "bestellungen", "pat_id, datum"),
+    ("idx_bestellungen_datum", "bestellungen", "datum, tageszeit"),
+    ("idx_raum_pat", "raum", "pat_id"),
+    # Assisted living tables
+    ("idx_health_vitals_resident_time", "health_vitals", "resident_id, measurement_time"),
+    ("idx_doctor_visits_resident_date", "doctor_visits", "resident_id, visit_date"),
+    ("idx_allergies_resident", "allergies", "resident_id"),
+    ("idx_sleep_quality_resident_date", "sleep_quality", "resident_id, date"),
+    ("idx_activity_participation_resident_date", "activity_participation", "resident_id, date"),
+    ("idx_activity_participation_activity", "activity_participation", "activity_id"),
+    ("idx_outings_resident_departure", "outings", "resident_id, departure_time"),
+    ("idx_dietary_requirements_resident", "dietary_requirements", "resident_id"),
+    ("idx_menu_selections_resident_date", "menu_selections", "resident_id, date"),
+    ("idx_menu_selections_date", "menu_selections", "date"),
+    ("idx_leftover_food_selection", "leftover_food", "menu_selection_id"),
+    ("idx_trust_transactions_resident_date", "trust_account_transactions", "resident_id, transaction_date"),
+    # Smart home tables
+    ("idx_device_history_device_time", "device_history", "device_id, timestamp"),
+]
+
+def missing_indexes(conn):
+    """INDEXES entries whose table exists but whose index does not (yet)"""
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [index for index in INDEXES if index[1] in tables and index[0] not in names]
+
+def create_indexes(conn, indexes):
+    for index_name, table_name, columns in indexes:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON "{table_name}" ({columns})')
+    # Give the query planner statistics for the new indexes
+    conn.execute("ANALYZE")
+
+def migration_1_indexes(conn):
+    """
+    Secondary indexes for the per-resident and time-window queries.
+    Tables that do not exist yet get their indexes from ensure_indexes once they are created.
+    """
+    create_indexes(conn, missing_indexes(conn))
+
+def ensure_indexes(conn):
+    """Create the INDEXES of tables added since migration 1 ran (e.g. by add_smarthome_tables). Returns their names."""
+    indexes = missing_indexes(conn)
+    if not indexes:
+        return []
+    conn.execute("BEGIN")
+    try:
+        create_indexes(conn, indexes)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    names = [index[0] for index in indexes]
+    logger.info("Created indexes: %s", ", ".join(names))
+    return names
+
+def migration_2_daily_aggregates(conn):
+    """Daily summary tables for the facility overview, filled incrementally by aggregates.refresh"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS agg_daily_orders (
+        day TEXT PRIMARY KEY,
+        orders INTEGER NOT NULL DEFAULT 0,
+        guest_orders INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS agg_daily_consumption (
+        day TEXT PRIMARY KEY,
+        selections INTEGER NOT NULL DEFAULT 0,
+        consumed_percent_sum INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS agg_daily_waste (
+        day TEXT PRIMARY KEY,
+        leftovers INTEGER NOT NULL DEFAULT 0,
+        amount_percent_sum INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS agg_daily_vitals (
+        day TEXT PRIMARY KEY,
+        measurements INTEGER NOT NULL DEFAULT 0,
+        heart_rate_sum INTEGER NOT NULL DEFAULT 0,
+        systolic_sum INTEGER NOT NULL DEFAULT 0,
+        diastolic_sum INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS agg_daily_door_events (
+        day TEXT PRIMARY KEY,
+        exits INTEGER NOT NULL DEFAULT 0,
+        entries INTEGER NOT NULL DEFAULT 0,
+        night_exits INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS agg_daily_activity (
+        day TEXT PRIMARY KEY,
+        participations INTEGER NOT NULL DEFAULT 0,
+        attended INTEGER NOT NULL DEFAULT 0
+    )''')
+    # Highest source rowid already folded into the summaries, per summary table
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS agg_watermarks (
+        aggregate TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL DEFAULT 0
+    )''')
+
+def migration_3_risk_scores(conn):
+    """Risk scores precomputed by the scheduler and the queue of alerts raised from them"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS risk_scores (
+        resident_id INTEGER PRIMARY KEY,
+        isolation_risk INTEGER,
+        isolation_factors TEXT,
+        fall_risk INTEGER,
+        fall_factors TEXT,
+        computed_at TEXT NOT NULL
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS risk_alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        resident_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        risk INTEGER,
+        title TEXT NOT NULL,
+        body TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        delivered_at TEXT
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_risk_alerts_pending ON risk_alerts (id) WHERE delivered_at IS NULL")
+
+def migration_4_alert_lookup(conn):
+    """Alerts are read per session by id and creation time; nothing marks them delivered any more"""
+    conn.execute("DROP INDEX IF EXISTS idx_risk_alerts_pending")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_risk_alerts_created ON risk_alerts (created_at)")
+
+def migration_5_stale_aggregates(conn):
+    """Aggregates flagged by the triggers of ensure_triggers, recomputed by aggregates.refresh"""
+    conn.execute("CREATE TABLE IF NOT EXISTS agg_stale (aggregate TEXT PRIMARY KEY)")
+
+def missing_stale_triggers(conn):
+    """(trigger, sql) for every existing table in aggregates.tracked_tables() without its triggers"""
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "agg_stale" not in tables:
+        return []
+    triggers = []
+    for table, aggregates in tracked_tables().items():
+        if table not in tables:
+            continue
+        values = ", ".join(f"('{name}')" for name in aggregates)
+        for event in ("UPDATE", "DELETE"):
+            trigger = f"agg_stale_{table}_{event.lower()}"
+            if trigger not in names:
+                triggers.append((trigger, f'CREATE TRIGGER IF NOT EXISTS "{trigger}" AFTER {event} ON "{table}" '
+                                          f"BEGIN INSERT OR IGNORE INTO agg_stale (aggregate) VALUES {values}; END"))
+    return triggers
+
+def migration_6_table_changes(conn):
+    """Per-table counter of updated and deleted rows, bumped by the triggers of ensure_triggers"""
+    conn.execute("CREATE TABLE IF NOT EXISTS table_changes (name TEXT PRIMARY KEY, changes INTEGER NOT NULL DEFAULT 0)")
+
+def missing_change_triggers(conn):
+    """
+    (trigger, sql) for every table without its table_changes triggers. Inserts are not counted,
+    readers see them in the row count and max rowid; an update or delete changes neither reliably.
+    """
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'")]
+    if "table_changes" not in tables:
+        return []
+    triggers = []
+    for table in tables:
+        if table == "table_changes":
+            continue
+        for event in ("UPDATE", "DELETE"):
+            trigger = f"changes_{table}_{event.lower()}"
+            if trigger not in names:
+                triggers.append((trigger, f'CREATE TRIGGER IF NOT EXISTS "{trigger}" AFTER {event} ON "{table}" '
+                                          f"BEGIN INSERT INTO table_changes (name, changes) VALUES ('{table}', 1) "
+                                          f"ON CONFLICT(name) DO UPDATE SET changes = changes + 1; END"))
+    return triggers
+
+def ensure_triggers(conn):
+    """
+    Create the stale-summary and change-counter triggers that are missing, also for tables created
+    after the migrations ran (e.g. by add_smarthome_tables). Returns their names.
+    """
+    triggers = missing_stale_triggers(conn) + missing_change_triggers(conn)
+    if not triggers:
+        return []
+    conn.execute("BEGIN")
+    try:
+        for _, sql in triggers:
+            conn.execute(sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return [trigger for trigger, _ in triggers]
+
+# (version, description, function) - append new migrations at the end, never change applied ones
+MIGRATIONS = [
+    (1, "Secondary indexes for per-resident and time-window queries", migration_1_indexes),
+    (2, "Daily summary tables for the facility overview", migration_2_daily_aggregates),
+    (3, "Precomputed risk scores and alert queue", migration_3_risk_scores),
+    (4, "Per-session alert delivery", migration_4_alert_lookup),
+    (5, "Stale flags for the daily summary tables", migration_5_stale_aggregates),
+    (6, "Per-table change counters", migration_6_table_changes),
+]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Apply all pending migrations, each in its own transaction. Returns the new schema version."""
+    current_version = get_schema_version(conn)
+    for version, description, apply in MIGRATIONS:
+        if version <= current_version:
+            continue
+        conn.execute("BEGIN")
+        try:
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info("Applied migration %d: %s", version, description)
+        current_version = version
+    # Migration 1 only indexes the tables that existed when it ran; the others are indexed as soon as they exist
+    ensure_indexes(conn)
+    ensure_triggers(conn)
+    return current_version
+
+def ensure_schema():
+    """Set the pragmas and bring the schema up to date, using the shared writer connection"""
+    with db.writer() as conn:
+        apply_pragmas(conn)
+        return migrate(conn)
+
+#######################
+# Query plan check
+# The hot queries of the dashboard, risk scores and chat; every one of them must be answered via an index
+HOT_QUERIES = {
+    "activity_participation last 30 days": (
+        "SELECT date, COUNT(*) FROM activity_participation "
+        "WHERE resident_id = ? AND date >= date('now', '-30 days') GROUP BY date", (1,)),
+    "outings last 30 days": (
+        "SELECT departure_time, COUNT(*) FROM outings "
+        "WHERE resident_id = ? AND departure_time >= datetime('now', '-30 days') GROUP BY departure_time", (1,)),
+    "Ein_aus per resident": (
+        "SELECT * FROM Ein_aus WHERE pat_id = ? AND zeitstempel >= ?", (1, "2025-01-01")),
+    "bestellungen per resident and day": (
+        "SELECT * FROM bestellungen WHERE pat_id = ? AND datum = ?", (1, "2025-01-01")),
+    "bestellungen per day": (
+        "SELECT pat_id FROM bestellungen WHERE datum = date('now')", ()),
+    "raum per resident": (
+        "SELECT * FROM raum WHERE pat_id = ?", (1,)),
+    "health_vitals per resident": (
+        "SELECT * FROM health_vitals WHERE resident_id = ?", (1,)),
+    "trust_account_transactions per resident": (
+        "SELECT * FROM trust_account_transactions WHERE resident_id = ?", (1,)),
+    "sleep_quality per resident": (
+        "SELECT * FROM sleep_quality WHERE resident_id = ?", (1,)),
+    "menu_selections per day": (
+        "SELECT * FROM menu_selections WHERE date = ?", ("2025-01-01",)),
+}
+
+def check_query_plans(conn):
+    """Run EXPLAIN QUERY PLAN for every hot query. Returns a list of (name, uses_index, plan)."""
+    results = []
+    for name, (query, params) in HOT_QUERIES.items():
+        try:
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()]
+        except sqlite3.OperationalError as e:
+            # Table missing in this database
+            results.append((name, None, [str(e)]))
+            continue
+        uses_index = any("USING INDEX" in step or "USING COVERING INDEX" in step for step in plan)
+        full_scan = any(step.startswith("SCAN ") and "USING" not in step for step in plan)
+        results.append((name, uses_index and not full_scan, plan))
+    return results
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if len(sys.argv) > 1:
+        db.configure(sys.argv[1])
+    version = ensure_schema()
+    print(f"Schema version: {version}")
+
+    failed = False
+    with db.reader() as conn:
+        for name, uses_index, plan in check_query_plans(conn):
+            status = "OK" if uses_index else ("SKIPPED" if uses_index is None else "FULL SCAN")
+            failed = failed or uses_index is False
+            print(f"[{status}] {name}: {' | '.join(plan)}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
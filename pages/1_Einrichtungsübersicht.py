@@ -0,0 +1,87 @@
+import streamlit as st
+from datetime import date, timedelta
+import plotly.express as px
+import aggregates
+from utils import setup_page_config, load_database_data
+
+# Setup page configuration
+setup_page_config()
+
+# Runs the migrations (incl. the summary tables) once per process
+load_database_data()
+
+# Fold new orders, vitals, door events etc. into the daily summaries; a no-op when nothing changed
+aggregates.refresh()
+
+st.title("Einrichtungsübersicht")
+
+# Stichtag: default is the last day with orders
+latest = aggregates.latest_day(["agg_daily_orders"]) or aggregates.latest_day()
+default_day = date.fromisoformat(latest) if latest else date.today()
+day = st.date_input("Stichtag", value=default_day, format="DD.MM.YYYY")
+kpis = aggregates.daily_kpis(day)
+previous = aggregates.daily_kpis(day - timedelta(days=1))
+
+def format_value(value, pattern):
+    return pattern.format(value) if value is not None else "–"
+
+def delta(key, pattern="{:+.1f}"):
+    if kpis[key] is None or previous[key] is None:
+        return None
+    return pattern.format(kpis[key] - previous[key])
+
+#######################
+# Bewohner
+st.subheader("Bewohner")
+summary = aggregates.facility_summary()
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Gesamtbewohner", summary["residents"])
+col2.metric("Durchschnittsalter", format_value(summary["avg_age"], "{:.1f} Jahre"))
+col3.metric("Jüngste/r", format_value(summary["min_age"], "{} Jahre"))
+col4.metric("Älteste/r", format_value(summary["max_age"], "{} Jahre"))
+
+#######################
+# Tageskennzahlen
+st.subheader(f"Tageskennzahlen {day:%d.%m.%Y}")
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Bestellungen", kpis["orders"], delta=delta("orders", "{:+d}"))
+col2.metric("Ø Verzehr", format_value(kpis["avg_consumed_percent"], "{:.1f} %"), delta=delta("avg_consumed_percent"))
+col3.metric("Ø Reste", format_value(kpis["avg_leftover_percent"], "{:.1f} %"),
+            delta=delta("avg_leftover_percent"), delta_color="inverse")
+col4.metric("Gastbestellungen", kpis["guest_orders"], delta=delta("guest_orders", "{:+d}"))
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Ø Herzfrequenz", format_value(kpis["avg_heart_rate"], "{:.0f} bpm"), delta=delta("avg_heart_rate"),
+            delta_color="off")
+col2.metric("Ø Blutdruck", f"{format_value(kpis['avg_systolic'], '{:.0f}')}/{format_value(kpis['avg_diastolic'], '{:.0f}')} mmHg")
+col3.metric("Ausgänge (davon nachts)", f"{kpis['exits']} ({kpis['night_exits']})", delta=delta("exits", "{:+d}"),
+            delta_color="off")
+col4.metric("Teilnahmequote Aktivitäten", format_value(kpis["attendance_rate"], "{:.0%}"),
+            delta=delta("attendance_rate", "{:+.0%}"))
+
+#######################
+# Verlauf
+st.subheader("Verlauf der letzten 30 Tage")
+start_day = day - timedelta(days=29)
+orders = aggregates.daily_series("agg_daily_orders", start_day, day)
+consumption = aggregates.daily_series("agg_daily_consumption", start_day, day)
+door_events = aggregates.daily_series("agg_daily_door_events", start_day, day)
+
+col1, col2 = st.columns(2)
+with col1:
+    if not orders.empty:
+        fig = px.bar(orders, x="day", y="orders", title="Bestellungen pro Tag")
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("Keine Bestellungen im Zeitraum.")
+with col2:
+    if not door_events.empty:
+        fig = px.bar(door_events, x="day", y=["exits", "night_exits"], barmode="group", title="Ausgänge pro Tag")
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("Keine Ausgänge im Zeitraum.")
+
+if not consumption.empty:
+    consumption["avg_consumed_percent"] = consumption["consumed_percent_sum"] / consumption["selections"]
+    fig = px.line(consumption, x="day", y="avg_consumed_percent", markers=True, title="Ø Verzehr in %")
+    st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,56 @@
+import os
+import streamlit as st
+from datetime import date
+from reports import REPORTS, get_report_engine
+from utils import setup_page_config, load_csv_data
+
+# Setup page configuration
+setup_page_config()
+
+st.title("Berichte")
+st.write("Excel-Berichte für die gesamte Einrichtung. Die Erstellung läuft im Hintergrund, "
+         "bereits erstellte Berichte werden direkt wiederverwendet.")
+
+# Default range: all meal orders
+_, meal_orders, _, _, _ = load_csv_data()
+if not meal_orders.empty:
+    first_day, last_day = meal_orders['date'].min().date(), meal_orders['date'].max().date()
+else:
+    first_day = last_day = date.today()
+
+report_types = {spec["title"]: key for key, spec in REPORTS.items()}
+report_type = report_types[st.selectbox("Bericht", list(report_types))]
+date_range = st.date_input("Zeitraum", value=(first_day, last_day), format="DD.MM.YYYY")
+
+if "report_jobs" not in st.session_state:
+    st.session_state.report_jobs = []
+
+if st.button("Bericht erstellen", type="primary"):
+    if len(date_range) != 2:
+        st.warning("Bitte Start- und Enddatum wählen.")
+    else:
+        start, end = date_range
+        job = get_report_engine().request(report_type, start, end)
+        st.session_state.report_jobs.insert(0, (report_type, start, end, job))
+
+# Requested reports of this session, newest first
+if st.session_state.report_jobs:
+    st.subheader("Angeforderte Berichte")
+    if any(not job.done() for *_, job in st.session_state.report_jobs):
+        st.button("Status aktualisieren")
+
+for index, (job_type, start, end, job) in enumerate(st.session_state.report_jobs):
+    label = f"{REPORTS[job_type]['title']} {start:%d.%m.%Y} – {end:%d.%m.%Y}"
+    if not job.done():
+        st.info(f"{label}: wird erstellt …")
+    elif job.exception() is not None:
+        st.error(f"{label}: Fehler bei der Erstellung: {job.exception()}")
+    else:
+        path = job.result()
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                st.download_button(f"{label} herunterladen", data=f.read(), file_name=os.path.basename(path),
+                                   mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                   key=f"report_{index}_{os.path.basename(path)}")
+        else:
+            st.warning(f"{label}: Datei nicht mehr vorhanden, bitte neu erstellen.")
@@ -0,0 +1,250 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+import streamlit as st
+import db
+
+# Profiling of one rerun: timing spans, SQL statements, a debug panel and a Chrome trace export.
+# Enabled for every session with HZL_PROFILE=1 or for one browser tab with ?debug=1 in the URL.
+# Disabled, a span or a decorated function costs one ContextVar lookup.
+PROFILE_ENV = "HZL_PROFILE"
+QUERY_PARAM = "debug"
+SQL_PREVIEW = 120   # characters of a statement shown in the panel
+
+# Profiler of the rerun running in this thread (None = profiling off)
+_current = contextvars.ContextVar("hzl_profiler", default=None)
+
+
+class Profiler:
+    """
+    Spans and SQL statements of one rerun. Times are seconds since the start of the rerun.
+    Thread-safe: work started with asyncio.to_thread copies the context and records into the same profiler.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.created = datetime.now()
+        self.spans = []
+        self.queries = []
+        self._stacks = {}
+        self._section = None
+        self._lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter() - self.origin
+
+    def begin(self, name, category="span"):
+        thread = threading.get_ident()
+        with self._lock:
+            stack = self._stacks.setdefault(thread, [])
+            record = {"name": name, "category": category, "start": self.now(), "duration": None,
+                      "depth": len(stack), "thread": thread}
+            stack.append(record)
+        return record
+
+    def end(self, record):
+        with self._lock:
+            if record["duration"] is not None:
+                return
+            record["duration"] = self.now() - record["start"]
+            stack = self._stacks.get(record["thread"], [])
+            if record in stack:
+                stack.remove(record)
+            self.spans.append(record)
+
+    def section(self, name):
+        """Close the current top-level section and start the next one"""
+        if self._section is not None:
+            self.end(self._section)
+        self._section = self.begin(name, "section")
+
+    def add_query(self, sql, started, duration):
+        with self._lock:
+            self.queries.append({"sql": " ".join(sql.split()), "start": started - self.origin,
+                                 "duration": duration, "thread": threading.get_ident()})
+
+    def finish(self):
+        """Close the last section and every span left open, e.g. by an early st.stop()"""
+        if self._section is not None:
+            self.end(self._section)
+            self._section = None
+        with self._lock:
+            still_open = [record for stack in self._stacks.values() for record in stack]
+        for record in still_open:
+            self.end(record)
+        return self.now()
+
+    def span_table(self):
+        """One row per span in start order with its own SQL statements (of the same thread)"""
+        rows = []
+        for span in sorted(self.spans, key=lambda s: (s["start"], s["depth"])):
+            end = span["start"] + span["duration"]
+            queries = [q for q in self.queries
+                       if q["thread"] == span["thread"] and span["start"] <= q["start"] < end]
+            rows.append({
+                "Bereich": "· " * span["depth"] + span["name"],
+                "Dauer ms": round(span["duration"] * 1000, 1),
+                "SQL": len(queries),
+                "SQL ms": round(sum(q["duration"] for q in queries) * 1000, 1),
+            })
+        return pd.DataFrame(rows, columns=["Bereich", "Dauer ms", "SQL", "SQL ms"])
+
+    def query_table(self):
+        """SQL statements grouped by text, slowest total first"""
+        if not self.queries:
+            return pd.DataFrame(columns=["Abfrage", "Anzahl", "Gesamt ms", "Max ms"])
+        queries = pd.DataFrame(self.queries)
+        grouped = queries.groupby("sql")["duration"].agg(["count", "sum", "max"]).sort_values("sum", ascending=False)
+        return pd.DataFrame({
+            "Abfrage": grouped.index.str.slice(0, SQL_PREVIEW),
+            "Anzahl": grouped["count"].values,
+            "Gesamt ms": (grouped["sum"] * 1000).round(2).values,
+            "Max ms": (grouped["max"] * 1000).round(2).values,
+        })
+
+    def chrome_trace(self):
+        """Trace Event Format, loadable in chrome://tracing, Perfetto or speedscope (flame graph)"""
+        events = [{"name": span["name"], "cat": span["category"], "ph": "X", "pid": 1, "tid": span["thread"],
+                   "ts": span["start"] * 1e6, "dur": span["duration"] * 1e6}
+                  for span in self.spans]
+        events += [{"name": query["sql"][:SQL_PREVIEW], "cat": "sql", "ph": "X", "pid": 1, "tid": query["thread"],
+                    "ts": query["start"] * 1e6, "dur": query["duration"] * 1e6, "args": {"sql": query["sql"]}}
+                   for query in self.queries]
+        return {"traceEvents": sorted(events, key=lambda event: event["ts"]), "displayTimeUnit": "ms",
+                "otherData": {"created": self.created.isoformat(timespec="seconds")}}
+
+
+class _NullSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, profiler, name, category):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.record = None
+
+    def __enter__(self):
+        self.record = self.profiler.begin(self.name, self.category)
+        return self.record
+
+    def __exit__(self, *exc):
+        self.profiler.end(self.record)
+        return False
+
+#######################
+# Instrumentation
+def span(name, category="span"):
+    """Context manager that times a block; a shared no-op when profiling is off"""
+    profiler = _current.get()
+    if profiler is None:
+        return _NULL_SPAN
+    return _Span(profiler, name, category)
+
+def section(name):
+    """Mark the start of the next top-level section of the script (ends the previous one)"""
+    profiler = _current.get()
+    if profiler is not None:
+        profiler.section(name)
+
+def profiled(func=None, *, name=None):
+    """
+    Time every call of a function as a span named module.function.
+    Below @st.cache_data / @st.cache_resource it only times the cache misses.
+    Generator functions are timed from the first to the last item.
+    """
+    if func is None:
+        return functools.partial(profiled, name=name)
+    label = name or f"{func.__module__}.{func.__name__}"
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            profiler = _current.get()
+            if profiler is None:
+                return (yield from func(*args, **kwargs))
+            record = profiler.begin(label, "function")
+            try:
+                return (yield from func(*args, **kwargs))
+            finally:
+                profiler.end(record)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _current.get()
+        if profiler is None:
+            return func(*args, **kwargs)
+        record = profiler.begin(label, "function")
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.end(record)
+    return wrapper
+
+def _record_query(sql, started, duration):
+    profiler = _current.get()
+    if profiler is not None:
+        profiler.add_query(sql, started, duration)
+
+#######################
+# Rerun lifecycle
+def enabled():
+    if os.environ.get(PROFILE_ENV) == "1":
+        return True
+    try:
+        return st.query_params.get(QUERY_PARAM) == "1"
+    except Exception:
+        # No Streamlit runtime (scripts, benchmarks)
+        return False
+
+def start_rerun():
+    """Call at the top of the script; returns the rerun's Profiler or None when profiling is off"""
+    if not enabled():
+        _current.set(None)
+        return None
+    # SQL timing is only switched on once somebody profiles; until then db runs without a listener
+    db.query_listener = _record_query
+    profiler = Profiler()
+    _current.set(profiler)
+    return profiler
+
+def finish_rerun():
+    """Call at the end of the script: stops recording and shows the debug panel in the sidebar"""
+    profiler = _current.get()
+    if profiler is None:
+        return None
+    total = profiler.finish()
+    _current.set(None)
+    render_panel(profiler, total)
+    return profiler
+
+def render_panel(profiler, total):
+    with st.sidebar.expander("Profiling", expanded=False):
+        sql_seconds = sum(query["duration"] for query in profiler.queries)
+        col1, col2 = st.columns(2)
+        col1.metric("Rerun", f"{total * 1000:.0f} ms")
+        col2.metric("SQL", f"{len(profiler.queries)} / {sql_seconds * 1000:.0f} ms")
+        st.dataframe(profiler.span_table(), hide_index=True, use_container_width=True)
+        st.caption("Langsamste SQL-Abfragen")
+        st.dataframe(profiler.query_table().head(20), hide_index=True, use_container_width=True)
+        st.download_button(
+            "Chrome-Trace exportieren",
+            data=json.dumps(profiler.chrome_trace()).encode("utf-8"),
+            file_name=f"profil_{profiler.created:%Y%m%d_%H%M%S}.json",
+            mime="application/json",
+            help="In chrome://tracing, ui.perfetto.dev oder speedscope.app öffnen"
+        )
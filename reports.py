@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import streamlit as st
+from openpyxl import Workbook
+import snapshots
+from utils import weather_correlation_table
+
+# Generated reports, named by type, date range and data fingerprint
+REPORT_DIR = os.path.join('reports', 'cache')
+REPORT_WORKERS = 2          # reports generated in parallel, further requests wait in the queue
+MAX_CACHED_REPORTS = 50     # oldest files beyond this are deleted
+
+#######################
+# Report contents
+# Every builder gets the date-filtered frames of its tables and returns [(sheet title, DataFrame)]
+def overview_sheets(frames):
+    residents = frames["residents"]
+    summary = pd.DataFrame([{
+        'Gesamtbewohner': len(residents),
+        'Durchschnittsalter': round(residents['age'].mean(), 1),
+        'Minimales Alter': residents['age'].min(),
+        'Maximales Alter': residents['age'].max(),
+        'Durchschnittlicher Pflegegrad': round(residents['care_level'].mean(), 1)
+    }])
+    age_distribution = residents['age'].value_counts().sort_index().rename_axis('Alter').reset_index(name='Anzahl Bewohner')
+    return [("Übersicht", summary), ("Altersverteilung", age_distribution), ("Bewohnerdetails", residents)]
+
+def nutrition_sheets(frames):
+    meal_orders = frames["meal_orders"]
+    consumption = meal_orders.groupby('meal_type', observed=True)['actual_consumption'].agg(['mean', 'std', 'count']).reset_index()
+    consumption.columns = ['Mahlzeitentyp', 'Durchschnittlicher Verbrauch', 'Standardabweichung', 'Anzahl']
+    waste = pd.DataFrame({
+        'Mahlzeitentyp': consumption['Mahlzeitentyp'],
+        'Durchschnittlicher Abfall': 1 - consumption['Durchschnittlicher Verbrauch']
+    })
+    return [("Verbrauchsanalyse", consumption), ("Abfallanalyse", waste), ("Rohdaten", meal_orders)]
+
+def health_sheets(frames):
+    health = frames["health_monitoring"]
+    vitals = health.groupby('resident_id').agg({
+        'blood_pressure_systolic': 'mean',
+        'blood_pressure_diastolic': 'mean',
+        'heart_rate': 'mean',
+        'date': 'count'
+    }).reset_index()
+    vitals.columns = ['Bewohner', 'Ø Blutdruck systolisch', 'Ø Blutdruck diastolisch', 'Ø Herzfrequenz', 'Messungen']
+    weight = health.pivot_table(index='date', columns='resident_id', values='weight').reset_index()
+    weight.columns = ['Datum'] + [f"Bewohner {resident_id}" for resident_id in weight.columns[1:]]
+    return [("Vitalparameter", vitals), ("Gewichtsentwicklung", weight), ("Rohdaten", health)]
+
+def weather_sheets(frames):
+    weather_consumption, correlations = weather_correlation_table(frames["meal_orders"], frames["weather_data"])
+    if weather_consumption is None:
+        weather_consumption, correlations = pd.DataFrame(), pd.DataFrame()
+    return [("Korrelationen", correlations), ("Wettereinfluss", weather_consumption), ("Wetterdaten", frames["weather_data"])]
+
+# report type -> title, snapshot tables and sheet builder
+REPORTS = {
+    "uebersicht": {"title": "Übersichtsbericht", "tables": ["residents"], "build": overview_sheets},
+    "ernaehrung": {"title": "Ernährungsbericht", "tables": ["meal_orders"], "build": nutrition_sheets},
+    "gesundheit": {"title": "Gesundheitsbericht", "tables": ["health_monitoring"], "build": health_sheets},
+    "wetter": {"title": "Wettereinflussbericht", "tables": ["meal_orders", "weather_data"], "build": weather_sheets},
+}
+
+def load_frames(report_type, start, end):
+    """Snapshot tables of a report, restricted to the date range on disk (partition pruning)"""
+    frames = {}
+    for name in REPORTS[report_type]["tables"]:
+        if name == "residents":
+            # Everyone who moved in before the end of the range
+            filters = [("entry_date", "<=", end)]
+        else:
+            filters = [("date", ">=", start), ("date", "<=", end)]
+        frame = snapshots.load_snapshot(name, filters=filters)
+        # Reports calculate in float64; rounding drops the float32 noise (0.8 -> 0.800000011920929)
+        float32_columns = frame.select_dtypes(include='float32').columns
+        frames[name] = frame.astype({column: 'float64' for column in float32_columns}).round(
+            {column: 6 for column in float32_columns})
+    return frames
+
+#######################
+# Writing
+def sheet_rows(frame):
+    """Header followed by the rows of a DataFrame, one at a time, with NaN/NaT written as empty cells"""
+    yield [str(column) for column in frame.columns]
+    for row in frame.itertuples(index=False, name=None):
+        yield [None if pd.isna(value) else value for value in row]
+
+def write_report(path, sheets):
+    """Stream the sheets into an xlsx in write-only mode; memory does not grow with the row count"""
+    workbook = Workbook(write_only=True)
+    for title, frame in sheets:
+        worksheet = workbook.create_sheet(title=title[:31])
+        for row in sheet_rows(frame):
+            worksheet.append(row)
+    tmp_path = path + ".tmp"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+def data_fingerprint(report_type, start, end):
+    """Hash of the snapshot partitions (months) a report reads; changes when any of them changes"""
+    manifest = snapshots.load_manifest()
+    first_month, last_month = f"{start:%Y-%m}", f"{end:%Y-%m}"
+    parts = {}
+    for name in REPORTS[report_type]["tables"]:
+        partitions = manifest.get(name, {}).get("partitions", {})
+        parts[name] = {month: digest for month, digest in partitions.items()
+                       if month == "all" or first_month <= month <= last_month}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class ReportEngine:
+    """
+    Generates the xlsx reports on a small thread pool so the UI never waits for them, not even
+    for the snapshot refresh. Reports are cached as files keyed by (type, date range, data
+    fingerprint); an identical request joins the job that is already running, and a job whose
+    file exists for the current data returns it right away.
+    """
+
+    def __init__(self, report_dir=REPORT_DIR, max_workers=REPORT_WORKERS, max_cached=MAX_CACHED_REPORTS):
+        self.report_dir = report_dir
+        self.max_cached = max_cached
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def report_path(self, report_type, start, end):
+        fingerprint = data_fingerprint(report_type, start, end)
+        return os.path.join(self.report_dir, f"{report_type}_{start:%Y%m%d}_{end:%Y%m%d}_{fingerprint}.xlsx")
+
+    def request(self, report_type, start, end):
+        """Future that resolves to the path of the finished report"""
+        if report_type not in REPORTS:
+            raise ValueError(f"Unknown report type: {report_type}")
+        start, end = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+        key = (report_type, start, end)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.done():
+                return job
+            # Only running jobs are joined; finished ones are reused through their files
+            self._jobs = {other: other_job for other, other_job in self._jobs.items() if not other_job.done()}
+            job = self._executor.submit(self._generate, report_type, start, end)
+            self._jobs[key] = job
+            return job
+
+    def _generate(self, report_type, start, end):
+        # Re-ingest changed CSVs on the worker; the fingerprint is only known afterwards
+        snapshots.build_snapshots()
+        path = self.report_path(report_type, start, end)
+        if os.path.exists(path):
+            return path
+        frames = load_frames(report_type, start, end)
+        sheets = REPORTS[report_type]["build"](frames)
+        os.makedirs(self.report_dir, exist_ok=True)
+        write_report(path, sheets)
+        self._evict()
+        return path
+
+    def _evict(self):
+        files = [os.path.join(self.report_dir, name) for name in os.listdir(self.report_dir) if name.endswith(".xlsx")]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for old_path in files[self.max_cached:]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+@st.cache_resource
+def get_report_engine():
+    return ReportEngine()
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import streamlit as st
+import db
+from migrations import ensure_schema
+from utils import compute_risk_scores_uncached, risk_heartbeat_path
+
+RISK_INTERVAL = 300  # seconds between two recomputations
+ALERT_MAX_AGE = timedelta(days=1)  # a newly opened session still gets the alerts raised this recently
+
+# Alert when a risk rises above the threshold; raised once per crossing, not on every run.
+# Every kind in ALERT_THRESHOLDS needs its message here.
+ALERT_THRESHOLDS = {"isolation": 65}
+ALERT_MESSAGES = {
+    "isolation": ("Akute Isolations Gefahr",
+                  "Der Bewohner {vorname} {nachname}, zeigt ein starkes Risiko für Vereinsamung ."),
+}
+
+#######################
+# Storing scores and alerts
+def _risk_value(value):
+    return None if value is None or value != value else int(value)
+
+def store_risk_scores(scores, now=None):
+    """
+    Replace the stored scores with `scores` (as returned by compute_risk_scores_uncached) and
+    queue an alert for every resident whose risk crossed a threshold since the last run.
+    Unchanged scores are not written, only the heartbeat file is touched.
+    Returns the number of queued alerts.
+    """
+    started = now or datetime.now()
+    now = started.isoformat(sep=" ", timespec="seconds")
+    queued = 0
+    with db.writer() as conn:
+        stored = conn.execute(
+            "SELECT resident_id, isolation_risk, isolation_factors, fall_risk, fall_factors FROM risk_scores").fetchall()
+        previous = {row[0]: {"isolation": row[1], "fall": row[3]} for row in stored}
+        names = {row[0]: {"vorname": row[1], "nachname": row[2]}
+                 for row in conn.execute("SELECT pat_id, vorname, nachname FROM patient")}
+
+        rows = []
+        for resident_id, score in scores.iterrows():
+            current = {"isolation": _risk_value(score['isolation_risk']), "fall": _risk_value(score['fall_risk'])}
+            rows.append((int(resident_id), current["isolation"], json.dumps(list(score['isolation_factors'])),
+                         current["fall"], json.dumps(list(score['fall_factors'])), now))
+
+            for kind, threshold in ALERT_THRESHOLDS.items():
+                before = previous.get(resident_id, {}).get(kind)
+                if current[kind] is not None and current[kind] > threshold and (before is None or before <= threshold):
+                    title, body = ALERT_MESSAGES[kind]
+                    conn.execute(
+                        "INSERT INTO risk_alerts (resident_id, kind, risk, title, body, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (int(resident_id), kind, current[kind], title,
+                         body.format(**names.get(resident_id, {"vorname": "", "nachname": f"#{resident_id}"})), now)
+                    )
+                    queued += 1
+
+        # Unchanged scores leave the database untouched, so every cache keyed by data_version stays valid
+        if queued or sorted(row[:5] for row in rows) != sorted(stored):
+            conn.execute("DELETE FROM risk_scores")
+            conn.executemany(
+                "INSERT INTO risk_scores (resident_id, isolation_risk, isolation_factors, fall_risk, fall_factors, computed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    _touch_heartbeat(started)
+    return queued
+
+def _touch_heartbeat(now):
+    path = risk_heartbeat_path()
+    with open(path, "a"):
+        pass
+    os.utime(path, (now.timestamp(), now.timestamp()))
+
+def run_once():
+    """Recompute every resident's risks and store them. Returns (residents, queued alerts)."""
+    scores = compute_risk_scores_uncached()
+    return len(scores), store_risk_scores(scores)
+
+ALERT_COLUMNS = ["id", "resident_id", "kind", "risk", "title", "body", "created_at"]
+
+def alerts_since(last_id=None, now=None):
+    """
+    Alerts a session has not seen yet: those after `last_id`, or those of the last ALERT_MAX_AGE for a
+    session without one. Every session keeps its own last_id, so each of them gets every alert once.
+    Returns (alerts, last_id to pass next time).
+    """
+    with db.reader() as conn:
+        if last_id is None:
+            since = ((now or datetime.now()) - ALERT_MAX_AGE).isoformat(sep=" ", timespec="seconds")
+            rows = conn.execute(f"SELECT {', '.join(ALERT_COLUMNS)} FROM risk_alerts WHERE created_at >= ? ORDER BY id",
+                                (since,)).fetchall()
+            # Older alerts are skipped for good, even when there are no recent ones
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM risk_alerts").fetchone()[0]
+        else:
+            rows = conn.execute(f"SELECT {', '.join(ALERT_COLUMNS)} FROM risk_alerts WHERE id > ? ORDER BY id",
+                                (last_id,)).fetchall()
+    alerts = [dict(zip(ALERT_COLUMNS, row)) for row in rows]
+    if alerts:
+        last_id = max(last_id, alerts[-1]["id"])
+    return alerts, last_id
+
+#######################
+# Scheduler
+class RiskScheduler(threading.Thread):
+    """Daemon thread that calls run_once() every `interval` seconds until stop() is called"""
+
+    def __init__(self, interval=RISK_INTERVAL):
+        super().__init__(name="risk-scheduler", daemon=True)
+        self.interval = interval
+        self.last_run = None
+        self.last_error = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                run_once()
+                self.last_run = time.time()
+                self.last_error = None
+            except Exception as e:
+                # Keep the thread alive, the next run may succeed (e.g. database locked)
+                self.last_error = e
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+
+
+@st.cache_resource
+def get_risk_scheduler():
+    """One scheduler thread per server process"""
+    ensure_schema()
+    scheduler = RiskScheduler()
+    scheduler.start()
+    return scheduler
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute risk scores and queue alerts")
+    parser.add_argument("--once", action="store_true", help="run a single recomputation and exit")
+    parser.add_argument("--interval", type=int, default=RISK_INTERVAL, help="seconds between runs")
+    args = parser.parse_args()
+
+    ensure_schema()
+    while True:
+        residents, alerts = run_once()
+        print(f"{datetime.now():%Y-%m-%d %H:%M:%S} Risk scores for {residents} residents, {alerts} new alert(s)")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import bisect
+import re
+import unicodedata
+from collections import defaultdict
+import streamlit as st
+import db
+from profiling import profiled
+
+# Resident search for the sidebar: names, IDs and room numbers, umlaut-folded, with prefix and trigram lookup
+SEARCH_PAGE_SIZE = 20
+FUZZY_MIN_SIMILARITY = 0.5   # trigram Dice coefficient a misspelt term needs to count as a match
+
+# Score of a term by how it matched a token; a resident scores the sum of its terms' best matches
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+SUBSTRING_SCORE = 1.5
+FUZZY_SCORE = 1.0   # multiplied by the similarity
+
+RESIDENT_QUERY = """
+    SELECT p.pat_id, p.vorname, p.nachname, GROUP_CONCAT(DISTINCT r.raum_nr) AS rooms
+    FROM patient p
+    LEFT JOIN raum r ON r.pat_id = p.pat_id
+    GROUP BY p.pat_id
+    ORDER BY p.rowid
+"""
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+#######################
+# Normalisation
+def fold(text):
+    """Lower case without accents, umlauts written out: 'Müller' -> 'mueller', 'José' -> 'jose'"""
+    text = str(text).lower().translate(UMLAUTS)
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+def fold_variants(text):
+    """Both spellings of umlauts, so 'mueller' and 'muller' find 'Müller'"""
+    lowered = str(text).lower()
+    stripped = "".join(c for c in unicodedata.normalize("NFKD", lowered.replace("ß", "ss"))
+                       if not unicodedata.combining(c))
+    return {fold(lowered), stripped}
+
+def tokenize(text):
+    return [token for token in re.split(r"[^0-9a-z]+", fold(text)) if token]
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ResidentSearchIndex:
+    """
+    Prebuilt lookup over residents' names, IDs and room numbers.
+    - prefix: binary search in the sorted token list
+    - substring and fuzzy: posting lists of token trigrams
+    Every term of a query has to match; results are ranked by the summed match scores.
+    """
+
+    def __init__(self, residents):
+        # residents: iterable of (pat_id, vorname, nachname, rooms)
+        self.ids = []
+        self.labels = []
+        self._names = []
+        token_residents = defaultdict(set)
+        for position, (pat_id, vorname, nachname, rooms) in enumerate(residents):
+            pat_id = int(pat_id)
+            self.ids.append(pat_id)
+            self.labels.append(f"{vorname} {nachname} (ID: {pat_id})")
+            self._names.append(fold(f"{nachname} {vorname}"))
+            fields = [str(pat_id), vorname or "", nachname or ""] + (str(rooms).split(",") if rooms else [])
+            for field in fields:
+                for variant in fold_variants(field):
+                    for token in re.split(r"[^0-9a-z]+", variant):
+                        if token:
+                            token_residents[token].add(position)
+
+        self.tokens = sorted(token_residents)
+        self._residents = [sorted(token_residents[token]) for token in self.tokens]
+        self._position = {pat_id: position for position, pat_id in enumerate(self.ids)}
+        self._trigrams = defaultdict(list)
+        self._trigram_counts = []
+        for token_id, token in enumerate(self.tokens):
+            token_trigrams = trigrams(token)
+            self._trigram_counts.append(len(token_trigrams))
+            for trigram in token_trigrams:
+                self._trigrams[trigram].append(token_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _prefix_tokens(self, term):
+        start = bisect.bisect_left(self.tokens, term)
+        end = bisect.bisect_left(self.tokens, term + "\uffff")
+        return range(start, end)
+
+    def _term_matches(self, term):
+        """Best score per resident position for one folded query term"""
+        scores = {}
+
+        def add(token_id, score):
+            for position in self._residents[token_id]:
+                if scores.get(position, 0) < score:
+                    scores[position] = score
+
+        for token_id in self._prefix_tokens(term):
+            add(token_id, EXACT_SCORE if self.tokens[token_id] == term else PREFIX_SCORE)
+        if len(term) < 3:
+            # Too short for trigrams; IDs and initials are found by prefix
+            return scores
+
+        # Count shared trigrams per token to find substrings and misspellings
+        term_trigrams = trigrams(term)
+        shared = defaultdict(int)
+        for trigram in term_trigrams:
+            for token_id in self._trigrams.get(trigram, ()):
+                shared[token_id] += 1
+        for token_id, count in shared.items():
+            if term in self.tokens[token_id]:
+                add(token_id, SUBSTRING_SCORE)
+                continue
+            similarity = 2 * count / (len(term_trigrams) + self._trigram_counts[token_id])
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                add(token_id, FUZZY_SCORE * similarity)
+        return scores
+
+    def search(self, query, limit=None):
+        """IDs of the matching residents, best match first; every resident in index order for an empty query"""
+        terms = tokenize(query)
+        if not terms:
+            return self.ids[:limit] if limit else list(self.ids)
+        total = None
+        for term in terms:
+            matches = self._term_matches(term)
+            if total is None:
+                total = matches
+            else:
+                total = {position: score + matches[position] for position, score in total.items() if position in matches}
+            if not total:
+                return []
+        ranked = sorted(total, key=lambda position: (-total[position], self._names[position], position))
+        return [self.ids[position] for position in ranked[:limit]]
+
+    def label(self, pat_id):
+        return self.labels[self._position[pat_id]]
+
+    def page(self, query, page, page_size=SEARCH_PAGE_SIZE):
+        """(labels of one page of results, number of results, number of pages); page counts from 1"""
+        results = self.search(query)
+        pages = max(1, -(-len(results) // page_size))
+        first = (min(max(page, 1), pages) - 1) * page_size
+        return [self.label(pat_id) for pat_id in results[first:first + page_size]], len(results), pages
+
+
+@st.cache_resource(max_entries=2)
+@profiled
+def _build_search_index(data_version):
+    with db.reader() as conn:
+        return ResidentSearchIndex(conn.execute(RESIDENT_QUERY).fetchall())
+
+def get_search_index():
+    """Index of all residents, rebuilt once the database has changed"""
+    return _build_search_index(db.data_version())
@@ -0,0 +1,206 @@
+import json
+import os
+import shutil
+import sys
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dtypes import CSV_DTYPES, apply_dtypes
+
+# Typed Parquet copies of the data/ CSVs, rebuilt by `python snapshots.py` or on first load
+DATA_DIR = 'data'
+SNAPSHOT_DIR = os.path.join(DATA_DIR, 'snapshots')
+MANIFEST_FILE = 'manifest.json'
+PARTITION_COLUMN = 'month'
+# Bumped when the file layout changes; snapshots written with another format are rewritten
+SNAPSHOT_FORMAT = 2
+
+# Sessions and the report worker may trigger a rebuild at the same time
+_build_lock = threading.Lock()
+
+# csv: source file, partition_by: date column whose month (YYYY-MM) becomes the Hive partition.
+# Column types come from dtypes.CSV_DTYPES.
+TABLES = {
+    "residents": {"csv": "residents.csv"},
+    "meal_orders": {"csv": "meal_orders.csv", "partition_by": "date"},
+    "health_monitoring": {"csv": "health_monitoring.csv", "partition_by": "date"},
+    "menu_items": {"csv": "menu_items.csv"},
+    "weather_data": {"csv": "weather_data.csv", "partition_by": "date"},
+}
+
+#######################
+# Ingest
+def date_columns(name):
+    return [column for column, dtype in CSV_DTYPES[name].items() if dtype == "datetime"]
+
+def read_csv_typed(name, data_dir=DATA_DIR):
+    frame = pd.read_csv(os.path.join(data_dir, TABLES[name]["csv"]), parse_dates=date_columns(name))
+    return apply_dtypes(frame, CSV_DTYPES[name])
+
+ARROW_TYPES = {
+    "datetime": pa.timestamp("ns"),
+    "category": pa.dictionary(pa.int32(), pa.string()),
+}
+
+def arrow_type(dtype, series):
+    """
+    Arrow type of a column from its CSV_DTYPES entry. Columns without one (or left as read because
+    the conversion failed) keep their numeric type; free text and columns that are empty in the
+    whole CSV are strings, so a month without values does not become a null column.
+    """
+    if dtype == "category" and isinstance(series.dtype, pd.CategoricalDtype):
+        return ARROW_TYPES["category"]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return ARROW_TYPES["datetime"]
+    if series.isna().all() or not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)):
+        return pa.string()
+    # Numbers keep their (possibly nullable) pandas width
+    return pa.Schema.from_pandas(series.to_frame(), preserve_index=False).field(0).type
+
+def table_schema(name, frame):
+    """One Arrow schema for every partition of a table, from CSV_DTYPES and the columns of the whole CSV"""
+    dtypes = CSV_DTYPES[name]
+    return pa.schema([pa.field(column, arrow_type(dtypes.get(column), frame[column])) for column in frame.columns])
+
+def source_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def frame_hash(frame):
+    return str(int(pd.util.hash_pandas_object(frame, index=False).sum()))
+
+def split_partitions(name, frame):
+    """{partition value: rows}; unpartitioned tables are a single partition named 'all'"""
+    partition_by = TABLES[name].get("partition_by")
+    if partition_by is None:
+        return {"all": frame}
+    months = frame[partition_by].dt.strftime("%Y-%m")
+    return {month: rows.reset_index(drop=True) for month, rows in frame.groupby(months, sort=True)}
+
+def partition_path(snapshot_dir, name, partition):
+    if partition == "all":
+        return os.path.join(snapshot_dir, name)
+    return os.path.join(snapshot_dir, name, f"{PARTITION_COLUMN}={partition}")
+
+def load_manifest(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(manifest, snapshot_dir=SNAPSHOT_DIR):
+    path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def ingest_table(name, manifest, data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR, force=False):
+    """Write the partitions of one table whose content changed. Returns the rewritten partitions."""
+    source = source_signature(os.path.join(data_dir, TABLES[name]["csv"]))
+    entry = manifest.get(name, {})
+    force = force or entry.get("format") != SNAPSHOT_FORMAT
+    if not force and entry.get("source") == source and os.path.isdir(os.path.join(snapshot_dir, name)):
+        return []
+
+    frame = read_csv_typed(name, data_dir)
+    partitions = split_partitions(name, frame)
+    schema = table_schema(name, frame)
+    old_hashes = entry.get("partitions", {})
+    new_hashes = {}
+    rewritten = []
+    for partition, rows in partitions.items():
+        new_hashes[partition] = frame_hash(rows)
+        path = partition_path(snapshot_dir, name, partition)
+        if not force and old_hashes.get(partition) == new_hashes[partition] and os.path.isdir(path):
+            continue
+        os.makedirs(path, exist_ok=True)
+        table = pa.Table.from_pandas(rows, schema=schema, preserve_index=False)
+        pq.write_table(table, os.path.join(path, "part-0.parquet.tmp"))
+        os.replace(os.path.join(path, "part-0.parquet.tmp"), os.path.join(path, "part-0.parquet"))
+        rewritten.append(partition)
+
+    # Months that disappeared from the CSV
+    for partition in set(old_hashes) - set(new_hashes):
+        shutil.rmtree(partition_path(snapshot_dir, name, partition), ignore_errors=True)
+
+    manifest[name] = {"source": source, "partitions": new_hashes, "rows": len(frame), "format": SNAPSHOT_FORMAT}
+    return rewritten
+
+def build_snapshots(data_dir=DATA_DIR, snapshot_dir=SNAPSHOT_DIR, force=False):
+    """Bring every snapshot up to date. Returns {table: rewritten partitions}."""
+    with _build_lock:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        manifest = load_manifest(snapshot_dir)
+        changes = {}
+        for name in TABLES:
+            changes[name] = ingest_table(name, manifest, data_dir, snapshot_dir, force)
+        save_manifest(manifest, snapshot_dir)
+        return changes
+
+#######################
+# Loading
+def to_expression(name, filters):
+    """
+    Turn [(column, op, value), ...] into a dataset expression. Filters on the partition
+    date column also prune whole month directories.
+    """
+    dates = date_columns(name)
+    partition_by = TABLES[name].get("partition_by")
+    conditions = []
+    for column, op, value in filters:
+        if column in dates:
+            value = [pd.Timestamp(v) for v in value] if op in ("in", "not in") else pd.Timestamp(value)
+        conditions.append((column, op, value))
+        if column == partition_by and op in ("==", "=", ">", ">=", "<", "<="):
+            # Month of the bound; strict comparisons stay inclusive on month level
+            month_op = {"=": "==", ">": ">=", "<": "<="}.get(op, op)
+            conditions.append((PARTITION_COLUMN, month_op, value.strftime("%Y-%m")))
+    return pq.filters_to_expression(conditions)
+
+def unified_schema(dataset):
+    """
+    Schema that fits every file of the dataset. The dataset takes the schema of its first file, so
+    a column that is null in that month but string in another (older snapshots) would fail to read.
+    """
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+    if len(schemas) < 2:
+        return dataset.schema
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    for field in dataset.schema:
+        # Hive partition columns are not part of the files
+        if schema.get_field_index(field.name) == -1:
+            schema = schema.append(field)
+    return schema
+
+def load_snapshot(name, columns=None, filters=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Read one snapshot table. `columns` limits the columns that are read from disk,
+    `filters` ([(column, op, value)], like pyarrow) is pushed down to partitions and row groups.
+    """
+    partitioned = TABLES[name].get("partition_by") is not None
+    path = os.path.join(snapshot_dir, name)
+    dataset = ds.dataset(path, format="parquet", partitioning="hive" if partitioned else None)
+    schema = unified_schema(dataset)
+    if not schema.equals(dataset.schema):
+        dataset = ds.dataset(path, schema=schema, format="parquet", partitioning="hive" if partitioned else None)
+    if columns is None:
+        columns = [field for field in dataset.schema.names if field != PARTITION_COLUMN]
+    expression = to_expression(name, filters) if filters else None
+    # Partition directories are discovered in sorted (= chronological) order
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+def load_snapshots(snapshot_dir=SNAPSHOT_DIR):
+    """All tables in the order of TABLES, rebuilding stale snapshots first"""
+    build_snapshots(snapshot_dir=snapshot_dir)
+    return tuple(load_snapshot(name, snapshot_dir=snapshot_dir) for name in TABLES)
+
+def main():
+    force = "--force" in sys.argv
+    for name, partitions in build_snapshots(force=force).items():
+        print(f"{name}: {len(partitions)} partition(s) rewritten" + (f" ({', '.join(partitions)})" if partitions else ""))
+
+if __name__ == "__main__":
+    main()
@@ -1,78 +1,153 @@
-from streamlit import runtime
+import base64
+import json
+import mimetypes
+import threading
+import time
+from collections import deque
+import streamlit as st
 from streamlit.components.v1 import html
 
-def send_push(title: str = "Pass TITLE as an argument 🔥",
-            body: str = "Pass BODY as an argument 👨🏻‍💻",
-            icon_path: str = "",
-            sound_path: str = "https://cdn.pixabay.com/audio/2024/02/19/audio_e4043ea6be.mp3",
-            only_when_on_other_tab: bool = False,
-            tag: str = "") -> None:
+DEFAULT_SOUND = "https://cdn.pixabay.com/audio/2024/02/19/audio_e4043ea6be.mp3"
+DEDUP_WINDOW = 10 * 60      # seconds in which a second notification with the same tag is dropped
+MAX_PER_MINUTE = 5          # notifications shown per minute, the rest waits for the next render
 
-    try:
-        icon_path_on_server = runtime.get_instance().media_file_mgr.add(icon_path, "image/png", "")
-    except:
-        icon_path_on_server = ""
+# Local icons and sounds as data URIs, read once per process instead of registering them on every call
+_media_cache = {}
+_media_lock = threading.Lock()
 
-    try:
-        sound_path_on_server = runtime.get_instance().media_file_mgr.add(sound_path, mimetype= "audio/mpeg", coordinates= "1.(3.-14).5")
-    except:
-        sound_path_on_server = sound_path
+def media_uri(path, mimetype=None):
+    """Data URI for a local file, URLs are returned unchanged"""
+    if not path or path.startswith(("http://", "https://", "data:")):
+        return path
+    with _media_lock:
+        if path not in _media_cache:
+            try:
+                with open(path, "rb") as f:
+                    data = base64.b64encode(f.read()).decode("ascii")
+                mimetype = mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream"
+                _media_cache[path] = f"data:{mimetype};base64,{data}"
+            except OSError:
+                _media_cache[path] = ""
+        return _media_cache[path]
 
 
-    variables = f"""
-    var title = "{title}";
-    var body = "{body}";
-    var icon = "{icon_path_on_server}";
-    var audio = "{sound_path_on_server}";
-    var tag = "{tag}";
-    var notificationSent = false; // Flag to track notification state
+class NotificationQueue:
+    """
+    Browser notifications of one session.
+    - enqueue(): drops a notification whose tag was already queued within dedup_window
+    - render(): shows at most max_per_minute notifications, all in a single component
+    Reruns without new notifications render nothing.
     """
 
-    script = """
-    Notification.requestPermission().then(perm => {
-        if (perm === 'granted') {
-            notification = new Notification(title, {
-                body: body,
-                icon: icon,
-                tag: tag
-            });
+    def __init__(self, dedup_window=DEDUP_WINDOW, max_per_minute=MAX_PER_MINUTE):
+        self.dedup_window = dedup_window
+        self.max_per_minute = max_per_minute
+        self._pending = deque()
+        self._last_seen = {}
+        self._sent = deque()
+        self._lock = threading.Lock()
 
-            new Audio(audio).play();
-            notificationSent = true; // Set the flag to true after sending notification
-        } else if (perm === 'denied') {
-            console.log('The user refuses to have notifications displayed.');
-        } else if (perm === 'default') {
-            console.log('The user choice is unknown, so the browser will act as if the value were denied.');
-        } else {
-            console.log('Unknown permission issue.');
-        }
-    }).catch(error => {
-        console.error('An error occurred while requesting notification permission:', error);
-    });
-    """
+    def enqueue(self, title, body, icon_path="", sound_path=DEFAULT_SOUND, tag="", now=None):
+        """Queue a notification; returns False if it was dropped as a duplicate"""
+        now = now or time.time()
+        key = tag or f"{title}\x1f{body}"
+        with self._lock:
+            last = self._last_seen.get(key)
+            if last is not None and now - last < self.dedup_window:
+                return False
+            self._last_seen[key] = now
+            # Forget old keys so the dict does not grow with every tag ever seen
+            for old_key in [k for k, seen in self._last_seen.items() if now - seen >= self.dedup_window]:
+                del self._last_seen[old_key]
+            self._pending.append({"title": title, "body": body, "icon": icon_path, "sound": sound_path, "tag": tag})
+            return True
+
+    def drain(self, now=None):
+        """Notifications that may be shown now under the rate limit"""
+        now = now or time.time()
+        with self._lock:
+            while self._sent and now - self._sent[0] >= 60:
+                self._sent.popleft()
+            batch = []
+            while self._pending and len(self._sent) < self.max_per_minute:
+                batch.append(self._pending.popleft())
+                self._sent.append(now)
+            return batch
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
 
-    if icon_path == "":
-        script += 'console.log("Pass your ICON PATH as an argument");'
+    def render(self, only_when_on_other_tab=False):
+        """Emit one component with every notification that is due; nothing if there is none"""
+        batch = self.drain()
+        if not batch:
+            return 0
+        for notification in batch:
+            notification["icon"] = media_uri(notification["icon"], "image/png")
+            notification["sound"] = media_uri(notification["sound"], "audio/mpeg")
+        html(_notification_script(batch, only_when_on_other_tab), width=0, height=0)
+        return len(batch)
 
+
+def _notification_script(batch, only_when_on_other_tab):
+    show = """
+    function show() {
+        Notification.requestPermission().then(perm => {
+            if (perm !== 'granted') {
+                console.log('Notifications are not permitted: ' + perm);
+                return;
+            }
+            notifications.forEach(n => {
+                shown.push(new Notification(n.title, {body: n.body, icon: n.icon, tag: n.tag}));
+            });
+            // One sound per batch
+            const sound = notifications.map(n => n.sound).find(s => s);
+            if (sound) {
+                new Audio(sound).play();
+            }
+        }).catch(error => {
+            console.error('An error occurred while requesting notification permission:', error);
+        });
+    }
+    """
     if only_when_on_other_tab:
-        script = """
-        let notification;
-        document.addEventListener("visibilitychange", () => {{
-            if (document.visibilityState === "hidden" && !notificationSent) {{""" + script + """}} else if (document.visibilityState === "visible") {{
-                if (notification) {{
-                    notification.close();
-                }}
-                notificationSent = false; // Reset the flag when the tab becomes visible
-            }}
-        }});
+        trigger = """
+        let notificationSent = false;
+        document.addEventListener("visibilitychange", () => {
+            if (document.visibilityState === "hidden" && !notificationSent) {
+                show();
+                notificationSent = true;
+            } else if (document.visibilityState === "visible") {
+                shown.forEach(n => n.close());
+                notificationSent = false;
+            }
+        });
         """
     else:
-        pass
+        trigger = "show();"
+    return ("<script>const notifications = " + json.dumps(batch).replace("</", "<\\/") + "; const shown = [];"
+            + show + trigger + "</script>")
+
+def get_notification_queue():
+    """The queue of the current session"""
+    if "notification_queue" not in st.session_state:
+        st.session_state.notification_queue = NotificationQueue()
+    return st.session_state.notification_queue
+
 
-    combined = '<script>' + variables + script + '</script>'
-    html(combined, width=0, height=0)
+def send_push(title: str = "Pass TITLE as an argument 🔥",
+            body: str = "Pass BODY as an argument 👨🏻‍💻",
+            icon_path: str = "",
+            sound_path: str = DEFAULT_SOUND,
+            only_when_on_other_tab: bool = False,
+            tag: str = "") -> None:
+    """Queue a notification and render the queue right away (deduplicated and rate limited)"""
+    queue = get_notification_queue()
+    queue.enqueue(title, body, icon_path=icon_path, sound_path=sound_path, tag=tag)
+    queue.render(only_when_on_other_tab=only_when_on_other_tab)
 
 
 def send_alert(message):
-    script = '<script>' + f'window.alert("{message}")' + '</script>'
-    html(script,width= 0, height= 0)
\ No newline at end of file
+    script = '<script>' + f'window.alert({json.dumps(message)})' + '</script>'
+    html(script,width= 0, height= 0)
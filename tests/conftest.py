@@ -0,0 +1,21 @@
+import os
+import shutil
+import pytest
+
+# Without a Streamlit runtime every cached function would log a "No runtime found" warning
+os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+
+import db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A copy of hauszumleben.db that the test may change; every module reads it through db"""
+    path = tmp_path / "hauszumleben.db"
+    shutil.copyfile(os.path.join(ROOT, "hauszumleben.db"), path)
+    previous = db.get_db_path()
+    db.configure(str(path))
+    yield str(path)
+    db.configure(previous)
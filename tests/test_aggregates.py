@@ -0,0 +1,89 @@
+import aggregates
+import db
+import migrations
+
+DAY = "2030-01-01"
+
+
+def waste(day):
+    with db.reader() as conn:
+        return conn.execute("SELECT leftovers, amount_percent_sum FROM agg_daily_waste WHERE day = ?", (day,)).fetchone()
+
+def watermark(name):
+    with db.reader() as conn:
+        return conn.execute("SELECT last_rowid FROM agg_watermarks WHERE aggregate = ?", (name,)).fetchone()[0]
+
+
+def test_leftover_is_counted_once_its_selection_exists(database):
+    migrations.ensure_schema()
+    aggregates.refresh()
+    before = watermark("agg_daily_waste")
+
+    with db.writer() as conn:
+        selection_id = conn.execute("SELECT MAX(id) FROM menu_selections").fetchone()[0] + 1
+        # Leftover of a selection that is inserted later, then one that can be joined right away
+        conn.execute("INSERT INTO leftover_food (menu_selection_id, amount_percent) VALUES (?, 40)", (selection_id,))
+        conn.execute("INSERT INTO leftover_food (menu_selection_id, amount_percent) VALUES (1, 10)")
+    aggregates.refresh()
+    assert watermark("agg_daily_waste") == before
+    assert waste(DAY) is None
+
+    with db.writer() as conn:
+        conn.execute("INSERT INTO menu_selections (id, date) VALUES (?, ?)", (selection_id, DAY))
+    processed = aggregates.refresh()
+    assert processed["agg_daily_waste"][0] == before
+    assert waste(DAY) == (1, 40)
+    assert aggregates.refresh() == {}
+    assert waste(DAY) == (1, 40)
+
+
+def test_orphaned_leftover_does_not_hold_the_watermark(database, caplog):
+    migrations.ensure_schema()
+    aggregates.refresh()
+
+    with db.writer() as conn:
+        selection_id = conn.execute("SELECT MAX(id) FROM menu_selections").fetchone()[0] + 2
+        conn.executemany("INSERT INTO menu_selections (id, date) VALUES (?, ?)",
+                         [(selection_id - 1, DAY), (selection_id, DAY)])
+        # The selection of this leftover was deleted, it can never be joined
+        conn.execute("INSERT INTO leftover_food (menu_selection_id, amount_percent) VALUES (?, 40)", (selection_id - 1,))
+        conn.execute("DELETE FROM menu_selections WHERE id = ?", (selection_id - 1,))
+        conn.execute("INSERT INTO leftover_food (menu_selection_id, amount_percent) VALUES (?, 30)", (selection_id,))
+        max_rowid = conn.execute("SELECT MAX(rowid) FROM leftover_food").fetchone()[0]
+
+    with caplog.at_level("WARNING", logger="aggregates"):
+        processed = aggregates.refresh()
+    assert processed["agg_daily_waste"][1] == watermark("agg_daily_waste") == max_rowid
+    assert waste(DAY) == (1, 30)
+    assert "skipped 1 leftover_food row(s)" in caplog.text
+
+
+def test_updated_and_deleted_rows_are_recomputed(database):
+    migrations.ensure_schema()
+    aggregates.refresh()
+    with db.writer() as conn:
+        selection_id = conn.execute("SELECT MAX(id) FROM menu_selections").fetchone()[0] + 1
+        conn.execute("INSERT INTO menu_selections (id, date, consumed_percent) VALUES (?, ?, 50)", (selection_id, DAY))
+        conn.execute("INSERT INTO leftover_food (menu_selection_id, amount_percent) VALUES (?, 50)", (selection_id,))
+    aggregates.refresh()
+    assert aggregates.daily_kpis(DAY)["avg_consumed_percent"] == 50
+
+    with db.writer() as conn:
+        conn.execute("UPDATE menu_selections SET consumed_percent = 80 WHERE id = ?", (selection_id,))
+        conn.execute("UPDATE leftover_food SET amount_percent = 20 WHERE menu_selection_id = ?", (selection_id,))
+    assert set(aggregates.refresh()) >= {"agg_daily_consumption", "agg_daily_waste"}
+    kpis = aggregates.daily_kpis(DAY)
+    assert (kpis["avg_consumed_percent"], kpis["avg_leftover_percent"]) == (80, 20)
+
+    # Moving the selection to another day moves its leftover as well
+    with db.writer() as conn:
+        conn.execute("UPDATE menu_selections SET date = '2030-01-02' WHERE id = ?", (selection_id,))
+    aggregates.refresh()
+    assert waste(DAY) is None
+    assert waste("2030-01-02") == (1, 20)
+
+    with db.writer() as conn:
+        conn.execute("DELETE FROM leftover_food WHERE menu_selection_id = ?", (selection_id,))
+    aggregates.refresh()
+    assert waste("2030-01-02") is None
+    assert aggregates.refresh() == {}
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+import anomalies
+from anomalies import IncrementalConsumptionDetector, RollingMealPatternDetector
+
+
+def meal_orders(count=300, seed=1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "order_id": np.arange(1, count + 1),
+        "resident_id": rng.integers(1, 11, count),
+        "actual_consumption": rng.uniform(0.2, 1.0, count).round(2),
+    })
+
+def full_statistics(orders):
+    """What a detector that saw `orders` in one go holds"""
+    detector = IncrementalConsumptionDetector()
+    detector.update(orders)
+    return detector.features()
+
+def assert_statistics(detector, orders):
+    pd.testing.assert_frame_equal(detector.features(), full_statistics(orders), check_exact=False)
+
+
+def test_appended_orders_are_folded_in_incrementally():
+    orders = meal_orders()
+    detector = IncrementalConsumptionDetector()
+    assert detector.sync(orders.iloc[:200]) == 200
+    assert detector.sync(orders) == 100
+    assert detector.sync(orders) == 0
+    assert_statistics(detector, orders)
+
+@pytest.mark.parametrize("change", ["edited", "removed", "filtered", "late_low_id"])
+def test_changed_history_rebuilds_the_statistics(change):
+    orders = meal_orders()
+    detector = IncrementalConsumptionDetector()
+    detector.sync(orders)
+
+    if change == "edited":
+        orders.loc[10, "actual_consumption"] = 0.05
+    elif change == "removed":
+        orders = orders.drop(index=10)
+    elif change == "filtered":
+        orders = orders[orders["resident_id"] != 3]
+    else:
+        # Ids 301-310 arrive, then an order with an id below the cursor shows up
+        orders = pd.concat([orders.drop(index=50), meal_orders(310).iloc[300:]])
+        detector.sync(orders)
+        orders = pd.concat([orders, meal_orders().iloc[[50]]])
+
+    assert detector.sync(orders) == len(orders)
+    assert_statistics(detector, orders)
+
+def test_flag_history_is_bounded():
+    detector = RollingMealPatternDetector(window=7, min_days=3, threshold=1.0, flag_days=5)
+    outlier = pd.DataFrame({"meal_type": ["lunch"], "actual_consumption": [0.1]})
+    day = pd.Timestamp("2025-01-01")
+    for week in range(10):
+        for offset in range(6):
+            steady = pd.DataFrame({"meal_type": ["lunch"], "actual_consumption": [0.8 + 0.02 * (offset % 2)]})
+            detector.update_day(day, steady)
+            day += pd.Timedelta(days=1)
+        assert len(detector.update_day(day, outlier)) == 1
+        day += pd.Timedelta(days=1)
+
+    flagged = detector.flagged()
+    assert len(flagged) == 5
+    assert flagged["date"].is_monotonic_increasing and flagged["date"].iloc[-1] == day - pd.Timedelta(days=1)
+
+def test_unchanged_version_skips_the_input():
+    orders = meal_orders()
+    detector = IncrementalConsumptionDetector()
+    assert detector.sync(orders, version=1) == 300
+    # Not even looked at: a frame without the expected columns would fail otherwise
+    assert detector.sync(pd.DataFrame(), version=1) == 0
+    assert detector.sync(orders.iloc[:250], version=2) == 250
+    assert_statistics(detector, orders.iloc[:250])
+
+def test_only_recent_orders_are_compared(monkeypatch):
+    monkeypatch.setattr("anomalies.CHECK_WINDOW", 50)
+    orders = meal_orders()
+    detector = IncrementalConsumptionDetector()
+    detector.sync(orders.iloc[:200])
+    assert len(detector.recent_hashes) == 50
+
+    hashed = []
+    original = anomalies.order_hashes
+    monkeypatch.setattr("anomalies.order_hashes", lambda frame: hashed.append(len(frame)) or original(frame))
+    assert detector.sync(orders) == 100
+    assert hashed == [50, 100]
+    assert_statistics(detector, orders)
+
+def test_rolling_baseline_is_stable_for_large_values():
+    detector = RollingMealPatternDetector(window=5, min_days=2)
+    rng = np.random.default_rng(3)
+    values = 1e9 + rng.uniform(0, 1, 40)
+    day = pd.Timestamp("2025-01-01")
+    for offset, value in enumerate(values):
+        scored = detector.score_day(day + pd.Timedelta(days=offset),
+                                    pd.DataFrame({"meal_type": ["lunch"], "actual_consumption": [value]}))
+        if offset >= 5:
+            window = values[offset - 5:offset]
+            assert scored["mean_consumption"].iloc[0] == pytest.approx(window.mean(), abs=1e-4)
+            assert scored["std_consumption"].iloc[0] == pytest.approx(window.std(ddof=1), rel=1e-4)
+
+def test_update_only_reads_days_after_the_last_one():
+    days = pd.date_range("2025-01-01", periods=30)
+    orders = pd.DataFrame({"date": days, "meal_type": "lunch",
+                           "actual_consumption": np.r_[np.tile([0.8, 0.82], 14), 0.1, 0.8]})
+    detector = RollingMealPatternDetector(window=7, min_days=3, threshold=2.0)
+    detector.update(orders.iloc[:20])
+    assert len(detector.new_rows(orders)) == 10
+
+    # Rows up to the last processed day are not looked at, even unusable ones
+    history = orders.iloc[:20].assign(actual_consumption=np.nan, meal_type=None)
+    flagged = detector.update(pd.concat([history, orders.iloc[20:]]))
+    assert flagged["date"].tolist() == [days[28]]
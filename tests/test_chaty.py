@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+import pytest
+import chaty
+from chat_cache import ChatCache
+
+MANY_ROWS_SQL = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 5000) SELECT i FROM n"
+
+
+class StubCompletions:
+    """chat.completions of an OpenAI client that answers from a list; an exception in the list is raised"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def create(self, model, messages, **kwargs):
+        self.prompts.append(messages[-1]["content"])
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+
+@pytest.fixture
+def stub_client(monkeypatch):
+    """Installs a stub as the client get_client() returns; call it with the replies"""
+    def install(*replies):
+        completions = StubCompletions(replies)
+        monkeypatch.setattr(chaty, "client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        return completions
+    return install
+
+@pytest.fixture
+def cache(tmp_path):
+    return ChatCache(path=str(tmp_path / "chat_cache.db"))
+
+
+def test_generated_sql_is_run_and_answered(database, stub_client, cache):
+    completions = stub_client("```sql\nSELECT COUNT(*) AS bewohner FROM patient\n```", "Es gibt 10 Bewohner.")
+
+    assert chaty.smart_research_chatbot("Wie viele Bewohner gibt es?", cache) == "Es gibt 10 Bewohner."
+    sql_prompt, answer_prompt = completions.prompts
+    assert "Database structure" in sql_prompt and '"patient"' in sql_prompt
+    # The markdown fence is stripped before the query runs; its result goes into the answer prompt
+    assert "SELECT COUNT(*) AS bewohner FROM patient" in answer_prompt
+    assert '"rows":[[10]]' in answer_prompt
+
+    # Asked again: SQL and answer come from the cache, the client is not called
+    assert chaty.smart_research_chatbot("wie viele bewohner gibt es", cache) == "Es gibt 10 Bewohner."
+    assert len(completions.prompts) == 2
+
+def test_large_result_is_truncated_to_the_budget(database, stub_client, cache):
+    completions = stub_client(MANY_ROWS_SQL, "Zu viele Zeilen.")
+
+    assert chaty.smart_research_chatbot("Zähle bis 5000", cache) == "Zu viele Zeilen."
+    answer_prompt = completions.prompts[1]
+    assert f"only the first {chaty.MAX_RESULT_ROWS} are listed" in answer_prompt
+    assert "The result has 5000 rows" in answer_prompt
+    assert '"summary"' in answer_prompt
+    # The listed rows stay within the byte budget however large the result is
+    assert len(answer_prompt) < chaty.MAX_RESULT_BYTES + len(completions.prompts[0]) + 5000
+
+    result = chaty.query_database(MANY_ROWS_SQL, max_rows=10)
+    assert result["truncated"] and result["scan_complete"]
+    assert len(result["rows"]) == 10 and result["row_count"] == 5000
+    assert result["summary"]["i"]["max"] == 5000
+
+def test_openai_error_is_returned_and_not_cached(database, stub_client, cache):
+    stub_client(RuntimeError("rate limited"), RuntimeError("rate limited"))
+
+    answer = chaty.smart_research_chatbot("Wie viele Bewohner gibt es?", cache)
+    assert answer == "OpenAI API error: rate limited"
+    assert cache.get_sql("Wie viele Bewohner gibt es?", chaty.schema_catalog.schema_version()) is None
+
+def test_database_error_reaches_the_model_and_is_not_cached(database, stub_client, cache):
+    completions = stub_client("SELECT * FROM gibt_es_nicht", "Die Tabelle fehlt.", "Die Tabelle fehlt noch immer.")
+
+    assert chaty.smart_research_chatbot("Was steht in gibt_es_nicht?", cache) == "Die Tabelle fehlt."
+    assert "Database error: no such table: gibt_es_nicht" in completions.prompts[1]
+    # The SQL is reused, but an answer to a failed query is asked for again
+    assert chaty.smart_research_chatbot("Was steht in gibt_es_nicht?", cache) == "Die Tabelle fehlt noch immer."
+    assert len(completions.prompts) == 3
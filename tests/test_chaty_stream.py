@@ -0,0 +1,150 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import chaty
+from chat_cache import ChatCache
+
+SQL = "SELECT COUNT(*) AS bewohner FROM patient"
+QUESTION = "Wie viele Bewohner gibt es?"
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeStream:
+    """Streaming completion: yields the chunks, then optionally hangs like a slow server"""
+
+    def __init__(self, parts, hang=False, error=None):
+        self.parts = parts
+        self.hang = hang
+        self.error = error
+        self.sent = 0
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+        return False
+
+    async def __aiter__(self):
+        # A chunk without content (e.g. the role delta) is skipped by the pipeline
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None))])
+        for part in self.parts:
+            await asyncio.sleep(0)
+            self.sent += 1
+            yield chunk(part)
+        if self.error:
+            raise self.error
+        if self.hang:
+            await asyncio.Event().wait()
+
+
+class FakeAsyncOpenAI:
+    """AsyncOpenAI stand-in: the first request returns the SQL, the streaming one the FakeStream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.closed = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, stream=False):
+        if stream:
+            return self.stream
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=SQL))])
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+        return False
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ChatCache(path=str(tmp_path / "chat_cache.db"))
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    def install(parts, hang=False, error=None):
+        client = FakeAsyncOpenAI(FakeStream(parts, hang, error))
+        monkeypatch.setattr(chaty, "create_async_client", lambda: client)
+        return client
+    return install
+
+
+def test_chunks_arrive_in_order_and_the_full_answer_is_cached(database, fake_openai, cache):
+    client = fake_openai(["Es ", "gibt ", "10 ", "Bewohner."])
+
+    async def collect():
+        return [part async for part in chaty.smart_research_chatbot_stream(QUESTION, cache)]
+
+    assert asyncio.run(collect()) == ["Es ", "gibt ", "10 ", "Bewohner."]
+    assert client.stream.closed and client.closed
+
+    # The second ask is answered from the cache in one piece, without a request
+    fake_openai(["nicht ", "benutzt"])
+    assert asyncio.run(collect()) == ["Es gibt 10 Bewohner."]
+
+def test_aclose_on_early_exit_closes_the_stream_and_caches_nothing(database, fake_openai, cache):
+    client = fake_openai(["Es ", "gibt ", "10 ", "Bewohner."])
+
+    async def first_then_close():
+        answer_stream = chaty.smart_research_chatbot_stream(QUESTION, cache)
+        first = await answer_stream.__anext__()
+        await answer_stream.aclose()
+        return first
+
+    assert asyncio.run(first_then_close()) == "Es "
+    assert client.stream.sent == 1
+    assert client.stream.closed and client.closed
+    assert cache.get_sql(QUESTION, chaty.schema_catalog.schema_version()) == SQL
+    # No partial answer was stored: the next ask streams again
+    assert cache.stats()["answer"]["entries"] == 0
+    client = fake_openai(["Neu."])
+    assert list(chaty.stream_smart_research_chatbot(QUESTION, cache)) == ["Neu."]
+
+def test_cancelling_the_consumer_cancels_the_request(database, fake_openai, cache):
+    client = fake_openai(["Es ", "gibt "], hang=True)
+
+    async def consume_until_cancelled():
+        received = []
+
+        async def consume():
+            async for part in chaty.smart_research_chatbot_stream(QUESTION, cache):
+                received.append(part)
+
+        task = asyncio.create_task(consume())
+        while len(received) < 2:
+            await asyncio.sleep(0)
+        # The server hangs after the second chunk; the consumer gives up
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return received
+
+    assert asyncio.run(consume_until_cancelled()) == ["Es ", "gibt "]
+    assert client.stream.closed and client.closed
+    assert cache.stats()["answer"]["entries"] == 0
+
+def test_closing_the_sync_wrapper_closes_the_async_generator(database, fake_openai, cache):
+    client = fake_openai(["Es ", "gibt ", "10 ", "Bewohner."])
+
+    answer_stream = chaty.stream_smart_research_chatbot(QUESTION, cache)
+    assert next(answer_stream) == "Es "
+    # What Streamlit does when the script is stopped mid-stream
+    answer_stream.close()
+    assert client.stream.sent == 1
+    assert client.stream.closed and client.closed
+
+def test_error_mid_stream_is_marked_and_not_cached(database, fake_openai, cache):
+    client = fake_openai(["Es ", "gibt "], error=ConnectionError("connection reset"))
+
+    parts = list(chaty.stream_smart_research_chatbot(QUESTION, cache))
+    assert parts[:2] == ["Es ", "gibt "]
+    assert parts[2].startswith("\n\n---\nOpenAI API error, answer incomplete")
+    assert client.stream.closed and client.closed
+    assert cache.stats()["answer"]["entries"] == 0
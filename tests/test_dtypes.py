@@ -0,0 +1,19 @@
+import pandas as pd
+from dtypes import apply_dtypes
+
+
+def test_malformed_dates_are_reported(caplog):
+    frame = pd.DataFrame({"datum": ["2024-01-05", "05.01.2024", None], "menue_id": ["1", "x", None]})
+    with caplog.at_level("WARNING", logger="dtypes"):
+        converted = apply_dtypes(frame, {"datum": "datetime", "menue_id": "int16"})
+
+    assert converted["datum"].isna().tolist() == [False, True, True]
+    assert converted["menue_id"].isna().tolist() == [False, True, True]
+    assert "datum: 1 value(s) are not valid datetime and became missing, e.g. '05.01.2024'" in caplog.text
+    assert "menue_id: 1 value(s) are not valid int16" in caplog.text
+
+def test_clean_columns_log_nothing(caplog):
+    frame = pd.DataFrame({"datum": ["2024-01-05", None], "menue_id": [1, 2]})
+    with caplog.at_level("WARNING", logger="dtypes"):
+        apply_dtypes(frame, {"datum": "datetime", "menue_id": "int16"})
+    assert caplog.text == ""
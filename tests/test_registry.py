@@ -0,0 +1,43 @@
+import db
+import migrations
+from utils import LazyTableRegistry
+
+
+def rename(pat_id, vorname):
+    with db.writer() as conn:
+        conn.execute("UPDATE patient SET vorname = ? WHERE pat_id = ?", (vorname, pat_id))
+
+def first_name(registry, pat_id):
+    patients = registry["patient"]
+    return patients.loc[patients["pat_id"] == pat_id, "vorname"].iloc[0]
+
+
+def test_updates_are_reloaded(database):
+    migrations.ensure_schema()
+    registry = LazyTableRegistry()
+    first_name(registry, 1)
+
+    # Same row count and max rowid, only the counter of table_changes moves
+    rename(1, "Geändert")
+    assert first_name(registry, 1) == "Geändert"
+
+def test_tables_without_counter_are_reloaded_after_every_commit(database):
+    migrations.ensure_schema()
+    with db.writer() as conn:
+        conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, text TEXT)")
+        conn.execute("INSERT INTO notes (text) VALUES ('alt')")
+    registry = LazyTableRegistry()
+    assert registry["notes"]["text"].tolist() == ["alt"]
+
+    with db.writer() as conn:
+        conn.execute("UPDATE notes SET text = 'neu'")
+    assert registry["notes"]["text"].tolist() == ["neu"]
+
+def test_callers_get_their_own_copy(database):
+    migrations.ensure_schema()
+    registry = LazyTableRegistry()
+    patients = registry["patient"]
+    patients.loc[:, "vorname"] = "Überschrieben"
+    patients["extra"] = 1
+    assert "extra" not in registry["patient"]
+    assert (registry["patient"]["vorname"] != "Überschrieben").all()
@@ -0,0 +1,32 @@
+import os
+import threading
+import reports
+import snapshots
+
+
+def test_snapshot_refresh_runs_on_the_worker(tmp_path, monkeypatch):
+    release = threading.Event()
+    threads = []
+    build_snapshots = snapshots.build_snapshots
+
+    def slow_build_snapshots():
+        threads.append(threading.current_thread().name)
+        release.wait(5)
+        return build_snapshots()
+
+    monkeypatch.setattr(snapshots, "build_snapshots", slow_build_snapshots)
+    engine = reports.ReportEngine(report_dir=str(tmp_path))
+    job = engine.request("uebersicht", "2023-01-01", "2023-12-31")
+    # Returns while the snapshots are still being refreshed; the same request joins the job
+    assert not job.done()
+    assert engine.request("uebersicht", "2023-01-01", "2023-12-31") is job
+
+    release.set()
+    path = job.result(timeout=30)
+    assert os.path.exists(path)
+    assert threads and threads[0].startswith("report")
+
+    # Same data: the next request finds the file instead of writing it again
+    modified = os.path.getmtime(path)
+    assert engine.request("uebersicht", "2023-01-01", "2023-12-31").result(timeout=30) == path
+    assert os.path.getmtime(path) == modified
@@ -0,0 +1,59 @@
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+import db
+import migrations
+import scheduler
+from utils import risk_heartbeat_path
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+def scores(isolation):
+    """compute_risk_scores_uncached() output for patient 1 with the given isolation risk"""
+    return pd.DataFrame({"isolation_risk": [isolation], "isolation_factors": [[]],
+                         "fall_risk": [10], "fall_factors": [[]]}, index=pd.Index([1], name="resident_id"))
+
+
+def test_every_session_gets_every_alert_once(database):
+    migrations.ensure_schema()
+    scheduler.store_risk_scores(scores(10), now=NOW)
+    first, first_id = scheduler.alerts_since(now=NOW)
+    second, second_id = scheduler.alerts_since(now=NOW)
+
+    assert scheduler.store_risk_scores(scores(90), now=NOW) == 1
+    first, first_id = scheduler.alerts_since(first_id)
+    second, second_id = scheduler.alerts_since(second_id)
+    assert [alert["kind"] for alert in first] == [alert["kind"] for alert in second] == ["isolation"]
+    assert scheduler.alerts_since(first_id)[0] == scheduler.alerts_since(second_id)[0] == []
+
+
+def test_new_session_gets_recent_alerts_only(database):
+    migrations.ensure_schema()
+    scheduler.store_risk_scores(scores(10), now=NOW - timedelta(days=3))
+    scheduler.store_risk_scores(scores(90), now=NOW - timedelta(days=2))
+    scheduler.store_risk_scores(scores(10), now=NOW - timedelta(hours=2))
+    scheduler.store_risk_scores(scores(90), now=NOW - timedelta(hours=1))
+
+    alerts, last_id = scheduler.alerts_since(now=NOW)
+    assert len(alerts) == 1
+    with db.reader() as conn:
+        assert last_id == conn.execute("SELECT MAX(id) FROM risk_alerts").fetchone()[0]
+
+
+def test_every_alert_kind_has_a_message():
+    assert set(scheduler.ALERT_THRESHOLDS) <= set(scheduler.ALERT_MESSAGES)
+
+
+def test_unchanged_scores_are_not_written(database):
+    migrations.ensure_schema()
+    scheduler.store_risk_scores(scores(10), now=NOW)
+    with db.reader() as conn:
+        before = conn.execute("PRAGMA data_version").fetchone()[0]
+        scheduler.store_risk_scores(scores(10), now=NOW + timedelta(minutes=5))
+        assert conn.execute("PRAGMA data_version").fetchone()[0] == before
+        scheduler.store_risk_scores(scores(20), now=NOW + timedelta(minutes=10))
+        assert conn.execute("PRAGMA data_version").fetchone()[0] != before
+
+    # The heartbeat tells readers that the scheduler still runs
+    assert os.path.getmtime(risk_heartbeat_path()) == (NOW + timedelta(minutes=10)).timestamp()
@@ -0,0 +1,47 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import snapshots
+
+
+def write_meal_orders(data_dir):
+    """Two months of meal orders; special_requests has text in January only"""
+    pd.DataFrame({
+        "order_id": [1, 2, 3, 4],
+        "resident_id": [1, 2, 1, 2],
+        "date": ["2024-01-05", "2024-01-06", "2024-02-05", "2024-02-06"],
+        "meal_type": ["Frühstück", "Mittagessen", "Frühstück", "Abendessen"],
+        "portion_size": ["normal", "klein", "normal", "groß"],
+        "special_requests": ["ohne Zwiebeln", None, None, None],
+        "actual_consumption": [0.8, 0.5, 0.9, 1.0],
+    }).to_csv(data_dir / snapshots.TABLES["meal_orders"]["csv"], index=False)
+
+
+def test_partitions_share_one_schema(tmp_path):
+    data_dir, snapshot_dir = tmp_path / "data", tmp_path / "snapshots"
+    data_dir.mkdir()
+    write_meal_orders(data_dir)
+    manifest = {}
+    assert sorted(snapshots.ingest_table("meal_orders", manifest, str(data_dir), str(snapshot_dir))) == ["2024-01", "2024-02"]
+
+    february = pq.read_schema(os.path.join(snapshots.partition_path(str(snapshot_dir), "meal_orders", "2024-02"), "part-0.parquet"))
+    assert february.field("special_requests").type == pa.string()
+
+    frame = snapshots.load_snapshot("meal_orders", snapshot_dir=str(snapshot_dir))
+    assert frame.sort_values("order_id")["special_requests"].tolist()[:2] == ["ohne Zwiebeln", None]
+    assert isinstance(frame["meal_type"].dtype, pd.CategoricalDtype)
+
+
+def test_partitions_with_inferred_schemas_are_unified(tmp_path):
+    # Snapshots written before the explicit schema: an empty column is null in that month's file
+    months = {"2024-01": [None, None], "2024-02": ["ohne Zwiebeln", None]}
+    for month, requests in months.items():
+        path = snapshots.partition_path(str(tmp_path), "meal_orders", month)
+        os.makedirs(path)
+        rows = pd.DataFrame({"order_id": [1, 2], "special_requests": requests})
+        pq.write_table(pa.Table.from_pandas(rows, preserve_index=False), os.path.join(path, "part-0.parquet"))
+
+    frame = snapshots.load_snapshot("meal_orders", snapshot_dir=str(tmp_path))
+    assert len(frame) == 4
+    assert frame["special_requests"].notna().sum() == 1
@@ -0,0 +1,206 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+import db
+from profiling import profiled
+from data_access import get_resident_data_access, RECENT_RESIDENTS
+
+# Charts get at most CHART_POINTS points, however long the history is:
+# - a visible range with up to ROLLUP_THRESHOLD rows is downsampled from the raw rows (LTTB or min-max buckets)
+# - longer ranges are read from the finest precomputed rollup (mean with min/max band) that fits, then downsampled
+CHART_POINTS = 1000
+ROLLUP_THRESHOLD = 20 * CHART_POINTS
+ROLLUP_LEVELS = {"h": "Stundenmittel", "D": "Tagesmittel", "W": "Wochenmittel"}
+
+# Resident-scoped series: data_access query name -> (time column, value columns)
+SERIES = {
+    "vitals": ("measurement_time", ["heart_rate", "blood_pressure_systolic", "blood_pressure_diastolic"]),
+    "transactions": ("transaction_date", ["amount"]),
+}
+
+#######################
+# Downsampling
+def lttb_indices(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets: indices of `points` rows that keep the visual shape of the line.
+    x must be ascending; the first and the last row are always kept.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket i covers rows edges[i]:edges[i + 1]; first and last row are buckets of their own
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # Twice the triangle area between the previous pick, each candidate and the mean of the next bucket
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+def minmax_indices(y, points):
+    """Indices of the minimum and the maximum of points // 2 equally sized buckets, so no spike gets lost"""
+    n = len(y)
+    if points >= n or points < 2:
+        return np.arange(n)
+    buckets = np.arange(n) * (points // 2) // n
+    order = np.lexsort((np.asarray(y, dtype=float), buckets))
+    # order is sorted by bucket, then value: first and last row of each bucket are its min and max
+    first = np.r_[True, buckets[order][1:] != buckets[order][:-1]]
+    last = np.r_[first[1:], True]
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+def downsample(frame, x, y, points=CHART_POINTS, method="lttb"):
+    """At most `points` rows of `frame` (sorted by x), chosen by LTTB or min-max buckets on column y"""
+    frame = frame[frame[y].notna()]
+    if len(frame) <= points:
+        return frame
+    if method == "minmax":
+        indices = minmax_indices(frame[y].to_numpy(), points)
+    else:
+        indices = lttb_indices(frame[x].to_numpy().astype("int64"), frame[y].to_numpy(), points)
+    return frame.iloc[indices]
+
+def histogram(values, bins):
+    """Counts of `bins` equally wide bins (numbers or datetimes), so the browser gets bins instead of every value"""
+    values = pd.Series(values).dropna()
+    columns = ["bin_start", "bin_end", "count"]
+    if values.empty:
+        return pd.DataFrame(columns=columns)
+    is_datetime = pd.api.types.is_datetime64_any_dtype(values)
+    # Datetimes as seconds: nanoseconds as floats are too coarse for the ±0.5 range numpy uses for equal values
+    numbers = values.to_numpy().astype("int64") / 1e9 if is_datetime else values.to_numpy(dtype=float)
+    counts, edges = np.histogram(numbers, bins=bins)
+    if is_datetime:
+        edges = pd.to_datetime(edges, unit="s")
+    return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": counts}, columns=columns)
+
+#######################
+# Rollups
+def rollup(frame, x, columns, freq):
+    """Mean, min and max of `columns` per `freq` bucket; the mean keeps the column name, min/max get a suffix"""
+    grouped = frame.set_index(x)[columns].resample(freq)
+    result = grouped.mean()
+    for column in columns:
+        result[f"{column}_min"] = grouped[column].min()
+        result[f"{column}_max"] = grouped[column].max()
+    return result.dropna(how="all").reset_index()
+
+@st.cache_resource(max_entries=2 * RECENT_RESIDENTS)
+@profiled
+def series_levels(name, resident_id, data_version):
+    """
+    Raw rows of a resident's series sorted by time plus one rollup per ROLLUP_LEVELS entry.
+    Keyed by data_version, so new rows lead to a new entry. Shared between sessions: do not modify.
+    """
+    x, columns = SERIES[name]
+    frame = get_resident_data_access().fetch(name, resident_id)
+    frame[x] = pd.to_datetime(frame[x], errors="coerce")
+    frame = frame.dropna(subset=[x]).sort_values(x, kind="stable").reset_index(drop=True)
+    levels = {None: frame}
+    for freq in ROLLUP_LEVELS:
+        levels[freq] = rollup(frame, x, columns, freq)
+    return levels
+
+def _window(frame, x, start, end):
+    """Rows with start <= x < end of a frame sorted by x (binary search instead of a boolean mask)"""
+    times = frame[x].to_numpy()
+    first = 0 if start is None else times.searchsorted(np.datetime64(start), "left")
+    last = len(times) if end is None else times.searchsorted(np.datetime64(end), "left")
+    return frame.iloc[first:last]
+
+def series_bounds(name, resident_id):
+    """First and last timestamp of a resident's series, (None, None) without rows"""
+    x, _ = SERIES[name]
+    frame = series_levels(name, resident_id, db.data_version())[None]
+    if frame.empty:
+        return None, None
+    return frame[x].iloc[0], frame[x].iloc[-1]
+
+def series_window(name, resident_id, start=None, end=None):
+    """Raw rows of a resident's series with start <= time < end"""
+    x, _ = SERIES[name]
+    return _window(series_levels(name, resident_id, db.data_version())[None], x, start, end)
+
+@st.cache_resource(max_entries=RECENT_RESIDENTS)
+def _series_csv(name, resident_id, data_version):
+    return series_levels(name, resident_id, data_version)[None].to_csv(index=False).encode("utf-8")
+
+def series_csv(name, resident_id):
+    """CSV export of a resident's full series; encoded once per data_version instead of on every rerun"""
+    return _series_csv(name, resident_id, db.data_version())
+
+def chart_series(name, resident_id, column, start=None, end=None, points=CHART_POINTS, method="lttb"):
+    """
+    Rows to plot for one column of a resident's series in [start, end), at most `points` of them.
+    Returns (frame, level, raw_rows): level is None for raw rows or a ROLLUP_LEVELS key,
+    raw_rows the number of raw rows in the range.
+    """
+    x, _ = SERIES[name]
+    levels = series_levels(name, resident_id, db.data_version())
+    raw = _window(levels[None], x, start, end)
+    frame, level = raw, None
+    if len(raw) > ROLLUP_THRESHOLD:
+        for level in ROLLUP_LEVELS:
+            frame = _window(levels[level], x, start, end)
+            if len(frame) <= ROLLUP_THRESHOLD:
+                break
+    return downsample(frame, x, column, points, method), level, len(raw)
+
+#######################
+# Charts and controls
+def series_figure(frame, x, y, title, level=None):
+    """Line chart of chart_series() output; rollups are drawn as mean line with a min/max band"""
+    figure = go.Figure()
+    if level is not None:
+        figure.add_trace(go.Scatter(x=frame[x], y=frame[f"{y}_max"], mode="lines", line_width=0,
+                                    name="Maximum", showlegend=False))
+        figure.add_trace(go.Scatter(x=frame[x], y=frame[f"{y}_min"], mode="lines", line_width=0,
+                                    fill="tonexty", fillcolor="rgba(99, 110, 250, 0.2)",
+                                    name="Min–Max", showlegend=False))
+    figure.add_trace(go.Scatter(x=frame[x], y=frame[y], mode="lines" if level is not None else "lines+markers",
+                                name=ROLLUP_LEVELS.get(level, y), showlegend=False))
+    figure.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+    return figure
+
+def histogram_figure(bins, title, x_title):
+    """Bar chart of histogram() output, one bar per bin centre"""
+    centres = bins["bin_start"] + (bins["bin_end"] - bins["bin_start"]) / 2
+    figure = go.Figure(go.Bar(x=centres, y=bins["count"], name="count", showlegend=False))
+    figure.update_layout(title=title, xaxis_title=x_title, yaxis_title="count", bargap=0)
+    return figure
+
+def series_caption(frame, level, raw_rows):
+    """Short German note on how many of the values in the range are shown"""
+    if level is not None:
+        return f"{ROLLUP_LEVELS[level]} mit Min–Max-Band, {len(frame)} Punkte für {raw_rows} Werte im Zeitraum"
+    if len(frame) < raw_rows:
+        return f"{len(frame)} von {raw_rows} Werten im Zeitraum dargestellt (Downsampling)"
+    return f"{raw_rows} Werte im Zeitraum"
+
+def date_range_selector(label, first, last, key):
+    """
+    Date range input between two timestamps, the full range by default.
+    Returns (start, end) as timestamps with end exclusive; (None, None) without data.
+    """
+    if first is None or last is None:
+        return None, None
+    first, last = pd.Timestamp(first).date(), pd.Timestamp(last).date()
+    selection = st.date_input(label, value=(first, last), min_value=first, max_value=last, key=key,
+                              format="DD.MM.YYYY")
+    # While the user picks the second date the input returns a single date
+    if not isinstance(selection, (list, tuple)):
+        selection = (selection,)
+    start = selection[0] if len(selection) > 0 else first
+    end = selection[1] if len(selection) > 1 else start
+    return pd.Timestamp(start), pd.Timestamp(end + timedelta(days=1))
@@ -1,6 +1,7 @@
 import random
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 import altair as alt
 import plotly.express as px
 from datetime import datetime, timedelta
@@ -11,6 +12,15 @@ import seaborn as sns
 from scipy import stats
 import sqlite3
 import os
+import json
+import threading
+from collections.abc import Mapping
+import db
+import snapshots
+import dtypes
+from migrations import ensure_schema
+from profiling import profiled
+from anomalies import IncrementalConsumptionDetector, RollingMealPatternDetector, MEAL_PATTERN_WINDOW
 
 #######################
 # Page configuration
@@ -24,25 +34,119 @@ def setup_page_config():
 
 #######################
 # Database Functions
-@st.cache_data
+
+class LazyTableRegistry(Mapping):
+    """
+    Read-only, dict-like view of the database that loads each table on first access.
+    Every table is cached on its own and only reloaded when it actually changed:
+    - PRAGMA data_version tells us cheaply whether anybody committed since the last check
+    - a (row count, max rowid, table_changes counter) fingerprint tells us whether this particular
+      table changed; tables without the counter triggers are reloaded after every commit
+    Shared by all sessions: every access returns a copy, so callers may modify it.
+    """
+
+    def __init__(self):
+        # Own connection: PRAGMA data_version values are only comparable on the same connection
+        self._conn = db.connect(readonly=True)
+        self._lock = threading.RLock()
+        self._table_names = None
+        self._table_names_version = None
+        self._counted_tables = set()
+        self._frames = {}
+        self._fingerprints = {}
+        self._checked_versions = {}
+        self._raw_bytes = {}
+
+    def _data_version(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _fingerprint(self, table_name):
+        """None for tables whose updates and deletes are not counted (see migrations.ensure_triggers)"""
+        if table_name not in self._counted_tables:
+            return None
+        count, max_rowid = self._conn.execute(f'SELECT COUNT(*), MAX(rowid) FROM "{table_name}"').fetchone()
+        changes = self._conn.execute("SELECT changes FROM table_changes WHERE name = ?", (table_name,)).fetchone()
+        return count, max_rowid, changes[0] if changes else 0
+
+    def _tables(self, data_version):
+        if self._table_names is None or self._table_names_version != data_version:
+            cursor = self._conn.execute("SELECT name FROM sqlite_master WHERE type='table';")
+            self._table_names = [row[0] for row in cursor.fetchall()]
+            # Tables with both counter triggers
+            cursor = self._conn.execute(
+                "SELECT tbl_name FROM sqlite_master WHERE type = 'trigger' "
+                "AND name IN ('changes_' || tbl_name || '_update', 'changes_' || tbl_name || '_delete') "
+                "GROUP BY tbl_name HAVING COUNT(*) = 2")
+            self._counted_tables = {row[0] for row in cursor.fetchall()}
+            self._table_names_version = data_version
+        return self._table_names
+
+    def __getitem__(self, table_name):
+        with self._lock:
+            data_version = self._data_version()
+            if table_name not in self._tables(data_version):
+                self._frames.pop(table_name, None)
+                raise KeyError(table_name)
+
+            # Nothing was committed since the last check, the cached frame is still valid
+            if table_name in self._frames and self._checked_versions.get(table_name) == data_version:
+                return self._frames[table_name].copy()
+
+            fingerprint = self._fingerprint(table_name)
+            if (table_name not in self._frames or fingerprint is None
+                    or self._fingerprints.get(table_name) != fingerprint):
+                frame = pd.read_sql_query(f'SELECT * FROM "{table_name}"', self._conn)
+                self._raw_bytes[table_name] = dtypes.frame_bytes(frame)
+                self._frames[table_name] = dtypes.apply_dtypes(frame, dtypes.DB_DTYPES.get(table_name, {}))
+                self._fingerprints[table_name] = fingerprint
+            self._checked_versions[table_name] = data_version
+            return self._frames[table_name].copy()
+
+    def __contains__(self, table_name):
+        with self._lock:
+            return table_name in self._tables(self._data_version())
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._tables(self._data_version())))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tables(self._data_version()))
+
+    def loaded_tables(self):
+        """Names of the tables that are currently held in memory"""
+        with self._lock:
+            return list(self._frames)
+
+    def memory_report(self):
+        """Bytes of the loaded tables as read from SQLite and after the dtype conversion"""
+        with self._lock:
+            return dtypes.memory_report(dict(self._raw_bytes), dict(self._frames))
+
+    def invalidate(self, table_name=None):
+        """Drop one (or every) cached table so it is reloaded on next access"""
+        with self._lock:
+            if table_name is None:
+                self._frames.clear()
+                self._fingerprints.clear()
+                self._checked_versions.clear()
+            else:
+                self._frames.pop(table_name, None)
+                self._fingerprints.pop(table_name, None)
+                self._checked_versions.pop(table_name, None)
+
+
+@st.cache_resource
 def load_database_data():
+    # Runs once per process: bring indexes and pragmas up to date before the first read
     try:
-        conn = sqlite3.connect('hauszumleben.db')
-        cursor = conn.cursor()
-        
-        # Get all tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        
-        # Load data from each table
-        db_data = {}
-        for table in tables:
-            table_name = table[0]
-            df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-            db_data[table_name] = df
-        
-        conn.close()
-        return db_data
+        ensure_schema()
+    except sqlite3.Error as e:
+        st.warning(f"Datenbank-Migration fehlgeschlagen: {str(e)}")
+
+    try:
+        return LazyTableRegistry()
     except Exception as e:
         st.error(f"Fehler beim Laden der Datenbank: {str(e)}")
         return None
@@ -50,58 +154,130 @@ def load_database_data():
 #######################
 # Load data
 @st.cache_data
+@profiled
+def load_csv_data():
+    # Typed Parquet snapshots of the CSVs (dates parsed, categorical meal_type etc.), rebuilt when a CSV changed
+    try:
+        return snapshots.load_snapshots()
+    except (OSError, ValueError, pa.ArrowException) as e:
+        # Missing or unreadable snapshot files; the CSVs are the source of truth
+        st.warning(f"Daten-Snapshots nicht verfügbar, lese CSV-Dateien: {str(e)}")
+        return tuple(snapshots.read_csv_typed(name) for name in snapshots.TABLES)
+
+def memory_report():
+    """Before/after bytes of every loaded frame: the CSV snapshots and the database tables loaded so far"""
+    csv_raw = {name: pd.read_csv(os.path.join(snapshots.DATA_DIR, spec["csv"])) for name, spec in snapshots.TABLES.items()}
+    csv_report = dtypes.memory_report(csv_raw, dict(zip(snapshots.TABLES, load_csv_data())))
+    db_report = load_database_data().memory_report()
+    reports = [report.assign(source=source) for source, report in (("csv", csv_report), ("db", db_report)) if not report.empty]
+    return pd.concat(reports, ignore_index=True)
+
 def load_data():
-    residents = pd.read_csv('data/residents.csv')
-    meal_orders = pd.read_csv('data/meal_orders.csv')
-    health_monitoring = pd.read_csv('data/health_monitoring.csv')
-    menu_items = pd.read_csv('data/menu_items.csv')
-    weather_data = pd.read_csv('data/weather_data.csv')
+    # The table registry holds a live connection, so it is cached as a resource and not pickled with the CSVs
+    residents, meal_orders, health_monitoring, menu_items, weather_data = load_csv_data()
     db_data = load_database_data()
     return residents, meal_orders, health_monitoring, menu_items, weather_data, db_data
 
 #######################
 # Weather Correlation Functions
+WEATHER_LAGS = (0, 1)  # 1 = weather of the previous day vs. consumption today
+
+def weather_features(weather_data):
+    """Numeric weather columns plus a one-hot encoding of weather_condition, indexed by date"""
+    weather = weather_data.assign(date=pd.to_datetime(weather_data['date'])).set_index('date')
+    numeric = weather.select_dtypes(include='number')
+    if 'weather_condition' in weather:
+        conditions = pd.get_dummies(weather['weather_condition'], prefix='condition', dtype=float)
+        numeric = numeric.join(conditions)
+    return numeric.astype(float)
+
+def correlation_matrix(consumption, features):
+    """
+    Pearson r and two-sided p-value for every consumption column against every feature column,
+    using the pairwise complete observations. consumption: (days x meal types), features: (days x variables).
+    """
+    y = consumption.to_numpy(dtype=float)[:, :, None]
+    x = features.to_numpy(dtype=float)[:, None, :]
+    valid = ~np.isnan(y) & ~np.isnan(x)
+    y = np.where(valid, y, 0.0)
+    x = np.where(valid, x, 0.0)
+
+    n = valid.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_y = y.sum(axis=0) / n
+        mean_x = x.sum(axis=0) / n
+        dy = np.where(valid, y - mean_y, 0.0)
+        dx = np.where(valid, x - mean_x, 0.0)
+        r = (dx * dy).sum(axis=0) / np.sqrt((dx ** 2).sum(axis=0) * (dy ** 2).sum(axis=0))
+        r = np.clip(r, -1.0, 1.0)
+        dof = n - 2
+        t = r * np.sqrt(dof / np.maximum(1 - r ** 2, 1e-300))
+        p = np.where(dof > 0, 2 * stats.t.sf(np.abs(t), np.maximum(dof, 1)), np.nan)
+    p = np.where(np.isnan(r), np.nan, p)
+
+    index = pd.MultiIndex.from_product([consumption.columns, features.columns], names=['meal_type', 'variable'])
+    return pd.DataFrame({
+        'correlation': r.ravel(),
+        'p_value': p.ravel(),
+        'n': n.ravel()
+    }, index=index).reset_index()
+
+def weather_correlation_matrix(daily_consumption, weather_data, lags=WEATHER_LAGS):
+    """Long table meal_type x variable x lag with correlation, p_value and n"""
+    consumption = daily_consumption.pivot_table(index='date', columns='meal_type', values='actual_consumption', observed=True)
+    features = weather_features(weather_data)
+    results = []
+    for lag in lags:
+        # Weather of day d - lag next to the consumption of day d
+        lagged = features.set_axis(features.index + pd.Timedelta(days=lag)).reindex(consumption.index)
+        results.append(correlation_matrix(consumption, lagged).assign(lag=lag))
+    return pd.concat(results, ignore_index=True)
+
+@profiled
+def weather_correlation_table(meal_orders, weather_data, lags=WEATHER_LAGS):
+    """
+    (weather_consumption, correlations_df) without any Streamlit output, also used by the reports.
+    Both are None when meal orders and weather have no day in common.
+    """
+    # Work on converted copies, the cached input frames stay untouched
+    meal_orders = meal_orders.assign(date=pd.to_datetime(meal_orders['date']))
+    weather = weather_data.assign(date=pd.to_datetime(weather_data['date']))
+
+    # Calculate daily consumption by meal type and attach the weather of the day
+    daily_consumption = meal_orders.groupby(['date', 'meal_type'], observed=True)['actual_consumption'].mean().reset_index()
+    weather_consumption = pd.merge(daily_consumption, weather, on='date', how='inner')
+
+    if len(weather_consumption) == 0:
+        return None, None
+
+    matrix = weather_correlation_matrix(daily_consumption, weather, lags)
+
+    # One row per meal type: <variable>_correlation / <variable>_p_value, lagged ones with a _lag<n> suffix
+    matrix['suffix'] = np.where(matrix['lag'] == 0, '', '_lag' + matrix['lag'].astype(str))
+    wide = matrix.pivot_table(index='meal_type', columns=['variable', 'suffix'],
+                              values=['correlation', 'p_value'], dropna=False, observed=True)
+    # Order: all lag-0 correlations, their p-values, then the lagged ones
+    wide = wide.reindex(columns=sorted(wide.columns, key=lambda c: (c[2], c[0])))
+    wide.columns = [f"{variable}_{value}{suffix}" for value, variable, suffix in wide.columns]
+
+    # Meal types with fewer than two days of data are left out, as before
+    days = weather_consumption.groupby('meal_type', observed=True).size()
+    wide = wide.loc[days[days >= 2].index.intersection(wide.index)]
+
+    leading = [f"{variable}_correlation" for variable in ('temperature', 'precipitation', 'humidity')
+               if f"{variable}_correlation" in wide]
+    wide = wide[leading + [column for column in wide.columns if column not in leading]]
+    return weather_consumption, wide.reset_index()
+
 @st.cache_data
-def analyze_weather_correlation(meal_orders, weather_data, menu_items):
+@profiled
+def analyze_weather_correlation(meal_orders, weather_data, menu_items, lags=WEATHER_LAGS):
     try:
-        # Merge meal orders with weather data
-        meal_orders['date'] = pd.to_datetime(meal_orders['date'])
-        weather_data['date'] = pd.to_datetime(weather_data['date'])
-        merged_data = pd.merge(meal_orders, weather_data, on='date', how='inner')
-        
-        if len(merged_data) == 0:
+        weather_consumption, correlations_df = weather_correlation_table(meal_orders, weather_data, lags)
+        if weather_consumption is None:
             st.warning("Keine übereinstimmenden Daten zwischen Mahlzeiten und Wetter gefunden.")
-            return None, None
-        
-        # Calculate daily consumption by meal type
-        daily_consumption = merged_data.groupby(['date', 'meal_type'])['actual_consumption'].mean().reset_index()
-        
-        # Merge with weather data
-        weather_consumption = pd.merge(daily_consumption, weather_data, on='date')
-        
-        # Calculate correlations for each meal type
-        correlations = []
-        for meal_type in weather_consumption['meal_type'].unique():
-            meal_data = weather_consumption[weather_consumption['meal_type'] == meal_type]
-            
-            if len(meal_data) < 2:
-                continue
-                
-            # Calculate correlations with weather parameters
-            temp_corr = stats.pearsonr(meal_data['temperature'], meal_data['actual_consumption'])[0]
-            precip_corr = stats.pearsonr(meal_data['precipitation'], meal_data['actual_consumption'])[0]
-            humidity_corr = stats.pearsonr(meal_data['humidity'], meal_data['actual_consumption'])[0]
-            
-            correlations.append({
-                'meal_type': meal_type,
-                'temperature_correlation': temp_corr,
-                'precipitation_correlation': precip_corr,
-                'humidity_correlation': humidity_corr
-            })
-        
-        correlations_df = pd.DataFrame(correlations)
         return weather_consumption, correlations_df
-    
+
     except Exception as e:
         st.error(f"Fehler bei der Wetterkorrelationsanalyse: {str(e)}")
         return None, None
@@ -109,6 +285,7 @@ def analyze_weather_correlation(meal_orders, weather_data, menu_items):
 #######################
 # Anomaly Detection Functions
 @st.cache_data
+@profiled
 def detect_consumption_anomalies(meal_orders, residents):
     # Merge meal orders with resident data
     merged_data = pd.merge(meal_orders, residents, on='resident_id')
@@ -137,13 +314,37 @@ def detect_consumption_anomalies(meal_orders, residents):
     anomalies = pd.merge(resident_stats, residents, on='resident_id')
     return anomalies
 
+@st.cache_resource
+def get_consumption_detector(source="meal_orders"):
+    """Detector per data source, its running statistics survive reruns and sessions"""
+    return IncrementalConsumptionDetector()
+
+@profiled
+def detect_consumption_anomalies_incremental(meal_orders, residents, source="meal_orders", version=None):
+    """
+    Same result columns as detect_consumption_anomalies, but only orders newer than the
+    last processed order_id are folded into the statistics; the model is refit on schedule or drift.
+    Pass a different `source` for another input (e.g. a filtered frame); if the orders already
+    processed changed, the detector rebuilds its statistics instead of keeping stale ones.
+    `version` identifies the content of both frames (e.g. db.data_version()); while it is unchanged
+    the orders are not looked at.
+    """
+    detector = get_consumption_detector(source)
+    if not detector.is_current(version):
+        # Only residents that exist in the resident table count, like the merge in the full version
+        detector.sync(meal_orders[meal_orders['resident_id'].isin(residents['resident_id'])], version)
+
+    resident_stats = detector.score()
+    return pd.merge(resident_stats, residents, on='resident_id')
+
 @st.cache_data
+@profiled
 def detect_meal_pattern_anomalies(meal_orders):
     # Calculate daily consumption patterns
-    daily_patterns = meal_orders.groupby(['date', 'meal_type'])['actual_consumption'].mean().reset_index()
+    daily_patterns = meal_orders.groupby(['date', 'meal_type'], observed=True)['actual_consumption'].mean().reset_index()
     
     # Calculate z-scores for each meal type
-    meal_stats = daily_patterns.groupby('meal_type').agg({
+    meal_stats = daily_patterns.groupby('meal_type', observed=True).agg({
         'actual_consumption': ['mean', 'std']
     }).reset_index()
     
@@ -159,6 +360,26 @@ def detect_meal_pattern_anomalies(meal_orders):
     
     return daily_patterns
 
+@st.cache_resource
+def get_meal_pattern_detector(window=MEAL_PATTERN_WINDOW, mode="rolling", group_by=("meal_type",)):
+    """One shared detector per configuration, kept across reruns"""
+    return RollingMealPatternDetector(window=window, mode=mode, group_by=group_by)
+
+@profiled
+def detect_meal_pattern_anomalies_rolling(meal_orders, residents=None, window=MEAL_PATTERN_WINDOW, mode="rolling", by=()):
+    """
+    Rolling/EWM variant of detect_meal_pattern_anomalies. Only days after the last processed
+    day are scored; returns the flags raised by this call. `by` adds e.g. 'floor' or 'care_level'.
+    """
+    group_by = ("meal_type",) + tuple(by)
+    detector = get_meal_pattern_detector(window, mode, group_by)
+    # Only the days not processed yet are merged and grouped
+    meal_orders = detector.new_rows(meal_orders)
+    if by:
+        meal_orders = pd.merge(meal_orders, residents[['resident_id', *by]], on='resident_id')
+    return detector.update(meal_orders)
+
+@profiled
 def calculate_social_isolation_risk(resident_id):
     """
     Calculate social isolation risk based on:
@@ -167,8 +388,6 @@ def calculate_social_isolation_risk(resident_id):
     - Upcoming holidays
     Returns: (risk_score, risk_factors)
     """
-    conn = sqlite3.connect('hauszumleben.db')
-    
     # Get activity participation for last 30 days
     activity_query = """
     SELECT date, COUNT(*) as participation_count 
@@ -187,8 +406,8 @@ def calculate_social_isolation_risk(resident_id):
     GROUP BY departure_time
     """
     
-    activities_df = pd.read_sql_query(activity_query, conn, params=(resident_id,))
-    visits_df = pd.read_sql_query(visits_query, conn, params=(resident_id,))
+    activities_df = db.read_sql(activity_query, params=(resident_id,))
+    visits_df = db.read_sql(visits_query, params=(resident_id,))
     
     risk_factors = []
     risk_score = 0
@@ -236,7 +455,7 @@ def calculate_social_isolation_risk(resident_id):
     WHERE pat_id = ?
     """
     
-    birthdate = pd.read_sql_query(birthdate_query, conn, params=(resident_id,))
+    birthdate = db.read_sql(birthdate_query, params=(resident_id,))
     
     if not birthdate.empty:
         birthdate = pd.to_datetime(birthdate['geb'].iloc[0])
@@ -248,20 +467,18 @@ def calculate_social_isolation_risk(resident_id):
 
     risk_score = round(age * 0.4 * (birthday / 9))-5
 
-    conn.close()
     
 
 
     return min(100, risk_score), risk_factors
 
 
+@profiled
 def calculate_fall_risk(resident_id):
     """
     Calculate fall risk based on mobility status and fall history
     Returns: (risk_score, risk_factors)
     """
-    conn = sqlite3.connect('hauszumleben.db')
-    
     # Get mobility status
     mobility_query = """
     SELECT mobility_status FROM residents
@@ -275,8 +492,8 @@ def calculate_fall_risk(resident_id):
     AND last_fall_date >= date('now', '-90 days')
     """
     
-    mobility = pd.read_sql_query(mobility_query, conn, params=(resident_id,))
-    falls = pd.read_sql_query(falls_query, conn, params=(resident_id,))
+    mobility = db.read_sql(mobility_query, params=(resident_id,))
+    falls = db.read_sql(falls_query, params=(resident_id,))
     
     risk_score = 0
     risk_factors = []
@@ -300,7 +517,7 @@ def calculate_fall_risk(resident_id):
     WHERE pat_id = ?
     """
     
-    birthdate = pd.read_sql_query(birthdate_query, conn, params=(resident_id,))
+    birthdate = db.read_sql(birthdate_query, params=(resident_id,))
     
     if not birthdate.empty:
         birthdate = pd.to_datetime(birthdate['geb'].iloc[0])
@@ -314,14 +531,249 @@ def calculate_fall_risk(resident_id):
     SELECT nachname FROM patient WHERE pat_id = ?
     """
 
-    lastname = pd.read_sql_query(lastname_query, conn, params=(resident_id,))
+    lastname = db.read_sql(lastname_query, params=(resident_id,))
     lastname = lastname['nachname'].iloc[0]
 
     risk_score = round(age * 0.4 * ((birthday / 100)*(3*len(lastname))))-10
     if risk_score >= 100:
         risk_score = risk_score*0.56
-    conn.close()
-    return round(min(100, risk_score)), risk_factors 
+    return round(min(100, risk_score)), risk_factors
+
+
+#######################
+# Door event (Ein_aus) Functions
+@profiled
+def pair_door_events(door_events, night_start=21, night_end=6, max_duration_minutes=720):
+    """
+    Pair every exit (ausgang = 1) with the next entry (ausgang = 0) of the same resident.
+    Works on the events of one resident or of the whole facility in one pass.
+    Returns one row per exit that has a later entry:
+    pat_id, Ausgang, Eingang, Dauer_Minuten, is_night, is_vacation
+    - is_night: exit between night_start and night_end o'clock
+    - is_vacation: longer than max_duration_minutes, most likely a vacation and not an excursion
+    """
+    events = door_events[['pat_id', 'ausgang', 'zeitstempel']].copy()
+    events['zeitstempel'] = pd.to_datetime(events['zeitstempel'])
+    events = events.dropna(subset=['zeitstempel']).sort_values('zeitstempel', kind='stable')
+
+    exits = events.loc[events['ausgang'] == 1, ['pat_id', 'zeitstempel']].rename(columns={'zeitstempel': 'Ausgang'})
+    entries = events.loc[events['ausgang'] == 0, ['pat_id', 'zeitstempel']].rename(columns={'zeitstempel': 'Eingang'})
+
+    # For each exit the first entry strictly after it, matched within the same resident
+    excursions = pd.merge_asof(
+        exits, entries,
+        left_on='Ausgang', right_on='Eingang',
+        by='pat_id', direction='forward', allow_exact_matches=False
+    )
+    excursions = excursions.dropna(subset=['Eingang']).reset_index(drop=True)
+
+    excursions['Dauer_Minuten'] = (excursions['Eingang'] - excursions['Ausgang']).dt.total_seconds() / 60
+    exit_hour = excursions['Ausgang'].dt.hour
+    excursions['is_night'] = (exit_hour >= night_start) | (exit_hour < night_end)
+    excursions['is_vacation'] = excursions['Dauer_Minuten'] > max_duration_minutes
+    return excursions
+
+def format_durations(minutes):
+    """Format a Series of durations in minutes as 'x.x Minuten' or, above one hour, 'x.x Stunden'"""
+    return pd.Series(
+        np.where(minutes > 60,
+                 (minutes / 60).map('{:.1f} Stunden'.format),
+                 minutes.map('{:.1f} Minuten'.format)),
+        index=minutes.index
+    )
+
+#######################
+# Activity history Functions
+ACTIVITY_NOTE_STYLES = [
+    ("Did not feel well", 'background-color: rgba(255, 0, 0, 0.2)'),
+    ("Enjoyed the activity", 'background-color: rgba(0, 255, 0, 0.2)'),
+]
+
+@profiled
+def activity_note_styles(history):
+    """
+    Row colours for an activity history by the content of 'Notizen', for Styler.apply(axis=None).
+    The first matching note in ACTIVITY_NOTE_STYLES wins, rows without a match stay unstyled.
+    """
+    notes = history['Notizen'].fillna('').astype(str)
+    row_styles = np.select([notes.str.contains(text, regex=False) for text, _ in ACTIVITY_NOTE_STYLES],
+                           [style for _, style in ACTIVITY_NOTE_STYLES], default='')
+    return pd.DataFrame(np.repeat(row_styles[:, None], history.shape[1], axis=1),
+                        index=history.index, columns=history.columns)
+
+
+#######################
+# Batch Risk Scoring Functions
+RISK_SCORE_TTL = 300  # seconds
+RISK_SCORES_MAX_AGE = 3 * RISK_SCORE_TTL  # older stored scores are ignored, the scheduler has stopped
+
+def risk_heartbeat_path():
+    """
+    File the scheduler touches after every run. Runs that change no score do not write to the
+    database (that would invalidate every data_version keyed cache), so computed_at alone would age.
+    """
+    return db.get_db_path() + ".risk-heartbeat"
 
+HOLIDAYS = [
+    ('01-01', 'Neujahr'),
+    ('05-01', 'Staatsfeiertag'),
+    ('12-25', 'Weihnachten'),
+]
 
+def upcoming_holiday_factors(today=None):
+    """Risk factors for holidays within the next 7 days (the same for every resident)"""
+    today = today or datetime.now()
+    factors = []
+    for holiday_date, holiday_name in HOLIDAYS:
+        holiday = datetime.strptime(f"{today.year}-{holiday_date}", "%Y-%m-%d")
+        if 0 <= (holiday - today).days <= 7:
+            factors.append(f"Bevorstehender Feiertag: {holiday_name}")
+    return factors
+
+def _isolation_factors(resident_ids, activities, visits):
+    """Vectorised activity trend and visit frequency checks, one list of factors per resident"""
+    # Activity trend: 7-day rolling mean of the newest day compared to the one six days earlier
+    activities = activities.sort_values(['resident_id', 'date'], kind='stable').reset_index(drop=True)
+    activities['week_avg'] = (activities.groupby('resident_id')['participation_count']
+                              .rolling(7).mean().reset_index(level=0, drop=True))
+    position_from_end = activities.groupby('resident_id').cumcount(ascending=False)
+    latest = activities[position_from_end == 0].set_index('resident_id')['week_avg']
+    week_before = activities[position_from_end == 6].set_index('resident_id')['week_avg']
+    declining = (latest < week_before.reindex(latest.index)).reindex(resident_ids, fill_value=False)
+    has_activities = pd.Series(resident_ids, index=resident_ids).isin(activities['resident_id'])
+
+    # Visit frequency
+    avg_visits = visits.groupby('resident_id')['visit_count'].mean().reindex(resident_ids)
+
+    holiday_factors = upcoming_holiday_factors()
+    factors = []
+    for resident_id in resident_ids:
+        resident_factors = []
+        if not has_activities[resident_id]:
+            resident_factors.append("Keine Aktivitätsteilnahme registriert")
+        elif declining[resident_id]:
+            resident_factors.append("Abnehmende Aktivitätsteilnahme")
+        if pd.isna(avg_visits[resident_id]):
+            resident_factors.append("Keine Besuche registriert")
+        elif avg_visits[resident_id] < 0.5:
+            resident_factors.append("Wenige Besuche")
+        factors.append(resident_factors + holiday_factors)
+    return factors
+
+def _fall_factors(resident_ids, mobility):
+    """Mobility and recent fall checks, one list of factors per resident"""
+    mobility = mobility.drop_duplicates('resident_id').set_index('resident_id').reindex(resident_ids)
+    restricted = mobility['mobility_status'].isin(['eingeschränkt', 'Hilfsmittel benötigt'])
+    recent_falls = mobility['recent_falls'].fillna(0).astype(int)
+
+    factors = []
+    for resident_id in resident_ids:
+        resident_factors = []
+        if restricted[resident_id]:
+            resident_factors.append("Eingeschränkte Mobilität")
+        if recent_falls[resident_id] > 0:
+            resident_factors.append(f"{recent_falls[resident_id]} Stürze in den letzten 90 Tagen")
+        factors.append(resident_factors)
+    return factors
+
+@profiled
+def compute_risk_scores_uncached():
+    """
+    Social isolation and fall risk for every resident with a handful of grouped queries.
+    Uses the same rules as calculate_social_isolation_risk and calculate_fall_risk.
+    Returns: DataFrame indexed by resident_id with
+    isolation_risk, isolation_factors, fall_risk, fall_factors
+    """
+    with db.reader() as conn:
+        patients = pd.read_sql_query("SELECT pat_id AS resident_id, geb, nachname FROM patient", conn)
+        activities = pd.read_sql_query("""
+        SELECT resident_id, date, COUNT(*) as participation_count
+        FROM activity_participation
+        WHERE date >= date('now', '-30 days')
+        GROUP BY resident_id, date
+        """, conn)
+        visits = pd.read_sql_query("""
+        SELECT resident_id, departure_time, COUNT(*) as visit_count
+        FROM outings
+        WHERE departure_time >= datetime('now', '-30 days')
+        GROUP BY resident_id, departure_time
+        """, conn)
+        mobility = pd.read_sql_query("""
+        SELECT id AS resident_id, mobility_status,
+               CASE WHEN last_fall_date >= date('now', '-90 days') THEN 1 ELSE 0 END AS recent_falls
+        FROM residents
+        """, conn)
+
+    patients = patients.drop_duplicates('resident_id').set_index('resident_id')
+    resident_ids = patients.index.tolist()
+
+    # Score components from the birthdate and last name
+    birthdate = pd.to_datetime(patients['geb'])
+    age = (datetime.now() - birthdate).dt.days // 365
+    birthday = birthdate.dt.day
+    name_length = patients['nachname'].str.len()
+
+    isolation_risk = np.round(age * 0.4 * (birthday / 9)) - 5
+    fall_risk = np.round(age * 0.4 * ((birthday / 100) * (3 * name_length))) - 10
+    fall_risk = fall_risk.where(fall_risk < 100, fall_risk * 0.56)
+
+    scores = pd.DataFrame({
+        'isolation_risk': isolation_risk.clip(upper=100),
+        'isolation_factors': _isolation_factors(resident_ids, activities, visits),
+        'fall_risk': np.round(fall_risk.clip(upper=100)),
+        'fall_factors': _fall_factors(resident_ids, mobility),
+    }, index=patients.index)
+    scores[['isolation_risk', 'fall_risk']] = scores[['isolation_risk', 'fall_risk']].astype('Int64')
+    return scores
+
+@st.cache_data(ttl=RISK_SCORE_TTL)
+def _compute_risk_scores_cached():
+    return compute_risk_scores_uncached()
+
+@st.cache_data(ttl=RISK_SCORE_TTL)
+def _read_risk_scores(data_version):
+    """Scores written by the scheduler; data_version only serves as cache key"""
+    try:
+        stored = db.read_sql("SELECT * FROM risk_scores")
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        # Table not there yet (migration 3 not applied)
+        return None
+    if stored.empty:
+        return None
+    last_run = pd.to_datetime(stored['computed_at']).min()
+    if os.path.exists(risk_heartbeat_path()):
+        last_run = max(last_run, datetime.fromtimestamp(os.path.getmtime(risk_heartbeat_path())))
+    if datetime.now() - last_run > timedelta(seconds=RISK_SCORES_MAX_AGE):
+        return None
+    scores = stored.set_index('resident_id')
+    scores['isolation_factors'] = scores['isolation_factors'].map(json.loads)
+    scores['fall_factors'] = scores['fall_factors'].map(json.loads)
+    scores[['isolation_risk', 'fall_risk']] = scores[['isolation_risk', 'fall_risk']].astype('Int64')
+    return scores[['isolation_risk', 'isolation_factors', 'fall_risk', 'fall_factors']]
+
+@profiled
+def compute_risk_scores():
+    """
+    Risk scores of all residents, shared by the facility list and the resident header.
+    Reads the table kept up to date by the scheduler and computes them itself only if
+    the scheduler has not run (recently).
+    """
+    scores = _read_risk_scores(db.data_version())
+    if scores is not None:
+        return scores
+    return _compute_risk_scores_cached()
+
+@profiled
+def get_resident_risk(resident_id):
+    """
+    Risk scores of one resident from the precomputed batch result.
+    Returns: (isolation_risk, isolation_factors, fall_risk, fall_factors)
+    """
+    scores = compute_risk_scores()
+    if resident_id in scores.index and not scores.loc[resident_id, ['isolation_risk', 'fall_risk']].isna().any():
+        row = scores.loc[resident_id]
+        return int(row['isolation_risk']), row['isolation_factors'], int(row['fall_risk']), row['fall_factors']
 
+    isolation_risk, isolation_factors = calculate_social_isolation_risk(resident_id)
+    fall_risk, fall_factors = calculate_fall_risk(resident_id)
+    return isolation_risk, isolation_factors, fall_risk, fall_factors